@@ -0,0 +1,107 @@
+"""Non-interactive batch reconciliation of pending entries.
+
+This accepts, without user review, the candidates for all pending entries that
+are unambiguous: those for which exactly one merged candidate exists and the
+accounts of all unknown account postings are predicted with sufficient
+confidence (see `LoadedReconciler.get_auto_accept_candidate`).  All other
+pending entries are left for interactive review in the web interface.
+
+All accepted changes are written at the end, with each modified journal file
+written once.
+
+This is invoked by specifying the `--auto_reconcile` option to
+`beancount_import.webserver.main`.
+"""
+
+import collections
+from typing import Dict, List, NamedTuple
+
+from . import reconcile
+
+# Only the naive Bayes classifier provides meaningful confidences, and so by
+# default no minimum confidence is required.
+DEFAULT_MIN_CONFIDENCE = 0.0
+
+AutoReconcileResult = NamedTuple('AutoReconcileResult', [
+    ('accepted', List[reconcile.Candidate]),
+    ('num_accepted_pending', int),
+    ('modified_filenames', List[str]),
+    ('remaining', List[reconcile.PendingEntry]),
+])
+
+
+def auto_reconcile(loaded_reconciler: reconcile.LoadedReconciler,
+                   min_confidence: float = DEFAULT_MIN_CONFIDENCE
+                   ) -> AutoReconcileResult:
+    """Accepts the candidates for all unambiguous pending entries.
+
+    Pending entries are considered in order.  Accepting a candidate may also
+    resolve other pending entries that were merged into it, and may change the
+    candidates for subsequent pending entries.
+
+    :param min_confidence: Minimum probability of each predicted account.
+    :returns: The accepted candidates, the number of pending entries resolved by
+        them, the list of modified files, and the remaining pending entries.
+    """
+    editor = loaded_reconciler.editor
+    accepted = []  # type: List[reconcile.Candidate]
+    modified_filenames = collections.OrderedDict()  # type: Dict[str, None]
+    num_initial_pending = loaded_reconciler.num_pending
+    with editor.deferred_writes():
+        remaining_ids = set(map(id, loaded_reconciler.pending_data))
+        for pending in list(loaded_reconciler.pending_data):
+            if id(pending) not in remaining_ids:
+                # Already merged into a previously accepted candidate.
+                continue
+            candidate = loaded_reconciler.get_auto_accept_candidate(
+                pending, min_confidence=min_confidence)
+            if candidate is None:
+                continue
+            result = loaded_reconciler.accept_candidate(candidate)
+            accepted.append(candidate)
+            for filename in result.modified_filenames:
+                modified_filenames[filename] = None
+            remaining_ids = set(map(id, loaded_reconciler.pending_data))
+    return AutoReconcileResult(
+        accepted=accepted,
+        num_accepted_pending=num_initial_pending -
+        loaded_reconciler.num_pending,
+        modified_filenames=list(modified_filenames),
+        remaining=list(loaded_reconciler.pending_data),
+    )
+
+
+def format_summary(result: AutoReconcileResult) -> str:
+    lines = []
+    lines.append('Accepted %d candidates resolving %d pending entries.' %
+                 (len(result.accepted), result.num_accepted_pending))
+    for filename in result.modified_filenames:
+        lines.append('  Modified %s' % filename)
+    lines.append('%d pending entries remain.' % len(result.remaining))
+    remaining_by_source = collections.OrderedDict(
+    )  # type: Dict[str, List[reconcile.PendingEntry]]
+    for pending in result.remaining:
+        source_name = (pending.source.name
+                       if pending.source is not None else '<none>')
+        remaining_by_source.setdefault(source_name, []).append(pending)
+    for source_name, entries in remaining_by_source.items():
+        dates = [pending.date for pending in entries]
+        lines.append('  %s: %d (%s to %s)' % (source_name, len(entries),
+                                              min(dates), max(dates)))
+    return '\n'.join(lines)
+
+
+def main(args) -> AutoReconcileResult:
+    reconciler = reconcile.Reconciler(
+        journal_path=args.journal_input,
+        ignore_path=args.ignored_journal,
+        log_status=print,
+        options=vars(args))
+    loaded_reconciler = reconciler.loaded_future.result()
+    if loaded_reconciler.retrain_future is not None:
+        # Wait for the classifier to be retrained on the current examples.
+        loaded_reconciler.retrain_future.result()
+    result = auto_reconcile(
+        loaded_reconciler, min_confidence=args.auto_reconcile_min_confidence)
+    print(format_summary(result))
+    return result
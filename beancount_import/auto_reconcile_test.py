@@ -0,0 +1,89 @@
+import os
+import shutil
+
+import py
+import pytest
+
+from . import auto_reconcile
+from . import reconcile
+from . import test_util
+from . import training
+from . import webserver
+
+testdata_root = os.path.realpath(
+    os.path.join(os.path.dirname(__file__), '..', 'testdata'))
+
+mint_data_path = os.path.realpath(
+    os.path.join(testdata_root, 'source', 'mint', 'mint.csv'))
+
+
+def test_auto_reconcile(tmpdir: py.path.local):
+    temp_dir = str(tmpdir)
+    golden_directory = os.path.join(testdata_root, 'reconcile', 'test_basic')
+    for name in ('journal.beancount', 'ignore.beancount'):
+        shutil.copyfile(
+            os.path.join(golden_directory, '0', name),
+            os.path.join(temp_dir, name))
+    journal_path = os.path.join(temp_dir, 'journal.beancount')
+    reconciler = reconcile.Reconciler(
+        journal_path=journal_path,
+        ignore_path=os.path.join(temp_dir, 'ignore.beancount'),
+        log_status=print,
+        options=dict(
+            data_sources=[
+                {
+                    'module': 'beancount_import.source.mint',
+                    'filename': mint_data_path,
+                },
+            ],
+            transaction_output_map=[],
+            price_output=None,
+            open_account_output_map=[],
+            default_output=journal_path,
+            balance_account_output_map=[],
+            fuzzy_match_days=5,
+            fuzzy_match_amount=0,
+            account_pattern=None,
+            ignore_account_for_classification_pattern=training.
+            DEFAULT_IGNORE_ACCOUNT_FOR_CLASSIFICATION_PATTERN,
+            classifier_cache=None,
+        ),
+    )
+    loaded_reconciler = reconciler.loaded_future.result()
+    assert loaded_reconciler.num_pending == 3
+
+    # The two sides of the credit card payment are merged into a single
+    # transaction without unknown accounts.  The remaining transaction has no
+    # merged candidate.
+    result = auto_reconcile.auto_reconcile(loaded_reconciler)
+    assert len(result.accepted) == 1
+    assert result.num_accepted_pending == 2
+    assert result.modified_filenames == [os.path.realpath(journal_path)]
+    assert [pending.date.isoformat() for pending in result.remaining
+            ] == ['2016-08-10']
+    assert auto_reconcile.format_summary(result).split('\n')[-1] == (
+        '  mint: 1 (2016-08-10 to 2016-08-10)')
+
+    with open(journal_path, 'r', encoding='utf-8', newline='\n') as f:
+        contents = f.read()
+    test_util.check_golden_contents(
+        path=os.path.join(golden_directory, '1', 'journal.beancount'),
+        expected_contents=contents,
+        replacements=[(os.path.realpath(temp_dir), '<journal-dir>'),
+                      (testdata_root, '<testdata>')],
+        write=False,
+    )
+
+
+def test_min_confidence_requires_naive_bayes(capsys):
+    argv = [
+        '--journal_input=journal.beancount',
+        '--ignored_journal=ignored.beancount',
+        '--default_output=journal.beancount', '--auto_reconcile',
+        '--auto_reconcile_min_confidence=0.9'
+    ]
+    with pytest.raises(SystemExit):
+        webserver.parse_arguments(argv)
+    assert '--classifier_model=naive_bayes' in capsys.readouterr().err
+    args = webserver.parse_arguments(argv + ['--classifier_model=naive_bayes'])
+    assert args.auto_reconcile_min_confidence == 0.9
@@ -0,0 +1,192 @@
+"""Benchmark for the account prediction classifiers.
+
+Extracts the training examples from the journal, and for each supported
+classifier configuration, repeatedly trains a classifier on part of the examples
+and predicts the accounts of the remaining examples.  The accuracy, top-k
+accuracy, training time, per-prediction latency, and peak memory usage during
+training are reported for each configuration.
+
+The examples are either split into k folds at random, or, to simulate
+predicting new transactions from past ones, into k+1 consecutive chunks in
+journal order, where the i-th split trains on the first i chunks and tests on
+the next one.
+
+This is invoked by specifying the `--classifier_benchmark` option to
+`beancount_import.webserver.main`.
+"""
+
+import random
+import time
+import tracemalloc
+from typing import Any, Dict, List, NamedTuple, Sequence, Tuple
+
+from . import reconcile
+from . import training
+
+DEFAULT_NUM_FOLDS = 5
+DEFAULT_TOP_K = 3
+
+# Pairs of (classifier_model, classifier_vectorizer) reconciler options to
+# compare.  The naive Bayes model does not use a vectorizer.
+CLASSIFIER_CONFIGS = (
+    ('decision_tree', 'dict'),
+    ('decision_tree', 'hashing'),
+    ('naive_bayes', None),
+)
+
+BenchmarkResult = NamedTuple('BenchmarkResult', [
+    ('name', str),
+    ('num_predictions', int),
+    ('accuracy', float),
+    ('top_k_accuracy', float),
+    ('train_seconds', float),
+    ('prediction_seconds', float),
+    ('peak_memory_bytes', int),
+])
+
+Split = Tuple[List[int], List[int]]
+
+
+def get_splits(num_examples: int, num_folds: int, time_ordered: bool,
+               seed: int = 0) -> List[Split]:
+    """Returns the (training, test) example indices of each split.
+
+    :param time_ordered: If `True`, each split trains on a prefix of the
+        examples and tests on the examples following it.  Otherwise, the
+        examples are partitioned into `num_folds` folds at random, and each
+        split tests on one fold and trains on the others.
+    """
+    indices = list(range(num_examples))
+    splits = []  # type: List[Split]
+    if time_ordered:
+        num_chunks = num_folds + 1
+        bounds = [num_examples * i // num_chunks for i in range(num_chunks + 1)]
+        for i in range(1, num_chunks):
+            splits.append((indices[:bounds[i]], indices[bounds[i]:bounds[i + 1]]))
+    else:
+        random.Random(seed).shuffle(indices)
+        for i in range(num_folds):
+            test = indices[i::num_folds]
+            test_set = set(test)
+            splits.append(([j for j in indices if j not in test_set], test))
+    return [(train, test) for train, test in splits if train and test]
+
+
+def _get_top_labels(prob_dist, k: int) -> List[str]:
+    return sorted(prob_dist.samples(), key=prob_dist.prob, reverse=True)[:k]
+
+
+def run_benchmark(name: str, options: Dict[str, Any],
+                  examples: Sequence[Tuple[training.PredictionInput, str]],
+                  splits: Sequence[Split], top_k: int) -> BenchmarkResult:
+    """Evaluates the classifier specified by the reconciler `options`.
+
+    :returns: The accuracy measures over all splits, along with the mean
+        training time per split, the mean time per prediction, and the peak
+        memory allocated while training on the first split.
+    """
+    max_ngram_length = reconcile.get_classifier_max_ngram_length(options)
+    featuresets = [
+        (training.get_features(prediction_input,
+                               max_ngram_length=max_ngram_length), target)
+        for prediction_input, target in examples
+    ]
+    num_predictions = 0
+    num_correct = 0
+    num_top_k_correct = 0
+    train_seconds = 0.0
+    prediction_seconds = 0.0
+    peak_memory_bytes = 0
+    for split_i, (train_indices, test_indices) in enumerate(splits):
+        training_examples = [featuresets[i] for i in train_indices]
+        start_time = time.perf_counter()
+        classifier = reconcile.make_classifier(options)
+        classifier.train(training_examples)
+        train_seconds += time.perf_counter() - start_time
+
+        if split_i == 0:
+            # Memory tracing slows down training, and so is done separately.
+            tracemalloc.start()
+            try:
+                reconcile.make_classifier(options).train(training_examples)
+                peak_memory_bytes = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        test_examples = [featuresets[i] for i in test_indices]
+        for features, target in test_examples:
+            start_time = time.perf_counter()
+            predicted = classifier.classify(features)
+            prediction_seconds += time.perf_counter() - start_time
+            num_correct += predicted == target
+        prob_dists = classifier.prob_classify_many(
+            [features for features, _ in test_examples])
+        for prob_dist, (_, target) in zip(prob_dists, test_examples):
+            num_top_k_correct += target in _get_top_labels(prob_dist, top_k)
+        num_predictions += len(test_examples)
+    return BenchmarkResult(
+        name=name,
+        num_predictions=num_predictions,
+        accuracy=num_correct / max(1, num_predictions),
+        top_k_accuracy=num_top_k_correct / max(1, num_predictions),
+        train_seconds=train_seconds / max(1, len(splits)),
+        prediction_seconds=prediction_seconds / max(1, num_predictions),
+        peak_memory_bytes=peak_memory_bytes,
+    )
+
+
+def run_benchmarks(examples: Sequence[Tuple[training.PredictionInput, str]],
+                   options: Dict[str, Any],
+                   num_folds: int = DEFAULT_NUM_FOLDS,
+                   time_ordered: bool = False,
+                   top_k: int = DEFAULT_TOP_K) -> List[BenchmarkResult]:
+    """Runs `run_benchmark` for each of `CLASSIFIER_CONFIGS`.
+
+    :param options: Reconciler options, which specify the remaining classifier
+        options, such as `classifier_hash_features`.
+    """
+    examples = [x for x in examples if x[1] != reconcile.FIXME_ACCOUNT]
+    splits = get_splits(len(examples), num_folds, time_ordered=time_ordered)
+    results = []  # type: List[BenchmarkResult]
+    for model, vectorizer in CLASSIFIER_CONFIGS:
+        config_options = dict(
+            options, classifier_model=model, classifier_vectorizer=vectorizer)
+        name = model if vectorizer is None else '%s/%s' % (model, vectorizer)
+        results.append(
+            run_benchmark(name, config_options, examples, splits, top_k))
+    return results
+
+
+def format_results(results: Sequence[BenchmarkResult], top_k: int) -> str:
+    lines = [
+        '%-24s %9s %9s %10s %12s %12s' %
+        ('classifier', 'accuracy', 'top-%d' % top_k, 'train (s)',
+         'predict (ms)', 'memory (MB)')
+    ]
+    for r in results:
+        lines.append('%-24s %9.4f %9.4f %10.3f %12.3f %12.1f' %
+                     (r.name, r.accuracy, r.top_k_accuracy, r.train_seconds,
+                      r.prediction_seconds * 1000,
+                      r.peak_memory_bytes / (1024 * 1024)))
+    return '\n'.join(lines)
+
+
+def main(args) -> List[BenchmarkResult]:
+    reconciler = reconcile.Reconciler(
+        journal_path=args.journal_input,
+        ignore_path=args.ignored_journal,
+        log_status=print,
+        options=vars(args))
+    loaded_reconciler = reconciler.loaded_future.result()
+    examples = loaded_reconciler.get_prediction_examples()
+    top_k = args.classifier_benchmark_top_k
+    results = run_benchmarks(
+        examples,
+        options=vars(args),
+        num_folds=args.classifier_benchmark_folds,
+        time_ordered=args.classifier_benchmark_split == 'time',
+        top_k=top_k)
+    print('%d training examples, %s splits' %
+          (len(examples), args.classifier_benchmark_split))
+    print(format_results(results, top_k))
+    return results
@@ -0,0 +1,50 @@
+import datetime
+
+from beancount.core.data import Amount
+
+from . import classifier_benchmark
+from . import training
+
+
+def test_get_splits():
+    splits = classifier_benchmark.get_splits(10, 3, time_ordered=True)
+    assert splits == [
+        ([0, 1], [2, 3, 4]),
+        ([0, 1, 2, 3, 4], [5, 6]),
+        ([0, 1, 2, 3, 4, 5, 6], [7, 8, 9]),
+    ]
+
+    splits = classifier_benchmark.get_splits(10, 3, time_ordered=False)
+    assert len(splits) == 3
+    assert sorted(i for _, test in splits for i in test) == list(range(10))
+    for train, test in splits:
+        assert sorted(train + test) == list(range(10))
+
+
+def test_run_benchmarks():
+    def make_example(desc: str, account: str):
+        return (training.PredictionInput(
+            source_account='Liabilities:Credit-Card',
+            amount=Amount.from_string('1 USD'),
+            date=datetime.date(2017, 1, 1),
+            key_value_pairs={'desc': desc}), account)
+
+    examples = [
+        make_example('STARBUCKS STORE %d' % i, 'Expenses:Coffee')
+        for i in range(6)
+    ] + [
+        make_example('SAFEWAY STORE %d' % i, 'Expenses:Groceries')
+        for i in range(6)
+    ]
+    results = classifier_benchmark.run_benchmarks(
+        examples, options={}, num_folds=3, top_k=1)
+    assert [r.name for r in results] == [
+        'decision_tree/dict', 'decision_tree/hashing', 'naive_bayes'
+    ]
+    for r in results:
+        assert r.num_predictions == len(examples)
+        assert r.accuracy == 1.0
+        assert r.top_k_accuracy == 1.0
+        assert r.peak_memory_bytes > 0
+    assert len(
+        classifier_benchmark.format_results(results, top_k=1).split('\n')) == 4
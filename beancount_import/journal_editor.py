@@ -19,22 +19,36 @@ journal, and modifies only the lines occupied by the directives explicitly
 included in the change set.
 """
 
-from typing import Union, Dict, Tuple, List, Optional, Set, NamedTuple, Sequence, FrozenSet, Iterable
+from typing import Any, Union, Dict, Tuple, List, Optional, Set, NamedTuple, Sequence, FrozenSet, Iterable, cast
+import bisect
 import datetime
 import collections
+import collections.abc
+import concurrent.futures
 import contextlib
+import functools
+import glob
+import hashlib
 import io
+import itertools
+import mmap
 import os
+import pickle
 import re
-import threading
 import time
 
 import atomicwrites
-from beancount.core.data import Open, Transaction, Balance, Commodity, Entries, Directive, Meta, Posting
+import beancount
+import numpy as np
+from beancount.core.data import Open, Close, Transaction, Balance, Commodity, Entries, Directive, Meta, Posting
 import beancount.core.data
 import beancount.loader
+import beancount.ops.validation
+import beancount.parser.options
+import beancount.parser.parser
 import beancount.parser.printer
 import beancount.parser.booking
+import beancount.utils.encryption
 from beancount.core.number import MISSING
 
 # Inclusive starting original line, exclusive ending original line.
@@ -63,11 +77,16 @@ JournalDiff = NamedTuple('JournalDiff', [
     ('new_entries', Entries),
 ])
 
+# For each change set, the 0-based (start, end) range of old lines that is
+# replaced, along with the number of new lines that replace it.
+LineRangeChanges = List[Tuple[int, int, int]]
+
 ApplyFileChangesResult = NamedTuple('ApplyFileChangesResult', [
     ('new_contents', str),
     ('new_lines', List[str]),
     ('lineno_map', Dict[int, Optional[int]]),
     ('append_only', bool),
+    ('line_range_changes', LineRangeChanges),
 ])
 
 ApplyStagedChangesResult = NamedTuple('ApplyStagedChangesResult', [
@@ -77,6 +96,30 @@ ApplyStagedChangesResult = NamedTuple('ApplyStagedChangesResult', [
     ('new_ignored_entries', Entries),
 ])
 
+ReloadModifiedFilesResult = NamedTuple('ReloadModifiedFilesResult', [
+    ('modified_filenames', List[str]),
+    ('old_entries', Entries),
+    ('new_entries', Entries),
+    ('old_ignored_entries', Entries),
+    ('new_ignored_entries', Entries),
+])
+
+# Types of entries that may affect the interpretation of other entries.  If any
+# entry of these types is added or removed, `reload_modified_files` fails.
+_GLOBAL_ENTRY_TYPES = (Open, Close, Commodity)
+
+
+def _requires_booking_context(entry: Directive) -> bool:
+    """Returns `True` if booking `entry` may depend on other entries.
+
+    Postings held at cost may reduce lots, or have their cost interpolated,
+    based on the inventory resulting from all prior entries of the journal.
+    Interpolation of postings without a cost depends only on the transaction
+    itself.
+    """
+    return isinstance(entry, Transaction) and any(
+        posting.cost is not None for posting in entry.postings)
+
 
 def get_accounts_and_commodities(
         entries: Entries) -> Tuple[Dict[str, Open], Dict[str, Commodity]]:
@@ -101,34 +144,218 @@ def get_accounts_and_commodities(
             commodities[entry.currency] = entry
     return accounts, commodities
 
-_intercept_parse_file_lock = threading.Lock()
+# Version number of the format of the files in a parse cache directory.
+parse_cache_version_number = 1
 
 
-@contextlib.contextmanager
-def _intercepted_parse_file(file_modification_times: Dict[str, float]):
-    with _intercept_parse_file_lock:
-        orig_parse_file = beancount.parser.parser.parse_file
+def _get_parse_cache_key(filename: str, kw: Dict[str, Any]) -> Optional[tuple]:
+    """Computes the key identifying the parse result of a file.
 
-        def intercept_parse_file(filename, **kw):
-            real_filename = os.path.realpath(filename)
-            try:
-                file_modification_times[real_filename] = os.stat(
-                    filename).st_mtime
-            except OSError:
-                pass
-            return orig_parse_file(filename, **kw)
-        beancount.parser.parser.parse_file = intercept_parse_file
-        try:
-            yield
-        finally:
-            beancount.parser.parser.parse_file = orig_parse_file
+    The key consists of the filename as specified (since it is included in the
+    metadata of the parsed entries), its real path, its modification time, size
+    and content hash, the additional arguments to `parse_file`, and the
+    Beancount version.
 
-_load_file_lock = threading.Lock()
+    :returns: The key, or `None` if the file cannot be read.
+    """
+    try:
+        with open(filename, 'rb') as f:
+            stat_result = os.fstat(f.fileno())
+            content_hash = hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+    return (filename, os.path.realpath(filename), stat_result.st_mtime,
+            stat_result.st_size, content_hash, sorted(kw.items()),
+            beancount.__version__)
+
+
+def _get_parse_cache_path(parse_cache_dir: str, real_filename: str) -> str:
+    return os.path.join(
+        parse_cache_dir,
+        hashlib.sha256(real_filename.encode()).hexdigest() + '.pickle')
+
+
+def _load_cached_parse_result(cache_path: str, key: tuple):
+    """Returns the cached `parse_file` result for `key`, or `None`."""
+    try:
+        with open(cache_path, 'rb') as cache_f:
+            cache_data = pickle.load(cache_f)
+        if cache_data['version'] != parse_cache_version_number:
+            return None
+        if cache_data['key'] != key:
+            return None
+        return cache_data['result']
+    except FileNotFoundError:
+        return None
+    except:
+        import traceback
+        traceback.print_exc()
+        print('Not using parse cache %r due to above error' % cache_path)
+        return None
 
 
-def load_file(filename: str, encoding: Optional[str] = None):
+def _save_cached_parse_result(cache_path: str, key: tuple, result) -> None:
+    cache_data = {
+        'version': parse_cache_version_number,
+        'key': key,
+        'result': result,
+    }
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with atomicwrites.atomic_write(
+                cache_path, mode='wb', overwrite=True) as cache_f:
+            pickle.dump(cache_data, cache_f)
+    except:
+        import traceback
+        traceback.print_exc()
+        print('Failed to write parse cache %r due to above error' % cache_path)
+
+
+def _parse_journal_file(filename: str, encoding: Optional[str],
+                        parse_cache_dir: Optional[str]
+                        ) -> Tuple[Optional[float], Tuple[Entries, list, dict]]:
+    """Parses a single journal file, without its includes.
+
+    This may be called in a worker process by `_parse_recursive`.
+
+    :param parse_cache_dir: If not `None`, directory in which the parse result
+        of each file is cached.  A file is only parsed if its contents or
+        modification time differ from those of the cached result.
+    :returns: The modification time of the file, or `None` if it could not be
+        determined, and the result of `beancount.parser.parser.parse_file`.
+    """
+    try:
+        mtime = os.stat(filename).st_mtime  # type: Optional[float]
+    except OSError:
+        mtime = None
+    if beancount.utils.encryption.is_encrypted_file(filename):
+        return mtime, beancount.parser.parser.parse_string(
+            beancount.utils.encryption.read_encrypted_file(filename), filename)
+    kw = dict(encoding=encoding)
+    if parse_cache_dir is None:
+        return mtime, beancount.parser.parser.parse_file(filename, **kw)
+    key = _get_parse_cache_key(filename, kw)
+    if key is None:
+        return mtime, beancount.parser.parser.parse_file(filename, **kw)
+    cache_path = _get_parse_cache_path(parse_cache_dir,
+                                       os.path.realpath(filename))
+    result = _load_cached_parse_result(cache_path, key)
+    if result is None:
+        result = beancount.parser.parser.parse_file(filename, **kw)
+        _save_cached_parse_result(cache_path, key, result)
+    return mtime, result
+
+
+def _parse_recursive(filenames: List[str],
+                     file_modification_times: Dict[str, float],
+                     encoding: Optional[str] = None,
+                     parse_cache_dir: Optional[str] = None,
+                     parse_processes: int = 0) -> Tuple[Entries, list, dict]:
+    """Parses the specified journal files and the files they include.
+
+    This is equivalent to `beancount.loader._parse_recursive`, but records the
+    modification time of each parsed file in `file_modification_times`, and
+    may parse files concurrently.  The files are parsed in rounds: the files
+    included by the files parsed in one round are parsed in the next round.
+    If `parse_processes` is greater than 1, the files of each round are parsed
+    by a process pool of that size.  The results are merged in the same order
+    as when parsing sequentially.
+
+    :param filenames: Absolute paths of the files to parse.
+    :param parse_cache_dir: See `_parse_journal_file`.
+    :returns: A tuple of (entries, parse_errors, options_map), where the
+        entries are not yet sorted or booked.
+    """
+    entries = []  # type: Entries
+    parse_errors = []  # type: list
+    options_map = None  # type: Optional[Dict[str, Any]]
+    filenames_seen = set()  # type: Set[str]
+    parse = functools.partial(
+        _parse_journal_file,
+        encoding=encoding,
+        parse_cache_dir=parse_cache_dir)
+    executor = (concurrent.futures.ProcessPoolExecutor(
+        max_workers=parse_processes) if parse_processes > 1 else None)
+
+    def make_error(message: str):
+        return beancount.loader.LoadError(
+            beancount.core.data.new_metadata('<load>', 0), message, None)
+
+    try:
+        pending = [os.path.normpath(filename) for filename in filenames]
+        while pending:
+            # Each element is either an error or the name of a file to parse.
+            round_items = []  # type: List[Any]
+            for filename in pending:
+                if filename in filenames_seen:
+                    round_items.append(
+                        make_error(
+                            'Duplicate filename parsed: "{}"'.format(filename)))
+                elif not os.path.exists(filename):
+                    round_items.append(
+                        make_error(
+                            'File "{}" does not exist'.format(filename)))
+                else:
+                    filenames_seen.add(filename)
+                    round_items.append(filename)
+            round_filenames = [x for x in round_items if isinstance(x, str)]
+            if executor is not None and len(round_filenames) > 1:
+                results = iter(list(executor.map(parse, round_filenames)))
+            else:
+                results = iter([parse(x) for x in round_filenames])
+            pending = []
+            for item in round_items:
+                if not isinstance(item, str):
+                    parse_errors.append(item)
+                    continue
+                mtime, (src_entries, src_errors, src_options_map) = next(results)
+                if mtime is not None:
+                    file_modification_times[os.path.realpath(item)] = mtime
+                entries.extend(src_entries)
+                parse_errors.extend(src_errors)
+                if options_map is None:
+                    options_map = src_options_map
+                else:
+                    beancount.loader.aggregate_options_map(
+                        options_map, src_options_map)
+                cwd = glob.escape(os.path.dirname(item))
+                for include_filename in src_options_map['include']:
+                    matched_filenames = glob.glob(
+                        os.path.join(cwd, include_filename), recursive=True)
+                    if not matched_filenames:
+                        parse_errors.append(
+                            make_error(
+                                'File glob "{}" does not match any files'.
+                                format(include_filename)))
+                    pending.extend(
+                        os.path.normpath(x) for x in matched_filenames)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    if options_map is None:
+        options_map = beancount.parser.options.OPTIONS_DEFAULTS.copy()
+    options_map['include'] = sorted(filenames_seen)
+    return entries, parse_errors, options_map
+
+
+def load_file(filename: str,
+              encoding: Optional[str] = None,
+              parse_cache_dir: Optional[str] = None,
+              parse_processes: int = 0):
     """Loads the specified journal.
 
+    This is equivalent to `beancount.loader.load_file`, except that the entries
+    before and after booking are also returned.
+
+    If `parse_cache_dir` is not `None`, the pre-booking parse result of each
+    included file is cached in that directory, and only files that have changed
+    since they were cached are parsed again.  Booking is always performed on
+    the combined entries of all files.
+
+    If `parse_processes` is greater than 1, included files are parsed
+    concurrently by a process pool of that size.  See `_parse_recursive`.
+
     Returns a tuple containing:
       final_entries
       errors
@@ -137,38 +364,27 @@ def load_file(filename: str, encoding: Optional[str] = None):
       post_booking_entries
       file_modification_times
     """
-
-    # Since we are monkey patching beancount functions, ensure this function
-    # isn't called from multiple threads concurrently.
     file_modification_times = dict()  # type: Dict[str, float]
-    with _load_file_lock, _intercepted_parse_file(file_modification_times):
-        filename = os.path.realpath(filename)
-
-        orig_book_func = beancount.parser.booking.book
-        pre_booking_entries = None
-        post_booking_entries = None
-
-        def intercept_book(entries, options_map):
-            nonlocal pre_booking_entries
-            nonlocal post_booking_entries
-            pre_booking_entries = entries
-            entries, balance_errors = orig_book_func(entries, options_map)
-            post_booking_entries = entries
-            return entries, balance_errors
-
-        beancount.parser.booking.book = intercept_book
-        try:
-            entries, errors, options_map = beancount.loader._load(
-                [(filename, True)],
-                log_timings=None,
-                extra_validations=None,
-                encoding=encoding)
-        finally:
-            beancount.parser.booking.book = orig_book_func
-        assert pre_booking_entries is not None
-        assert post_booking_entries is not None
-        return (entries, errors, options_map, pre_booking_entries,
-                post_booking_entries, file_modification_times)
+    filename = os.path.realpath(filename)
+    entries, parse_errors, options_map = _parse_recursive(
+        [filename],
+        file_modification_times,
+        encoding=encoding,
+        parse_cache_dir=parse_cache_dir,
+        parse_processes=parse_processes)
+    entries.sort(key=beancount.core.data.entry_sortkey)
+    pre_booking_entries = entries
+    entries, balance_errors = beancount.parser.booking.book(
+        entries, options_map)
+    post_booking_entries = entries
+    parse_errors.extend(balance_errors)
+    entries, errors = beancount.loader.run_transformations(
+        entries, parse_errors, options_map, None)
+    errors.extend(beancount.ops.validation.validate(entries, options_map))
+    options_map['input_hash'] = beancount.loader.compute_input_hash(
+        options_map['include'])
+    return (entries, errors, options_map, pre_booking_entries,
+            post_booking_entries, file_modification_times)
 
 
 def _partially_book_entry(orig_entry: Directive,
@@ -245,14 +461,220 @@ class _AtomicWriter(atomicwrites.AtomicWriter):
         self.stat_result_after_close = os.stat(f.name)
 
 
+# According to the Beancount grammar, each line of an entry after the first must
+# start with whitespace and contain a non-whitespace character.
+_entry_continuation_line_re = re.compile(r'\s+[^\s]')
+
+
+class _EntryLineRanges(object):
+    """Maps the 0-based index of the first line of each entry in a file to the
+    index following its last line.
+
+    The start lines are kept sorted, such that `_update_entry_line_ranges` only
+    needs to translate the ranges following the changed lines.  Since entries do
+    not overlap, the end lines are sorted as well.
+    """
+
+    def __init__(self, starts: List[int], ends: List[int]) -> None:
+        self.starts = starts
+        self.ends = ends
+
+    def get(self, start_line: int) -> Optional[int]:
+        i = bisect.bisect_left(self.starts, start_line)
+        if i < len(self.starts) and self.starts[i] == start_line:
+            return self.ends[i]
+        return None
+
+    def __contains__(self, start_line: int) -> bool:
+        return self.get(start_line) is not None
+
+    def __getitem__(self, start_line: int) -> int:
+        end_line = self.get(start_line)
+        if end_line is None:
+            raise KeyError(start_line)
+        return end_line
+
+    def __setitem__(self, start_line: int, end_line: int) -> None:
+        i = bisect.bisect_left(self.starts, start_line)
+        if i < len(self.starts) and self.starts[i] == start_line:
+            self.ends[i] = end_line
+        else:
+            self.starts.insert(i, start_line)
+            self.ends.insert(i, end_line)
+
+    def items(self) -> Iterable[Tuple[int, int]]:
+        return zip(self.starts, self.ends)
+
+
+def _get_entry_line_ranges(lines: Sequence[str]) -> _EntryLineRanges:
+    """Returns the end of each entry in `lines`.
+
+    :returns: The ranges, with a start line for each line that is not a
+        continuation line, and therefore may start an entry.
+    """
+    starts = []  # type: List[int]
+    ends = []  # type: List[int]
+    end_line = len(lines)
+    for line_i in range(len(lines) - 1, -1, -1):
+        if _entry_continuation_line_re.match(lines[line_i]) is None:
+            starts.append(line_i)
+            ends.append(end_line)
+            end_line = line_i
+    starts.reverse()
+    ends.reverse()
+    return _EntryLineRanges(starts, ends)
+
+
+def _update_entry_line_ranges(line_ranges: _EntryLineRanges,
+                              changes: LineRangeChanges) -> _EntryLineRanges:
+    """Returns the line ranges after applying `changes` to a file.
+
+    A range is retained, translated by the number of lines added or removed
+    before it, only if none of its lines, nor the line following it, are
+    within a changed range, and no lines are inserted within it.  The ranges of
+    all other entries are recomputed on demand by
+    `JournalEditor.get_entry_line_range`.
+
+    The ranges ending before the first change are unaffected and copied as is,
+    such that appending to a file does not require examining its other entries.
+    """
+    if not changes:
+        return line_ranges
+    num_unaffected = bisect.bisect_left(line_ranges.ends, changes[0][0])
+    new_starts = line_ranges.starts[:num_unaffected]
+    new_ends = line_ranges.ends[:num_unaffected]
+    offset = 0
+    change_i = 0
+    for start_line, end_line in zip(line_ranges.starts[num_unaffected:],
+                                    line_ranges.ends[num_unaffected:]):
+        while change_i < len(changes) and changes[change_i][1] <= start_line:
+            change_start, change_end, num_new_lines = changes[change_i]
+            offset += num_new_lines - (change_end - change_start)
+            change_i += 1
+        if change_i < len(changes) and changes[change_i][0] <= end_line:
+            continue
+        new_starts.append(start_line + offset)
+        new_ends.append(end_line + offset)
+    return _EntryLineRanges(new_starts, new_ends)
+
+
+def _get_appended_data(old_lines: Sequence[str],
+                       new_lines: Sequence[str]) -> Optional[str]:
+    """Returns the data to append to a file containing `old_lines` to obtain
+    `new_lines`, or `None` if `new_lines` is not the result of append-only
+    changes.
+
+    Append-only changes only modify the last line if it is blank, and so only
+    the last of `old_lines` needs to be compared.
+    """
+    last_line_i = len(old_lines) - 1
+    if (len(new_lines) < len(old_lines) or
+            not new_lines[last_line_i].startswith(old_lines[last_line_i])):
+        return None
+    return '\n'.join(new_lines[last_line_i:])[len(old_lines[last_line_i]):]
+
+
 def _get_journal_contents(filename: str):
     with open(filename, 'r', encoding='utf-8') as f:
         return f.read()
 
 
+# Number of bytes of a mapped file scanned for newlines at once by
+# `_MappedLines`, which bounds the temporary memory used by the scan.
+_LINE_SCAN_CHUNK_SIZE = 1 << 24
+
+
+class _MappedLines(collections.abc.Sequence):
+    """Read-only sequence of the lines of a file, backed by `mmap`.
+
+    This is equivalent to `_get_journal_contents(filename).split('\\n')`, except
+    that only an array of the offsets of the lines is kept in memory, and each
+    line is decoded when accessed.  As with universal newlines mode, a carriage
+    return preceding a newline is not included in the line.
+
+    The offsets are computed on first access, by a vectorized scan of the
+    mapped file in chunks of `_LINE_SCAN_CHUNK_SIZE` bytes.
+    """
+
+    def __init__(self, filename: str) -> None:
+        with open(filename, 'rb') as f:
+            stat_result = os.fstat(f.fileno())
+            self.size = stat_result.st_size
+            self.mtime = stat_result.st_mtime
+            # Empty files cannot be mapped.
+            self._mmap = (mmap.mmap(
+                f.fileno(), 0, access=mmap.ACCESS_READ)
+                          if self.size > 0 else None)  # type: Optional[mmap.mmap]
+        self._line_starts = None  # type: Optional[np.ndarray]
+
+    def close(self) -> None:
+        """Unmaps the file, which is required on MS Windows before the file can
+        be replaced.  The number of lines remains available."""
+        self._get_line_starts()
+        if self._mmap is not None:
+            self._mmap.close()
+
+    def _get_line_starts(self) -> np.ndarray:
+        line_starts = self._line_starts
+        if line_starts is None:
+            parts = [np.zeros(1, dtype=np.int64)]
+            if self._mmap is not None:
+                data = np.frombuffer(self._mmap, dtype=np.uint8)
+                for chunk_start in range(0, self.size, _LINE_SCAN_CHUNK_SIZE):
+                    chunk = data[chunk_start:chunk_start +
+                                 _LINE_SCAN_CHUNK_SIZE]
+                    parts.append(
+                        np.flatnonzero(chunk == ord('\n')) + (chunk_start + 1))
+                # The mapping cannot be closed while `data` refers to it.
+                del data, chunk
+            line_starts = self._line_starts = np.concatenate(parts)
+        return line_starts
+
+    def __len__(self) -> int:
+        return len(self._get_line_starts())
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        line_starts = self._get_line_starts()
+        num_lines = len(line_starts)
+        if index < 0:
+            index += num_lines
+        if index < 0 or index >= num_lines:
+            raise IndexError('line index out of range')
+        if self._mmap is None:
+            return ''
+        start = int(line_starts[index])
+        end = (int(line_starts[index + 1]) - 1
+               if index + 1 < num_lines else self.size)
+        line = self._mmap[start:end]
+        if line.endswith(b'\r'):
+            line = line[:-1]
+        return line.decode('utf-8')
+
+
+def _close_mapped_lines(lines: Sequence[str]) -> None:
+    if isinstance(lines, _MappedLines):
+        lines.close()
+
+
 class JournalEditor(object):
     def __init__(self, journal_path: str,
-                 ignored_path: Optional[str] = None) -> None:
+                 ignored_path: Optional[str] = None,
+                 parse_cache_dir: Optional[str] = None,
+                 mmap_lines: bool = False,
+                 parse_processes: int = 0) -> None:
+        """Loads the journal.
+
+        :param parse_cache_dir: If specified, directory in which the parsed
+            contents of each journal file are cached.  See `load_file`.
+        :param parse_processes: If greater than 1, number of processes used to
+            parse included files concurrently.  See `load_file`.
+        :param mmap_lines: If `True`, the lines of the journal files are
+            accessed through a memory map rather than held in memory.  The
+            files must then not be truncated by other programs while the editor
+            is in use.
+        """
 
         self.default_journal_load_time = time.time()
         journal_path = os.path.realpath(journal_path)
@@ -260,11 +682,20 @@ class JournalEditor(object):
 
         (final_entries, self.errors, self.options_map, pre_booking_entries,
          post_booking_entries,
-         self.journal_load_time) = load_file(journal_path)
+         self.journal_load_time) = load_file(
+             journal_path,
+             parse_cache_dir=parse_cache_dir,
+             parse_processes=parse_processes)
         del final_entries
         self.entries = get_partially_booked_entries(pre_booking_entries,
                                                     post_booking_entries)
-        self.cached_lines = {}  # type: Dict[str, List[str]]
+        self.mmap_lines = mmap_lines
+        self.parse_cache_dir = parse_cache_dir
+        self.cached_lines = {}  # type: Dict[str, Sequence[str]]
+        # Maps the realpath of a journal file to the ranges of lines of its
+        # entries, as returned by `_get_entry_line_ranges`.  This is computed
+        # when first needed and kept up to date by `apply_file_changes_result`.
+        self.cached_line_ranges = {}  # type: Dict[str, _EntryLineRanges]
         self.accounts, self.commodities = get_accounts_and_commodities(
             self.entries)
         journal_paths = [journal_path] + self.options_map['include']
@@ -272,10 +703,12 @@ class JournalEditor(object):
         if ignored_path is not None:
             ignored_path = os.path.realpath(ignored_path)
             self.ignored_path = ignored_path  # type: Optional[str]
-            with _intercepted_parse_file(self.journal_load_time):
-                (pre_booking_ignored_entries, ignored_errors,
-                 self.ignored_options_map) = beancount.loader._parse_recursive(
-                     [(ignored_path, True)], log_timings=False)
+            (pre_booking_ignored_entries, ignored_errors,
+             self.ignored_options_map) = _parse_recursive(
+                 [ignored_path],
+                 self.journal_load_time,
+                 parse_cache_dir=parse_cache_dir,
+                 parse_processes=parse_processes)
             self.ignored_entries, ignored_balance_errors = beancount.parser.booking.book(
                 pre_booking_ignored_entries, self.ignored_options_map)
             self.errors.extend(ignored_errors)
@@ -290,6 +723,15 @@ class JournalEditor(object):
         self.ignored_journal_filenames = set(
             os.path.realpath(x) for x in ignored_journal_paths)
         self._all_entries = None  # type: Optional[Entries]
+        # If not `None`, maps each modified file whose new contents (in
+        # `cached_lines`) have not yet been written to its original lines, and
+        # whether all of the changes to it were append-only.  See
+        # `deferred_writes`.
+        self._deferred_writes = None  # type: Optional[Dict[str, Tuple[Sequence[str], bool]]]
+        # If not `None`, maps the id of each metadata dict whose line number
+        # was changed within `deferred_writes` to the dict and its original
+        # line number, for rolling back the changes.
+        self._saved_linenos = None  # type: Optional[Dict[int, Tuple[Meta, int]]]
 
     @property
     def all_entries(self) -> Entries:
@@ -298,25 +740,233 @@ class JournalEditor(object):
             self._all_entries.extend(self.ignored_entries)
         return self._all_entries
 
-    def get_journal_lines(self, filename: str):
+    def _diff_file_entries(
+            self, old_entries: Entries, new_entries: Entries
+    ) -> Tuple[Entries, Entries, List[Tuple[Directive, Directive]]]:
+        """Computes the changes between the old and new entries of a file.
+
+        Entries are matched by their line number and the hash of their printed
+        representation.  Remaining entries with identical hashes but different
+        line numbers (due to lines added or removed earlier in the file) are
+        matched in order.
+
+        :returns: A tuple `(removed, added, moved)`, where `moved` is a list of
+            `(old_entry, new_entry)` pairs that differ only in line numbers.
+        """
+        printer = beancount.parser.printer.EntryPrinter(
+            stringify_invalid_types=True)
+
+        def get_hash(entry: Directive) -> str:
+            return hashlib.sha256(printer(entry).encode()).hexdigest()
+
+        old_by_key = collections.OrderedDict(
+        )  # type: Dict[Tuple[int, str], List[Directive]]
+        for entry in old_entries:
+            old_by_key.setdefault((entry.meta['lineno'], get_hash(entry)),
+                                  []).append(entry)
+        unmatched_new = []  # type: List[Tuple[str, Directive]]
+        for entry in new_entries:
+            entry_hash = get_hash(entry)
+            matches = old_by_key.get((entry.meta['lineno'], entry_hash))
+            if matches:
+                matches.pop(0)
+            else:
+                unmatched_new.append((entry_hash, entry))
+        old_by_hash = collections.OrderedDict(
+        )  # type: Dict[str, List[Directive]]
+        for (_, entry_hash), entries in old_by_key.items():
+            old_by_hash.setdefault(entry_hash, []).extend(entries)
+        added = []  # type: Entries
+        moved = []  # type: List[Tuple[Directive, Directive]]
+        for entry_hash, entry in unmatched_new:
+            matches = old_by_hash.get(entry_hash)
+            if matches:
+                moved.append((matches.pop(0), entry))
+            else:
+                added.append(entry)
+        removed = [
+            entry for entries in old_by_hash.values() for entry in entries
+        ]
+        return removed, added, moved
+
+    def reload_modified_files(self) -> Optional[ReloadModifiedFilesResult]:
+        """Reparses the journal files that have been modified since they were
+        loaded or written, and updates the entries accordingly.
+
+        Unchanged entries are retained (with their line numbers updated if
+        necessary), such that only added and removed entries need to be
+        processed by the caller.
+
+        Only included files containing only ordinary entries can be reloaded.
+        If the top-level journal or ignored journal was modified, an included
+        file was removed, a modified file contains `include` or `plugin`
+        directives or postings held at cost (see `_requires_booking_context`),
+        or the set of accounts or commodities would change, the editor is left
+        unmodified and `None` is returned; in that case the journal must be
+        loaded again from scratch.
+        """
+        modified_filenames = sorted(self.check_any_journal_modification())
+        if self.journal_path in modified_filenames:
+            return None
+        if self.ignored_path is not None and self.ignored_path in modified_filenames:
+            return None
+
+        # Filenames as they appear in the metadata of existing entries, which
+        # need not be real paths.
+        meta_filenames = dict()  # type: Dict[str, str]
+        old_entries_by_filename = collections.OrderedDict(
+            (filename, []) for filename in modified_filenames
+        )  # type: Dict[str, Entries]
+        for entry in self.all_entries:
+            entry_filename = entry.meta.get('filename')
+            if entry_filename is None or entry.meta.get('lineno') is None:
+                continue
+            filename = meta_filenames.setdefault(
+                entry_filename, os.path.realpath(entry_filename))
+            file_entries = old_entries_by_filename.get(filename)
+            if file_entries is not None:
+                file_entries.append(entry)
+        parse_filenames = {
+            real_filename: meta_filename
+            for meta_filename, real_filename in meta_filenames.items()
+        }
+
+        file_results = [
+        ]  # type: List[Tuple[str, float, list, Entries, Entries, List[Tuple[Directive, Directive]]]]
+        for filename in modified_filenames:
+            if not os.path.exists(filename):
+                return None
+            mtime, (pre_booking_entries, errors,
+                    options_map) = _parse_journal_file(
+                        parse_filenames.get(filename, filename),
+                        encoding=None,
+                        parse_cache_dir=self.parse_cache_dir)
+            if mtime is None:
+                return None
+            if options_map['include'] or options_map['plugin']:
+                return None
+            if any(map(_requires_booking_context, pre_booking_entries)):
+                return None
+            # Since the entries do not depend on other entries, booking them
+            # separately gives the same result as booking the whole journal.
+            post_booking_entries, booking_errors = beancount.parser.booking.book(
+                pre_booking_entries, self.options_map)
+            errors = errors + booking_errors
+            new_entries = get_partially_booked_entries(pre_booking_entries,
+                                                       post_booking_entries)
+            removed, added, moved = self._diff_file_entries(
+                old_entries_by_filename[filename], new_entries)
+            if any(
+                    isinstance(entry, _GLOBAL_ENTRY_TYPES)
+                    for entry in itertools.chain(removed, added)):
+                return None
+            file_results.append((filename, mtime, errors, removed, added,
+                                 moved))
+
+        old_entries = []  # type: Entries
+        new_entries = []
+        old_ignored_entries = []  # type: Entries
+        new_ignored_entries = []
+        for filename, mtime, errors, removed, added, moved in file_results:
+            self.journal_load_time[filename] = mtime
+            _close_mapped_lines(self.cached_lines.pop(filename, []))
+            self.cached_line_ranges.pop(filename, None)
+            self.errors = [
+                e for e in self.errors
+                if not (e.source and e.source.get('filename') and os.path.
+                        realpath(e.source['filename']) == filename)
+            ]
+            self.errors.extend(errors)
+            for old_entry, new_entry in moved:
+                old_entry.meta['lineno'] = new_entry.meta['lineno']
+                if isinstance(old_entry, Transaction):
+                    for old_posting, new_posting in zip(
+                            old_entry.postings, new_entry.postings):
+                        if old_posting.meta is not None and new_posting.meta is not None:
+                            old_posting.meta['lineno'] = new_posting.meta.get(
+                                'lineno')
+            if filename in self.ignored_journal_filenames:
+                old_ignored_entries.extend(removed)
+                new_ignored_entries.extend(added)
+            else:
+                old_entries.extend(removed)
+                new_entries.extend(added)
+
+        def update_entries(entries: Entries, removed: Entries,
+                           added: Entries) -> Entries:
+            removed_ids = set(map(id, removed))
+            entries = [e for e in entries if id(e) not in removed_ids]
+            entries.extend(added)
+            entries.sort(key=beancount.core.data.entry_sortkey)
+            return entries
+
+        self.entries = update_entries(self.entries, old_entries, new_entries)
+        self.ignored_entries = update_entries(
+            self.ignored_entries, old_ignored_entries, new_ignored_entries)
+        self._all_entries = None
+        return ReloadModifiedFilesResult(
+            modified_filenames=modified_filenames,
+            old_entries=old_entries,
+            new_entries=new_entries,
+            old_ignored_entries=old_ignored_entries,
+            new_ignored_entries=new_ignored_entries,
+        )
+
+    def __getstate__(self):
+        # Memory-mapped lines cannot be pickled, and are mapped again on
+        # demand.
+        state = self.__dict__.copy()
+        state['cached_lines'] = {
+            filename: lines
+            for filename, lines in self.cached_lines.items()
+            if not isinstance(lines, _MappedLines)
+        }
+        return state
+
+    def get_journal_lines(self, filename: str) -> Tuple[str, Sequence[str]]:
         filename = os.path.realpath(filename)
         if filename in self.cached_lines:
             return (filename, self.cached_lines[filename])
-        lines = _get_journal_contents(filename).split('\n')
+        lines = (_MappedLines(filename) if self.mmap_lines else
+                 _get_journal_contents(filename).split('\n')
+                 )  # type: Sequence[str]
         self.cached_lines[filename] = lines
         return filename, lines
 
+    def _set_written_lines(self, filename: str, new_lines: List[str],
+                           stat_result: os.stat_result) -> None:
+        """Sets the cached lines of `filename` after writing `new_lines` to it.
+
+        If `mmap_lines` was specified, the file is mapped again, provided that
+        it was not modified since it was written, as indicated by
+        `stat_result`.
+        """
+        if self.mmap_lines:
+            mapped_lines = _MappedLines(filename)
+            if (mapped_lines.size == stat_result.st_size and
+                    mapped_lines.mtime == stat_result.st_mtime):
+                self.cached_lines[filename] = mapped_lines
+                return
+            mapped_lines.close()
+        self.cached_lines[filename] = new_lines
+
     def get_entry_line_range(self, entry: Directive):
         filename, lines = self.get_journal_lines(entry.meta['filename'])
         start_line = entry.meta['lineno'] - 1
-        line_i = start_line + 1
-        # Find last line of transaction
-        # According to Beanacount grammer, each line of the entry must start with whitespace and contain a non-whitespace character.
-        while line_i < len(lines):
-            if not re.match(r'^\s+[^\s]', lines[line_i]):
-                break
-            line_i += 1
-        return filename, lines, (start_line, line_i)
+        line_ranges = self.cached_line_ranges.get(filename)
+        if line_ranges is None:
+            line_ranges = _get_entry_line_ranges(lines)
+            self.cached_line_ranges[filename] = line_ranges
+        end_line = line_ranges.get(start_line)
+        if end_line is None:
+            # Find last line of transaction
+            line_i = start_line + 1
+            while line_i < len(lines):
+                if not _entry_continuation_line_re.match(lines[line_i]):
+                    break
+                line_i += 1
+            end_line = line_ranges[start_line] = line_i
+        return filename, lines, (start_line, end_line)
 
     def get_append_line_range(self, filename: str):
         filename, lines = self.get_journal_lines(filename)
@@ -354,6 +1004,7 @@ class JournalEditor(object):
         next_old_lineno = 0
         next_new_lineno = 0
         lineno_map = dict()  # type: Dict[int, Optional[int]]
+        line_range_changes = []  # type: LineRangeChanges
 
         def fill_unchanged_lines(end_old_lineno):
             nonlocal next_new_lineno, next_old_lineno
@@ -379,6 +1030,7 @@ class JournalEditor(object):
                         # line, then they are not append-only.
                         append_only = False
 
+            change_new_lineno = next_new_lineno
             for change_type, line in line_changes:
                 if change_type >= 0:
                     new_lines.append(line)
@@ -391,6 +1043,8 @@ class JournalEditor(object):
                 if change_type >= 0:
                     next_new_lineno += 1
             assert next_old_lineno == line_range[1]
+            line_range_changes.append((line_range[0], line_range[1],
+                                       next_new_lineno - change_new_lineno))
 
         fill_unchanged_lines(len(old_lines))
         new_data = '\n'.join(new_lines)
@@ -399,14 +1053,10 @@ class JournalEditor(object):
             new_lines=new_lines,
             lineno_map=lineno_map,
             append_only=append_only,
+            line_range_changes=line_range_changes,
         )
 
-    def apply_file_changes_result(self, filename: str,
-                                  result: ApplyFileChangesResult):
-        new_lines = result.new_lines
-        new_data = result.new_contents
-        lineno_map = result.lineno_map
-        filename = os.path.realpath(filename)
+    def _write_file(self, filename: str, new_data: str) -> os.stat_result:
         if self.check_journal_modification(filename):
             raise RuntimeError(
                 'Journal file modified concurrently: %r' % filename)
@@ -426,9 +1076,130 @@ class JournalEditor(object):
         # after closing the file but before renaming it.
         mtime = writer.stat_result_after_close.st_mtime
         self.journal_load_time[filename] = mtime
-        self.cached_lines[filename] = new_lines
+        return writer.stat_result_after_close
+
+    def _append_file(self, filename: str, data: str) -> os.stat_result:
+        """Appends `data` to `filename` with a single write.
+
+        Unlike `_write_file`, the time taken does not depend on the size of the
+        file.
+        """
+        if self.check_journal_modification(filename):
+            raise RuntimeError(
+                'Journal file modified concurrently: %r' % filename)
+        encoded_data = data.encode('utf-8')
+        fd = os.open(filename,
+                     os.O_WRONLY | os.O_APPEND | getattr(os, 'O_BINARY', 0))
+        try:
+            while encoded_data:
+                encoded_data = encoded_data[os.write(fd, encoded_data):]
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        # As in `_write_file`, the modification time is only obtained after
+        # closing the file.
+        stat_result = os.stat(filename)
+        self.journal_load_time[filename] = stat_result.st_mtime
+        return stat_result
+
+    @contextlib.contextmanager
+    def deferred_writes(self):
+        """Context manager within which changes are applied only in memory.
+
+        Each modified file is written once, with all of the changes applied
+        within the context, when the context exits normally.  If all of the
+        changes to a file were append-only, the new data is appended to it
+        rather than rewriting it.  If the context
+        exits due to an exception, or any of the modified files was modified
+        concurrently, none of the files are written and the changes applied in
+        memory are rolled back.
+        """
+        if self._deferred_writes is not None:
+            raise RuntimeError('Writes are already deferred')
+        deferred_writes = self._deferred_writes = dict(
+        )  # type: Dict[str, Tuple[Sequence[str], bool]]
+        saved_linenos = self._saved_linenos = dict(
+        )  # type: Dict[int, Tuple[Meta, int]]
+        saved_state = (list(self.entries), list(self.ignored_entries),
+                       dict(self.accounts), dict(self.commodities),
+                       dict(self.cached_lines), dict(self.cached_line_ranges))
+        try:
+            yield
+            for filename in deferred_writes:
+                if self.check_journal_modification(filename):
+                    raise RuntimeError(
+                        'Journal file modified concurrently: %r' % filename)
+        except:
+            (self.entries, self.ignored_entries, self.accounts,
+             self.commodities, self.cached_lines,
+             self.cached_line_ranges) = saved_state
+            for meta, lineno in saved_linenos.values():
+                meta['lineno'] = lineno
+            self._all_entries = None
+            raise
+        finally:
+            self._deferred_writes = None
+            self._saved_linenos = None
+        for filename, (old_lines, append_only) in sorted(
+                deferred_writes.items()):
+            new_lines = cast(List[str], self.cached_lines[filename])
+            self._write_lines(filename, old_lines, new_lines, append_only)
+
+    def _write_lines(self,
+                     filename: str,
+                     old_lines: Sequence[str],
+                     new_lines: List[str],
+                     append_only: bool,
+                     new_data: Optional[str] = None) -> None:
+        """Writes `new_lines` to `filename`, which contains `old_lines`.
+
+        :param append_only: Whether `new_lines` is the result of append-only
+            changes, in which case only the new data is appended to the file.
+        """
+        appended_data = (_get_appended_data(old_lines, new_lines)
+                         if append_only else None)
+        _close_mapped_lines(old_lines)
+        if appended_data is not None:
+            if not appended_data:
+                self.cached_lines[filename] = new_lines
+                return
+            stat_result = self._append_file(filename, appended_data)
+        else:
+            if new_data is None:
+                new_data = '\n'.join(new_lines)
+            stat_result = self._write_file(filename, new_data)
+        self._set_written_lines(filename, new_lines, stat_result)
+
+    def apply_file_changes_result(self, filename: str,
+                                  result: ApplyFileChangesResult):
+        new_lines = result.new_lines
+        new_data = result.new_contents
+        lineno_map = result.lineno_map
+        filename = os.path.realpath(filename)
+        _, old_lines = self.get_journal_lines(filename)
+        line_ranges = self.cached_line_ranges.get(filename)
+        if line_ranges is not None:
+            self.cached_line_ranges[filename] = _update_entry_line_ranges(
+                line_ranges, result.line_range_changes)
+        if self._deferred_writes is None:
+            self._write_lines(
+                filename,
+                old_lines,
+                new_lines,
+                append_only=result.append_only,
+                new_data=new_data)
+        else:
+            if self.check_journal_modification(filename):
+                raise RuntimeError(
+                    'Journal file modified concurrently: %r' % filename)
+            orig_lines, append_only = self._deferred_writes.get(
+                filename, (old_lines, True))
+            self._deferred_writes[filename] = (orig_lines, append_only and
+                                               result.append_only)
+            self.cached_lines[filename] = new_lines
 
         realpaths = dict()  # type: Dict[str, str]
+        saved_linenos = self._saved_linenos
 
         def get_realpath(path):
             result = realpaths.get(path, None)
@@ -449,6 +1220,8 @@ class JournalEditor(object):
             # Automatic Document entries get a lineno of 0
             if lineno is None or lineno == 0:
                 return
+            if saved_linenos is not None:
+                saved_linenos.setdefault(id(meta), (meta, lineno))
             meta['lineno'] = lineno_map[lineno]
 
         # Update lines of all entries
@@ -476,6 +1249,50 @@ class JournalEditor(object):
         results = self.get_file_change_results(change_sets)
         self.apply_file_change_results(results)
 
+    def apply_staged_changes_batch(
+            self, staged_changes_list: Sequence['StagedChanges']
+    ) -> ApplyStagedChangesResult:
+        """Applies each of `staged_changes_list` in order as one transaction.
+
+        Each modified file is written once.  Each element is diffed against the
+        journal as modified by the preceding elements, so that the line numbers
+        are remapped across the batch.  If an element removes or changes an
+        entry already removed or changed by a preceding element, or a file was
+        modified concurrently, none of the changes are applied and
+        `RuntimeError` is raised.
+
+        :returns: The combined result of all of the changes.
+        """
+        old_entries = []  # type: Entries
+        new_entries = []  # type: Entries
+        old_ignored_entries = []  # type: Entries
+        new_ignored_entries = []  # type: Entries
+        with self.deferred_writes():
+            replaced_ids = set()  # type: Set[int]
+            for staged_changes in staged_changes_list:
+                for change_pairs in staged_changes.changed_entries.values():
+                    for old_entry, _ in change_pairs:
+                        if old_entry is not None and id(
+                                old_entry) in replaced_ids:
+                            raise RuntimeError(
+                                'Entry changed by multiple staged changes: %r'
+                                % (old_entry, ))
+                # Any previously computed diff refers to the old line numbers.
+                staged_changes._cached_diff = None
+                result = self.apply_staged_changes(staged_changes)
+                replaced_ids.update(map(id, result.old_entries))
+                replaced_ids.update(map(id, result.old_ignored_entries))
+                old_entries.extend(result.old_entries)
+                new_entries.extend(result.new_entries)
+                old_ignored_entries.extend(result.old_ignored_entries)
+                new_ignored_entries.extend(result.new_ignored_entries)
+        return ApplyStagedChangesResult(
+            old_entries=old_entries,
+            new_entries=new_entries,
+            old_ignored_entries=old_ignored_entries,
+            new_ignored_entries=new_ignored_entries,
+        )
+
     def apply_staged_changes(
             self, staged_changes: 'StagedChanges') -> ApplyStagedChangesResult:
         change_sets, old_entries, new_entries = staged_changes.get_diff()
@@ -601,7 +1418,7 @@ class LineChangeBuilder(object):
 
 
 class FileChangeSetsBuilder(object):
-    def __init__(self, filename: str, lines: List[str]) -> None:
+    def __init__(self, filename: str, lines: Sequence[str]) -> None:
         self.filename = os.path.realpath(filename)
         self.lines = lines
         self.line_delta = 0
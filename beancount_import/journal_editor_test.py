@@ -1,5 +1,10 @@
 import datetime
+import os
+import random
+from typing import List, Tuple
 
+import beancount.loader
+import beancount.parser.parser
 import beancount.parser.printer
 from beancount.core.data import Transaction, Posting, EMPTY_SET
 from beancount.core.number import MISSING, Decimal
@@ -47,6 +52,13 @@ def check_journal_entries(editor: journal_editor.JournalEditor):
     assert clean_entries(editor.entries) == clean_entries(new_editor.entries)
     assert clean_entries(editor.ignored_entries) == clean_entries(
         new_editor.ignored_entries)
+    # Line ranges retained after changes must match the current lines.
+    for filename, line_ranges in editor.cached_line_ranges.items():
+        expected_line_ranges = journal_editor._get_entry_line_ranges(
+            editor.cached_lines[filename])
+        for start_line, end_line in line_ranges.items():
+            if start_line in expected_line_ranges:
+                assert end_line == expected_line_ranges[start_line]
 
 
 def create_journal(tmpdir: py.path.local,
@@ -196,6 +208,100 @@ def test_transaction_modify_narration(tmpdir):
     check_journal_entries(editor)
 
 
+def test_deferred_writes(tmpdir):
+    original_contents = """
+2015-01-01 * "Test transaction 1"
+  Assets:Account-A  100 USD
+  Assets:Account-B
+
+2015-02-01 * "Test transaction 2"
+  Assets:Account-A  100 USD
+  Assets:Account-B
+"""
+    journal_path = create_journal(tmpdir, original_contents)
+    editor = journal_editor.JournalEditor(journal_path)
+    with editor.deferred_writes():
+        stage = editor.stage_changes()
+        stage.remove_entry(editor.entries[0])
+        stage.apply()
+        stage = editor.stage_changes()
+        old_entry = editor.entries[0]
+        stage.change_entry(old_entry,
+                           old_entry._replace(narration='Modified transaction'))
+        stage.apply()
+        check_file_contents(journal_path, original_contents)
+    check_file_contents(
+        journal_path, """
+2015-02-01 * "Modified transaction"
+  Assets:Account-A  100 USD
+  Assets:Account-B
+""")
+    check_journal_entries(editor)
+
+
+def test_apply_staged_changes_batch(tmpdir, monkeypatch):
+    original_contents = """
+2015-01-01 * "Test transaction 1"
+  Assets:Account-A  100 USD
+  Assets:Account-B
+
+2015-02-01 * "Test transaction 2"
+  Assets:Account-A  100 USD
+  Assets:Account-B
+
+2015-03-01 * "Test transaction 3"
+  Assets:Account-A  100 USD
+  Assets:Account-B
+"""
+    journal_path = create_journal(tmpdir, original_contents)
+    editor = journal_editor.JournalEditor(journal_path)
+    entries = list(editor.entries)
+    orig_linenos = [entry.meta['lineno'] for entry in entries]
+
+    # Both staged changes are computed before either is applied.
+    remove_stage = editor.stage_changes()
+    remove_stage.remove_entry(entries[0])
+    remove_stage.get_diff()
+    change_stage = editor.stage_changes()
+    change_stage.change_entry(
+        entries[2], entries[2]._replace(narration='Modified transaction'))
+    change_stage.get_diff()
+
+    # A batch changing the same entry twice is rolled back.
+    conflict_stage = editor.stage_changes()
+    conflict_stage.remove_entry(entries[2])
+    with pytest.raises(RuntimeError):
+        editor.apply_staged_changes_batch(
+            [remove_stage, change_stage, conflict_stage])
+    check_file_contents(journal_path, original_contents)
+    assert editor.entries == entries
+    assert [entry.meta['lineno'] for entry in entries] == orig_linenos
+    check_journal_entries(editor)
+
+    written_filenames = []
+    orig_write_file = editor._write_file
+
+    def write_file(filename, new_data):
+        written_filenames.append(filename)
+        return orig_write_file(filename, new_data)
+
+    monkeypatch.setattr(editor, '_write_file', write_file)
+    result = editor.apply_staged_changes_batch([remove_stage, change_stage])
+    assert written_filenames == [os.path.realpath(journal_path)]
+    assert result.old_entries == [entries[0], entries[2]]
+    check_file_contents(
+        journal_path, """
+2015-02-01 * "Test transaction 2"
+  Assets:Account-A  100 USD
+  Assets:Account-B
+
+2015-03-01 * "Modified transaction"
+  Assets:Account-A  100 USD
+  Assets:Account-B
+""")
+    check_journal_entries(editor)
+
+
 def test_two(tmpdir):
     journal_path = create_journal(
         tmpdir, """
@@ -336,6 +442,80 @@ def test_remove(tmpdir):
     check_journal_entries(editor)
 
 
+def test_entry_line_range_index(tmpdir):
+    journal_path = create_journal(
+        tmpdir, """
+2015-01-01 * "Test transaction 1"
+  Assets:Account-A  100 USD
+  Assets:Account-B
+
+2015-02-01 * "Test transaction"
+  Assets:Account-A  100 USD
+  Assets:Account-B
+
+2015-03-01 * "Test transaction 2"
+  Assets:Account-A  100 USD
+  Assets:Account-B
+""")
+    editor = journal_editor.JournalEditor(journal_path)
+    first_entry, old_entry, last_entry = editor.entries
+    assert editor.get_entry_line_range(last_entry)[2] == (9, 12)
+    filename = os.path.realpath(journal_path)
+    stage = editor.stage_changes()
+    stage.remove_entry(old_entry)
+    stage.apply()
+
+    # The range of the entry following the removed entry is translated rather
+    # than recomputed.
+    assert editor.cached_line_ranges[filename][5] == 8
+    assert editor.get_entry_line_range(last_entry)[2] == (5, 8)
+    assert editor.get_entry_line_range(first_entry)[2] == (1, 4)
+    check_journal_entries(editor)
+
+
+def test_update_entry_line_ranges():
+    rng = random.Random(0)
+
+    def make_lines(num_entries):
+        lines = []  # type: List[str]
+        for _ in range(num_entries):
+            lines.append('2015-01-01 * "Test"')
+            lines.extend(['  Assets:Account-A'] * rng.randrange(3))
+            if rng.random() < 0.5:
+                lines.append('')
+        return lines
+
+    for _ in range(200):
+        old_lines = make_lines(rng.randrange(8))
+        line_ranges = journal_editor._get_entry_line_ranges(old_lines)
+        new_lines = []  # type: List[str]
+        changes = []  # type: List[Tuple[int, int, int]]
+        prev_end = 0
+        for start in sorted(
+                rng.randrange(len(old_lines) + 1)
+                for _ in range(rng.randrange(3))):
+            if start < prev_end:
+                continue
+            end = rng.randrange(start, len(old_lines) + 1)
+            replacement = make_lines(rng.randrange(3))
+            new_lines.extend(old_lines[prev_end:start])
+            new_lines.extend(replacement)
+            changes.append((start, end, len(replacement)))
+            prev_end = end
+        new_lines.extend(old_lines[prev_end:])
+
+        new_line_ranges = journal_editor._update_entry_line_ranges(
+            line_ranges, changes)
+        expected_line_ranges = journal_editor._get_entry_line_ranges(new_lines)
+        for start_line, end_line in new_line_ranges.items():
+            assert expected_line_ranges.get(start_line) == end_line
+        # Ranges ending before the first change are retained.
+        first_change = changes[0][0] if changes else len(old_lines) + 1
+        for start_line, end_line in line_ranges.items():
+            if end_line < first_change:
+                assert new_line_ranges.get(start_line) == end_line
+
+
 def test_add(tmpdir):
     journal_path = create_journal(
         tmpdir, """
@@ -392,6 +572,76 @@ def test_add(tmpdir):
 """)
     check_journal_entries(editor)
 
+def test_add_append_only(tmpdir, monkeypatch):
+    journal_path = create_journal(
+        tmpdir, """
+2015-01-01 * "Test transaction 1"
+  Assets:Account-A  100 USD
+  Assets:Account-B
+""")
+    editor = journal_editor.JournalEditor(journal_path)
+
+    def write_file(filename, new_data):
+        raise AssertionError('Append-only change rewrote %r' % filename)
+
+    orig_write_file = editor._write_file
+    monkeypatch.setattr(editor, '_write_file', write_file)
+    new_entry = Transaction(
+        meta=None,
+        date=datetime.date(2015, 4, 1),
+        flag='*',
+        payee=None,
+        narration='New transaction',
+        tags=EMPTY_SET,
+        links=EMPTY_SET,
+        postings=[
+            Posting(
+                account='Assets:Account-A',
+                units=Amount(Decimal(3), 'USD'),
+                cost=None,
+                price=None,
+                flag=None,
+                meta=None),
+            Posting(
+                account='Assets:Account-B',
+                units=MISSING,
+                cost=None,
+                price=None,
+                flag=None,
+                meta=None),
+        ],
+    )
+    for _ in range(2):
+        stage = editor.stage_changes()
+        stage.add_entry(new_entry, journal_path)
+        stage.apply()
+    with editor.deferred_writes():
+        stage = editor.stage_changes()
+        stage.add_entry(new_entry, journal_path)
+        stage.apply()
+    expected_contents = """
+2015-01-01 * "Test transaction 1"
+  Assets:Account-A  100 USD
+  Assets:Account-B
+""" + """
+2015-04-01 * "New transaction"
+  Assets:Account-A  3 USD
+  Assets:Account-B
+""" * 3
+    check_file_contents(journal_path, expected_contents)
+    assert '\n'.join(editor.cached_lines[os.path.realpath(
+        journal_path)]) == expected_contents
+    check_journal_entries(editor)
+
+    # Other changes rewrite the file.
+    monkeypatch.setattr(editor, '_write_file', orig_write_file)
+    stage = editor.stage_changes()
+    stage.remove_entry(editor.entries[0])
+    stage.apply()
+    check_journal_entries(editor)
+    assert not editor.check_any_journal_modification()
+
+
 def test_add_ignored(tmpdir):
     journal_path = create_journal(
         tmpdir, """
@@ -494,3 +744,272 @@ def test_remove_ignored(tmpdir):
   Assets:Account-B
 """)
     check_journal_entries(editor)
+
+
+def test_reload_modified_files(tmpdir):
+    journal_path = create_journal(tmpdir, """
+include "included.beancount"
+""")
+    included_path = create_journal(
+        tmpdir, """
+2015-01-01 * "Test transaction 1"
+  Assets:Account-A  100 USD
+  Assets:Account-B
+
+2015-02-01 * "Test transaction 2"
+  Assets:Account-A  100 USD
+  Assets:Account-B
+""",
+        name='included.beancount')
+    editor = journal_editor.JournalEditor(journal_path)
+    assert editor.reload_modified_files() == journal_editor.ReloadModifiedFilesResult(
+        [], [], [], [], [])
+    entry1, entry2 = editor.entries
+
+    create_journal(
+        tmpdir, """
+
+2015-02-01 * "Test transaction 2"
+  Assets:Account-A  100 USD
+  Assets:Account-B
+
+2015-03-01 * "Test transaction 3"
+  Assets:Account-A  100 USD
+  Assets:Account-B
+""",
+        name='included.beancount')
+    mtime = os.stat(included_path).st_mtime + 10
+    os.utime(included_path, (mtime, mtime))
+    result = editor.reload_modified_files()
+    assert result is not None
+    assert result.modified_filenames == [os.path.realpath(included_path)]
+    assert result.old_entries == [entry1]
+    assert [entry.narration for entry in result.new_entries
+            ] == ['Test transaction 3']
+    assert editor.entries[0] is entry2
+    assert entry2.meta['lineno'] == 3
+    assert entry2.postings[0].meta['lineno'] == 4
+    check_journal_entries(editor)
+
+    # Modifications to the top-level journal cannot be reloaded incrementally.
+    create_journal(tmpdir, """
+include "included.beancount"
+2015-01-01 open Assets:Account-A
+""")
+    mtime = os.stat(journal_path).st_mtime + 10
+    os.utime(journal_path, (mtime, mtime))
+    assert editor.reload_modified_files() is None
+
+
+def test_reload_modified_files_booking(tmpdir):
+    journal_path = create_journal(
+        tmpdir, """
+include "included.beancount"
+
+2015-01-01 open Assets:Account-A
+2015-01-01 open Assets:Account-B
+2015-01-01 open Assets:Stock  "FIFO"
+
+2015-01-01 * "Buy"
+  Assets:Stock  10 HOOL {10 USD}
+  Assets:Account-A
+""")
+    included_path = create_journal(
+        tmpdir, """
+2015-02-01 * "Test transaction 1"
+  Assets:Account-A  100 USD
+  Assets:Account-B
+""",
+        name='included.beancount')
+    editor = journal_editor.JournalEditor(journal_path)
+
+    def modify_included(contents: str) -> None:
+        create_journal(tmpdir, contents, name='included.beancount')
+        mtime = os.stat(included_path).st_mtime + 10
+        os.utime(included_path, (mtime, mtime))
+
+    # Postings without a cost are interpolated as when loading the journal.
+    modify_included("""
+2015-02-01 * "Test transaction 1"
+  Assets:Account-A  100 USD
+  Assets:Account-B
+
+2015-03-01 * "Test transaction 2"
+  Assets:Account-A  50 USD
+  Assets:Account-B
+""")
+    assert editor.reload_modified_files() is not None
+    assert clean_entries(editor.entries) == clean_entries(
+        journal_editor.JournalEditor(journal_path).entries)
+    assert editor.errors == []
+
+    # Reducing a lot from another file requires loading the whole journal.
+    modify_included("""
+2015-04-01 * "Sell"
+  Assets:Stock  -5 HOOL {}
+  Assets:Account-A  50 USD
+""")
+    num_entries = len(editor.entries)
+    assert editor.reload_modified_files() is None
+    assert len(editor.entries) == num_entries
+
+
+def test_mapped_lines(tmpdir, monkeypatch):
+    # Small chunk sizes check newlines at and across chunk boundaries.
+    for chunk_size in [1, 2, 3, journal_editor._LINE_SCAN_CHUNK_SIZE]:
+        monkeypatch.setattr(journal_editor, '_LINE_SCAN_CHUNK_SIZE', chunk_size)
+        for contents in ['', 'a', 'a\n', '\n\nb\n', 'caf\u00e9\r\nb\r\n']:
+            path = create_journal(tmpdir, contents)
+            lines = journal_editor._MappedLines(path)
+            expected_lines = journal_editor._get_journal_contents(path).split(
+                '\n')
+            assert len(lines) == len(expected_lines)
+            assert list(lines) == expected_lines
+            assert lines[-1] == expected_lines[-1]
+            assert lines[1:] == expected_lines[1:]
+            lines.close()
+            assert len(lines) == len(expected_lines)
+
+
+def test_mmap_lines(tmpdir):
+    journal_path = create_journal(
+        tmpdir, """
+2015-01-01 * "Test transaction 1"
+  Assets:Account-A  100 USD
+  Assets:Account-B
+
+2015-02-01 * "Test transaction 2"
+  Assets:Account-A  100 USD
+  Assets:Account-B
+""")
+    editor = journal_editor.JournalEditor(journal_path, mmap_lines=True)
+    stage = editor.stage_changes()
+    old_entry = editor.entries[0]
+    stage.change_entry(old_entry,
+                       old_entry._replace(narration='Modified transaction'))
+    stage.apply()
+    expected_contents = """
+2015-01-01 * "Modified transaction"
+  Assets:Account-A  100 USD
+  Assets:Account-B
+
+2015-02-01 * "Test transaction 2"
+  Assets:Account-A  100 USD
+  Assets:Account-B
+"""
+    check_file_contents(journal_path, expected_contents)
+    # The written file is mapped again.
+    lines = editor.cached_lines[os.path.realpath(journal_path)]
+    assert isinstance(lines, journal_editor._MappedLines)
+    assert '\n'.join(lines) == expected_contents
+    check_journal_entries(editor)
+
+
+def test_parse_cache(tmpdir, monkeypatch):
+    journal_path = create_journal(
+        tmpdir, """
+include "a.beancount"
+include "b.beancount"
+""")
+    create_journal(
+        tmpdir, """
+2015-01-01 * "Test transaction 1"
+  Assets:Account-A  100 USD
+  Assets:Account-B
+""",
+        name='a.beancount')
+    b_path = create_journal(
+        tmpdir, """
+2015-02-01 * "Test transaction 2"
+  Assets:Account-A  100 USD
+  Assets:Account-B
+""",
+        name='b.beancount')
+    parse_cache_dir = str(tmpdir.join('parse_cache'))
+
+    orig_parse_file = beancount.parser.parser.parse_file
+    parsed_filenames = []
+
+    def parse_file(filename, **kw):
+        parsed_filenames.append(os.path.basename(filename))
+        return orig_parse_file(filename, **kw)
+
+    monkeypatch.setattr(beancount.parser.parser, 'parse_file', parse_file)
+
+    editor = journal_editor.JournalEditor(
+        journal_path, parse_cache_dir=parse_cache_dir)
+    assert sorted(parsed_filenames) == [
+        'a.beancount', 'b.beancount', 'journal.beancount'
+    ]
+    assert len(os.listdir(parse_cache_dir)) == 3
+
+    del parsed_filenames[:]
+    cached_editor = journal_editor.JournalEditor(
+        journal_path, parse_cache_dir=parse_cache_dir)
+    assert parsed_filenames == []
+    assert clean_entries(cached_editor.entries) == clean_entries(editor.entries)
+    assert cached_editor.journal_load_time == editor.journal_load_time
+
+    create_journal(
+        tmpdir, """
+2015-02-01 * "Test transaction 2"
+  Assets:Account-A  50 USD
+  Assets:Account-B
+""",
+        name='b.beancount')
+    del parsed_filenames[:]
+    cached_editor = journal_editor.JournalEditor(
+        journal_path, parse_cache_dir=parse_cache_dir)
+    assert parsed_filenames == ['b.beancount']
+    uncached_editor = journal_editor.JournalEditor(journal_path)
+    assert clean_entries(cached_editor.entries) == clean_entries(
+        uncached_editor.entries)
+    assert cached_editor.entries[1].postings[1].units == Amount(
+        Decimal('-50'), 'USD')
+
+
+def test_parallel_parse(tmpdir):
+    journal_path = create_journal(
+        tmpdir, """
+option "operating_currency" "USD"
+include "a.beancount"
+include "missing.beancount"
+include "b.beancount"
+
+2015-03-01 * "Test transaction 3"
+  Assets:Account-A  25 USD
+  Assets:Account-B
+""")
+    create_journal(
+        tmpdir, """
+include "b.beancount"
+
+2015-01-01 * "Test transaction 1"
+  Assets:Account-A  100 USD
+  Assets:Account-B
+""",
+        name='a.beancount')
+    create_journal(
+        tmpdir, """
+2015-02-01 * "Test transaction 2"
+  Assets:Account-A  50 USD
+  Assets:Account-B
+""",
+        name='b.beancount')
+
+    editor = journal_editor.JournalEditor(journal_path)
+    parallel_editor = journal_editor.JournalEditor(
+        journal_path, parse_processes=2)
+    assert clean_entries(parallel_editor.entries) == clean_entries(
+        editor.entries)
+    assert parallel_editor.journal_load_time == editor.journal_load_time
+    assert parallel_editor.options_map['include'] == editor.options_map[
+        'include']
+    assert parallel_editor.options_map['operating_currency'] == ['USD']
+    assert ([e[1] for e in parallel_editor.errors] ==
+            [e[1] for e in editor.errors])
+
+    loader_entries, _, loader_options_map = beancount.loader.load_file(
+        journal_path)
+    assert clean_entries(editor.entries) == clean_entries(loader_entries)
+    assert editor.options_map['include'] == loader_options_map['include']
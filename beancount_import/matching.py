@@ -93,6 +93,10 @@ The `get_extended_transactions` function implements the computation of merged
 transactions as a depth-first search over the space of merged transactions.
 Given a merged transaction, the child states, corresponding to merging in one
 additional transaction, are computed by `get_single_step_extended_transactions`.
+The search may be bounded by a `SearchLimits` (depth, number of explored states
+and wall-clock time) through `search_extended_transactions`, in which case the
+merged transactions found before a limit was reached are returned and the result
+is flagged as truncated.
 
 Two transactions `a` and `b` are merged by matching distinct and disjoint
 subsets of postings in `a` with distinct and disjoint subsets of postings in
@@ -120,9 +124,13 @@ set.  The resulting sum must equal 0 within a small tolerance.
 
 """
 
+import bisect
 import datetime
 import collections
+import decimal
 import itertools
+import threading
+import time
 from typing import Sequence, Tuple, List, NamedTuple, Dict, Callable, Optional, Iterable, Set, cast, FrozenSet, Union, Any
 
 from beancount.core.number import MISSING, ZERO, Decimal
@@ -146,7 +154,24 @@ MERGEABLE_FIXME_ACCOUNT_PREFIX = FIXME_ACCOUNT + ':'
 
 DEBUG = False
 
+# If `True`, `compute_balanced_match_group` prunes partial match sets whose sum
+# can no longer be balanced by the opposite-sign match sets.  This does not
+# affect the results, only the amount of work performed.
+PRUNE_UNBALANCEABLE_MATCH_SETS = True
+
+# If `True`, aggregate posting subsets (see `get_aggregate_posting_candidates`)
+# are only materialized for matching if their total weight may actually be
+# matched: by a single posting of the other transaction in
+# `get_combined_transactions`, or by a posting in the `PostingDatabase` in
+# `get_single_step_extended_transactions`.  This does not affect the results,
+# only the amount of work performed.
+LAZY_AGGREGATE_POSTINGS = True
+
 IsClearedFunction = Callable[[Posting], bool]
+
+# Called with the currency and total units of a candidate aggregate posting
+# subset; returns `False` if the subset should be skipped.
+AggregateTotalFilter = Callable[[str, Decimal], bool]
 MatchGroupKey = NamedTuple('MatchGroupKey', [('currency', str),
                                              ('is_positive', bool)])
 WeightedPosting = NamedTuple('WeightedPosting', [('posting', Posting),
@@ -206,20 +231,85 @@ def _entry_and_posting_ids_key(entry: Transaction, mp: MatchablePosting):
     return (id(entry), ) + tuple(id(p) for p in mp.source_postings)
 
 
-# Key used for querying postings by date.
-DatabaseDateKey = datetime.date
-
 # Key used for querying postings by special metadata field, such as `check`.
 # account, key, value
 DatabaseMetadataKey = Tuple[str, str, Any]
 
+# Key used for querying postings by weight: currency, quantized amount.  The
+# quantized amount is the index of the `fuzzy_match_amount`-sized bucket
+# containing the weight, or the exact weight if `fuzzy_match_amount` is 0.
+DatabaseAmountKey = Tuple[str, Union[int, Decimal]]
+
 SourcePostingIds = Tuple[int, ...]
 
 # Keyed by the sequence of source_posting ids.
 DatabaseValues = Dict[SourcePostingIds, Tuple[Transaction, MatchablePosting]]
 
+# Sort key of a posting within an amount bucket: date, insertion sequence
+# number.  The sequence number preserves insertion order among postings with the
+# same date.
+DatabaseDateOrderKey = Tuple[datetime.date, int]
+
 CHECK_KEY = 'check'
 
+
+class _AmountBucket(object):
+    """Postings with weights in a single `DatabaseAmountKey` bucket.
+
+    The postings are kept sorted by `DatabaseDateOrderKey`, so that the postings
+    within a date range can be found by bisection.
+    """
+
+    def __init__(self) -> None:
+        self.order_keys = []  # type: List[DatabaseDateOrderKey]
+        self.source_posting_ids = []  # type: List[SourcePostingIds]
+        self.values = {}  # type: Dict[SourcePostingIds, Tuple[DatabaseDateOrderKey, Transaction, MatchablePosting]]
+
+    def add(self, order_key: DatabaseDateOrderKey,
+            source_posting_ids: SourcePostingIds, entry: Transaction,
+            mp: MatchablePosting) -> None:
+        self.remove(source_posting_ids)
+        pos = bisect.bisect_right(self.order_keys, order_key)
+        self.order_keys.insert(pos, order_key)
+        self.source_posting_ids.insert(pos, source_posting_ids)
+        self.values[source_posting_ids] = (order_key, entry, mp)
+
+    def remove(self, source_posting_ids: SourcePostingIds) -> None:
+        value = self.values.pop(source_posting_ids, None)
+        if value is None:
+            return
+        pos = bisect.bisect_left(self.order_keys, value[0])
+        del self.order_keys[pos]
+        del self.source_posting_ids[pos]
+
+    def __getstate__(self):
+        # `SourcePostingIds` are object ids, which are not preserved by
+        # pickling.  Save just the values in order, and recompute the keys when
+        # unpickling.
+        return [self.values[ids] for ids in self.source_posting_ids]
+
+    def __setstate__(self, state):
+        self.order_keys = [value[0] for value in state]
+        self.source_posting_ids = [
+            _entry_and_posting_ids_key(entry, mp) for _, entry, mp in state
+        ]
+        self.values = dict(zip(self.source_posting_ids, state))
+
+    def find(self, min_date: datetime.date, max_date: datetime.date
+             ) -> Iterable[Tuple[DatabaseDateOrderKey, SourcePostingIds,
+                                 Transaction, MatchablePosting]]:
+        begin_pos = bisect.bisect_left(self.order_keys, (min_date, ))
+        end_pos = bisect.bisect_left(self.order_keys,
+                                     (max_date + datetime.timedelta(days=1), ))
+        for pos in range(begin_pos, end_pos):
+            source_posting_ids = self.source_posting_ids[pos]
+            order_key, entry, mp = self.values[source_posting_ids]
+            yield order_key, source_posting_ids, entry, mp
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
 class PostingDatabase(object):
     def __init__(self, fuzzy_match_days: int,
                  fuzzy_match_amount: Decimal,
@@ -228,16 +318,162 @@ class PostingDatabase(object):
         self.fuzzy_match_days = fuzzy_match_days
         self.fuzzy_match_amount = fuzzy_match_amount
         self.is_cleared = is_cleared
-        self._postings = {}  # type: Dict[DatabaseDateKey, DatabaseValues]
+        self._amount_postings = {
+        }  # type: Dict[DatabaseAmountKey, _AmountBucket]
         self._keyed_postings = {
         }  # type: Dict[DatabaseMetadataKey, DatabaseValues]
         self.metadata_keys = metadata_keys
+        # Decimal version of `fuzzy_match_amount` (which may be specified as a
+        # float) used as the amount bucket size, or `None` if weights must
+        # match exactly.
+        amount_bucket_size = Decimal(str(fuzzy_match_amount))
+        self._amount_bucket_size = (amount_bucket_size
+                                    if amount_bucket_size > ZERO else
+                                    None)  # type: Optional[Decimal]
+        self._next_sequence_number = 0
+        # Maps the id of each transaction added to the database to the
+        # transaction itself (which keeps the id from being reused) and its
+        # matchable postings.
+        self._matchable_postings_cache = {
+        }  # type: Dict[int, Tuple[Transaction, List[MatchablePosting]]]
+        self.matchable_postings_cache_hits = 0
+        self.matchable_postings_cache_misses = 0
+
+    def __getstate__(self):
+        # Object ids used as keys are not preserved by pickling, and are
+        # recomputed when unpickling.
+        state = self.__dict__.copy()
+        state['_keyed_postings'] = {
+            key: list(group.values())
+            for key, group in self._keyed_postings.items()
+        }
+        state['_matchable_postings_cache'] = list(
+            self._matchable_postings_cache.values())
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._keyed_postings = {
+            key: {
+                _entry_and_posting_ids_key(entry, mp): (entry, mp)
+                for entry, mp in values
+            }
+            for key, values in state['_keyed_postings'].items()
+        }
+        self._matchable_postings_cache = {
+            id(value[0]): value
+            for value in state['_matchable_postings_cache']
+        }
+
+    def get_matchable_postings(self, transaction: Transaction,
+                               store: bool = False) -> List[MatchablePosting]:
+        """Returns the matchable postings of `transaction`.
+
+        The result is looked up in the cache of matchable postings of
+        transactions added to the database, and computed by calling
+        `get_matchable_postings_from_transaction` if not present.
+
+        :param store: If `True`, a computed result is added to the cache.
+        :returns: The list of matchable postings, which must not be modified.
+        """
+        cached = self._matchable_postings_cache.get(id(transaction))
+        if cached is not None and cached[0] is transaction:
+            self.matchable_postings_cache_hits += 1
+            return cached[1]
+        self.matchable_postings_cache_misses += 1
+        matchable_postings = list(
+            get_matchable_postings_from_transaction(transaction,
+                                                    self.is_cleared))
+        if store:
+            self._matchable_postings_cache[id(transaction)] = (
+                transaction, matchable_postings)
+        return matchable_postings
+
+    def get_query_matchable_postings(
+            self, transaction: Transaction) -> List[MatchablePosting]:
+        """Returns the matchable postings of `transaction` that may have
+        matches in the database.
+
+        If `LAZY_AGGREGATE_POSTINGS` is `True`, aggregate postings whose weight
+        is not within `fuzzy_match_amount` of the weight of any posting in the
+        database are excluded, and are not materialized at all if the
+        matchable postings of `transaction` are not already cached.
+        """
+        if not LAZY_AGGREGATE_POSTINGS:
+            return self.get_matchable_postings(transaction)
+        cached = self._matchable_postings_cache.get(id(transaction))
+        if cached is not None and cached[0] is transaction:
+            self.matchable_postings_cache_hits += 1
+            return [
+                mp for mp in cached[1] if len(mp.source_postings) == 1 or
+                self.has_weight(mp.weight.currency, mp.weight.number)
+            ]
+        self.matchable_postings_cache_misses += 1
+        return list(
+            get_matchable_postings(
+                get_weighted_postings(transaction.postings),
+                self.is_cleared,
+                aggregate_total_filter=self.has_weight))
+
+    def has_weight(self, currency: str, number: Decimal) -> bool:
+        """Returns `True` if the database contains a posting with a weight
+        within `fuzzy_match_amount` of `number` in `currency`."""
+        amount = Amount(number, currency)
+        if self._amount_bucket_size is None:
+            return self._get_amount_keys(amount)[0] in self._amount_postings
+        for amount_key in self._get_amount_keys(amount):
+            bucket = self._amount_postings.get(amount_key)
+            if bucket is None:
+                continue
+            for _, _, mp in bucket.values.values():
+                if abs(mp.weight.number - number) <= self.fuzzy_match_amount:
+                    return True
+        return False
+
+    def invalidate_matchable_postings(
+            self, transaction: Optional[Transaction] = None) -> None:
+        """Removes the cached matchable postings of `transaction`, or of all
+        transactions if `transaction` is `None`.
+
+        This must be called if the result of `is_cleared` changes for a
+        posting of a transaction already in the database.  The transaction
+        must first be removed from the database using the stale matchable
+        postings.
+        """
+        if transaction is None:
+            self._matchable_postings_cache.clear()
+        else:
+            self._matchable_postings_cache.pop(id(transaction), None)
 
     def get_fuzzy_date_range(self, orig_date: datetime.date):
         for day_offset in range(-self.fuzzy_match_days,
                                 self.fuzzy_match_days + 1):
             yield orig_date + datetime.timedelta(days=day_offset)
 
+    def _get_amount_bucket(self, number: Decimal) -> Union[int, Decimal]:
+        bucket_size = self._amount_bucket_size
+        if bucket_size is None:
+            return number
+        return int((number / bucket_size).to_integral_value(
+            rounding=decimal.ROUND_FLOOR))
+
+    def _get_amount_keys(self, amount: Amount) -> List[DatabaseAmountKey]:
+        """Returns the keys of all buckets that may contain weights matching
+        `amount`."""
+        if self._amount_bucket_size is None:
+            return [(amount.currency, amount.number)]
+        first_bucket = self._get_amount_bucket(amount.number -
+                                               self._amount_bucket_size)
+        last_bucket = self._get_amount_bucket(amount.number +
+                                              self._amount_bucket_size)
+        return [(amount.currency, bucket)
+                for bucket in range(cast(int, first_bucket),
+                                    cast(int, last_bucket) + 1)]
+
+    def _get_posting_amount_key(self,
+                                mp: MatchablePosting) -> DatabaseAmountKey:
+        return (mp.weight.currency, self._get_amount_bucket(mp.weight.number))
+
     def add_posting(self, entry: Transaction, mp: MatchablePosting):
         source_posting_ids = _entry_and_posting_ids_key(entry, mp)
 
@@ -250,12 +486,16 @@ class PostingDatabase(object):
                 group = self._keyed_postings.setdefault((account, key, value), {})
                 group[source_posting_ids] = (entry, mp)
 
-        group = self._postings.setdefault(_date_key(entry, mp), {})
-        group[source_posting_ids] = (entry, mp)
+        amount_key = self._get_posting_amount_key(mp)
+        bucket = self._amount_postings.get(amount_key)
+        if bucket is None:
+            bucket = self._amount_postings[amount_key] = _AmountBucket()
+        order_key = (_date_key(entry, mp), self._next_sequence_number)
+        self._next_sequence_number += 1
+        bucket.add(order_key, source_posting_ids, entry, mp)
 
     def add_transaction(self, transaction: Transaction):
-        for mp in get_matchable_postings_from_transaction(
-                transaction, self.is_cleared):
+        for mp in self.get_matchable_postings(transaction, store=True):
             self.add_posting(transaction, mp)
 
     def remove_posting(self, entry: Transaction, mp: MatchablePosting):
@@ -271,14 +511,17 @@ class PostingDatabase(object):
                 if group is not None:
                     group.pop(source_posting_ids, None)
 
-        group = self._postings.get(_date_key(entry, mp))
-        if group is not None:
-            group.pop(source_posting_ids, None)
+        amount_key = self._get_posting_amount_key(mp)
+        bucket = self._amount_postings.get(amount_key)
+        if bucket is not None:
+            bucket.remove(source_posting_ids)
+            if not bucket:
+                del self._amount_postings[amount_key]
 
     def remove_transaction(self, transaction: Transaction):
-        for mp in get_matchable_postings_from_transaction(
-                transaction, self.is_cleared):
+        for mp in self.get_matchable_postings(transaction):
             self.remove_posting(transaction, mp)
+        self.invalidate_matchable_postings(transaction)
 
     def get_posting_matches(self,
                             entry: Transaction,
@@ -315,25 +558,41 @@ class PostingDatabase(object):
     def _get_matches(
             self, account: str, date: datetime.date, amount: Amount,
             is_date_exact: bool) -> DatabaseValues:
-        matches = dict() # type: DatabaseValues
-        for adjusted_date in self.get_fuzzy_date_range(date):
-            cur_matches = self._postings.get(adjusted_date)
-            if cur_matches is not None:
-                for key, (entry, mp) in cur_matches.items():
-                    posting = mp.posting
-                    # Verify that the account is compatible.
-                    if not are_accounts_mergeable(account, posting.account):
-                        continue
+        """Returns the postings within `fuzzy_match_days` of `date` and within
+        `fuzzy_match_amount` of `amount` with an account compatible with
+        `account`.
+
+        Only the amount buckets that may contain matching weights are examined.
+        The results are ordered by date, then by insertion order.
+        """
+        min_date = date - datetime.timedelta(days=self.fuzzy_match_days)
+        max_date = date + datetime.timedelta(days=self.fuzzy_match_days)
+        matches = [
+        ]  # type: List[Tuple[DatabaseDateOrderKey, SourcePostingIds, Transaction, MatchablePosting]]
+        for amount_key in self._get_amount_keys(amount):
+            bucket = self._amount_postings.get(amount_key)
+            if bucket is None:
+                continue
+            for order_key, key, entry, mp in bucket.find(min_date, max_date):
+                if abs(mp.weight.number -
+                       amount.number) > self.fuzzy_match_amount:
+                    continue
+                posting = mp.posting
+                # Verify that the account is compatible.
+                if not are_accounts_mergeable(account, posting.account):
+                    continue
 
-                    # Verify that the date is compatible.
-                    if is_date_exact:
-                        posting_date = posting.meta and posting.meta.get(
-                            POSTING_DATE_KEY)
-                        if posting_date and posting_date != date:
-                            continue
+                # Verify that the date is compatible.
+                if is_date_exact:
+                    posting_date = posting.meta and posting.meta.get(
+                        POSTING_DATE_KEY)
+                    if posting_date and posting_date != date:
+                        continue
 
-                    matches[key] = (entry, mp)
-        return self._get_weight_matches(amount, matches)
+                matches.append((order_key, key, entry, mp))
+        matches.sort(key=lambda x: x[0])
+        return collections.OrderedDict(
+            (key, (entry, mp)) for _, key, entry, mp in matches)
 
     def _get_weight_matches(
             self,
@@ -346,6 +605,69 @@ class PostingDatabase(object):
             abs(mp.weight.number - amount.number) <= self.fuzzy_match_amount
         }
 
+
+class RecordingPostingDatabase(object):
+    """Wraps a `PostingDatabase`, recording the queries made through it.
+
+    This can be passed in place of a `PostingDatabase` to
+    `search_extended_transactions` in order to later determine, by calling
+    `is_affected_by`, whether the result of the search may be affected by
+    changes made to the underlying database after the search.
+    """
+
+    def __init__(self, posting_db: PostingDatabase) -> None:
+        self.posting_db = posting_db
+        self.is_cleared = posting_db.is_cleared
+        self.queries = collections.OrderedDict(
+        )  # type: Dict[Tuple[int, int, bool], Tuple[Transaction, Posting, bool]]
+        self.matched_transactions = {}  # type: Dict[int, Transaction]
+
+    def get_posting_matches(self,
+                            entry: Transaction,
+                            posting: Posting,
+                            negate=False) -> List[Tuple[Transaction, MatchablePosting]]:
+        self.queries.setdefault((id(entry), id(posting), negate),
+                                (entry, posting, negate))
+        matches = self.posting_db.get_posting_matches(
+            entry, posting, negate=negate)
+        for transaction, _ in matches:
+            self.matched_transactions[id(transaction)] = transaction
+        return matches
+
+    def get_matchable_postings(self, transaction: Transaction,
+                               store: bool = False) -> List[MatchablePosting]:
+        return self.posting_db.get_matchable_postings(transaction, store=store)
+
+    def get_query_matchable_postings(
+            self, transaction: Transaction) -> List[MatchablePosting]:
+        # Whether an aggregate posting is queried depends on the contents of
+        # the database, so all matchable postings must be queried in order for
+        # `is_affected_by` to account for them.
+        return self.posting_db.get_matchable_postings(transaction)
+
+    def is_affected_by(self, removed_transactions: Iterable[Transaction],
+                       added_transactions: Iterable[Transaction]) -> bool:
+        """Returns `True` if removing `removed_transactions` from and adding
+        `added_transactions` to the underlying database could change the result
+        of any recorded query.
+        """
+        if any(
+                id(transaction) in self.matched_transactions
+                for transaction in removed_transactions):
+            return True
+        posting_db = self.posting_db
+        added_db = PostingDatabase(
+            fuzzy_match_days=posting_db.fuzzy_match_days,
+            fuzzy_match_amount=posting_db.fuzzy_match_amount,
+            is_cleared=posting_db.is_cleared,
+            metadata_keys=posting_db.metadata_keys)
+        for transaction in added_transactions:
+            added_db.add_transaction(transaction)
+        return any(
+            added_db.get_posting_matches(entry, posting, negate=negate)
+            for entry, posting, negate in self.queries.values())
+
+
 def is_entry_from_journal(entry: Transaction):
     return entry.meta and 'filename' in entry.meta
 
@@ -685,7 +1007,9 @@ def is_mergeable_unknown_account(account: str):
 
 
 def get_aggregate_posting_candidates(
-        postings: Iterable[Posting], is_cleared: IsClearedFunction
+        postings: Iterable[Posting],
+        is_cleared: IsClearedFunction,
+        total_filter: Optional[AggregateTotalFilter] = None
 ) -> List[Tuple[Posting, Tuple[Posting, ...]]]:
     """Computes valid subsets of `postings` that may be used for matching.
 
@@ -707,6 +1031,9 @@ def get_aggregate_posting_candidates(
 
     The returned subsets are not, in general, disjoint.
 
+    :param total_filter: If specified, only subsets for which
+        `total_filter(currency, total)` returns `True` are returned.  The
+        synthesized postings for other subsets are never created.
     :returns: The list of pairs of `(effective_posting, source_postings)`, where
         `source_postings` is the list of postings in the subset and
         `effective_posting` is a synthesized posting with the common account and
@@ -728,6 +1055,8 @@ def get_aggregate_posting_candidates(
 
     def add_subset(account, currency, subset):
         total = sum(x.units.number for x in subset)
+        if total_filter is not None and not total_filter(currency, total):
+            return
         aggregate_posting = Posting(
             account=account,
             units=Amount(currency=currency, number=total),
@@ -759,7 +1088,9 @@ def get_weighted_postings(postings: Sequence[Posting]) -> List[WeightedPosting]:
 
 def get_matchable_postings(
         weighted_postings: Sequence[WeightedPosting],
-        is_cleared: IsClearedFunction) -> Iterable[MatchablePosting]:
+        is_cleared: IsClearedFunction,
+        aggregate_total_filter: Optional[AggregateTotalFilter] = None
+) -> Iterable[MatchablePosting]:
     """Returns the list of all valid MatchablePosting objects.
 
     A MatchablePosting corresponds to a subset of one or more underlying Posting
@@ -770,23 +1101,31 @@ def get_matchable_postings(
     This returns both MatchablePosting objects corresponding to a singleton
     posting set as well as MatchablePosting objects corresponding to multiple
     underlying postings.
+
+    :param aggregate_total_filter: Passed as the `total_filter` to
+        `get_aggregate_posting_candidates`.
     """
     for p, weight in weighted_postings:
         if weight is None:
             continue
         yield MatchablePosting(p, weight, (p, ))
     for p, all_ps in get_aggregate_posting_candidates(
-        (p for p, _ in weighted_postings), is_cleared):
+        (p for p, _ in weighted_postings), is_cleared,
+            total_filter=aggregate_total_filter):
         yield MatchablePosting(p, p.units, all_ps)
 
 
 def get_matchable_posting_groups(
         weighted_postings: Sequence[WeightedPosting],
-        is_cleared: IsClearedFunction
+        is_cleared: IsClearedFunction,
+        aggregate_total_filter: Optional[AggregateTotalFilter] = None
 ) -> Dict[MatchGroupKey, List[MatchablePosting]]:
     results = collections.OrderedDict(
     )  # type: Dict[MatchGroupKey, List[MatchablePosting]]
-    for mp in get_matchable_postings(weighted_postings, is_cleared):
+    for mp in get_matchable_postings(
+            weighted_postings,
+            is_cleared,
+            aggregate_total_filter=aggregate_total_filter):
         key = get_match_group_key(mp.weight)
         results.setdefault(key, []).append(mp)
     return results
@@ -925,10 +1264,30 @@ def is_removal_candidate(mp: MatchablePosting) -> bool:
     return True
 
 
+def get_max_single_sign_match_total(
+        matchable_postings: SingleSignMatchablePostings) -> Decimal:
+    """Returns an upper bound on the absolute value of the sum of any single-sign
+    PostingMatchSet computed by `compute_single_sign_match_groups`.
+
+    The sum of a PostingMatchSet is the sum of the weights of the matched
+    postings from the first transaction, which are disjoint, plus the weights of
+    at most one removed posting from each transaction.  Since all weights have
+    the same sign, it is bounded by the sum of the weights of all single
+    postings of the first transaction plus the largest weight of a removal
+    candidate of the second transaction.
+    """
+    total = sum((abs(mp.weight.number) for mp in matchable_postings[0]
+                 if len(mp.source_postings) == 1), ZERO)
+    total += max((abs(mp.weight.number) for mp in matchable_postings[1]
+                  if is_removal_candidate(mp)), default=ZERO)
+    return total
+
+
 def compute_single_sign_match_groups(
         matchable_postings: SingleSignMatchablePostings,
         is_cleared: IsClearedFunction,
-        max_residual: Decimal) -> SingleSignMatchGroups:
+        max_residual: Decimal,
+        max_opposite_total: Optional[Decimal] = None) -> SingleSignMatchGroups:
     """Given a list of single-sign matchable postings for each of two transactions,
     computes the list of valid PostingMatchSet objects.  A PostingMatchSet is a
     set of non-conflicting valid matches between matchable postings in the first
@@ -951,8 +1310,24 @@ def compute_single_sign_match_groups(
     constraints: the MatchablePosting must satisfy `is_removal_candidate`, and
     it must not be possible to replace the removal with a regualr match that
     does not conflict with any existing matches in the PostingMatchSet.
+
+    If `max_opposite_total` is not `None`, it must be an upper bound on the
+    absolute value of the sum of any opposite-sign PostingMatchSet (as computed
+    by `get_max_single_sign_match_total`).  Since extending a PostingMatchSet
+    can only increase the absolute value of its sum, a PostingMatchSet whose sum
+    exceeds `max_opposite_total + max_residual` in absolute value, along with
+    all of its extensions, cannot be part of a balanced match and is omitted
+    from the result.
     """
 
+    if max_opposite_total is None:
+        max_total = None  # type: Optional[Decimal]
+    else:
+        max_total = max_opposite_total + max_residual
+
+    def can_balance(total: Decimal) -> bool:
+        return max_total is None or abs(total) <= max_total
+
     b_lookup_table = SortedList(
         (x.weight.number, x) for x in matchable_postings[1])
 
@@ -988,6 +1363,8 @@ def compute_single_sign_match_groups(
                 # Exclude this removal candidate if it is part of the match set.
                 if id(x.posting) in used_postings:
                     continue
+                if not can_balance(current_sum + x.weight.number):
+                    continue
 
                 # Exclude this removal candidate if it can be matched.  We have
                 # already verified that it is not part of the match set, so we
@@ -1008,6 +1385,9 @@ def compute_single_sign_match_groups(
             for b in removal_candidates[1]:
                 if id(b.posting) in used_postings:
                     continue
+                if not can_balance(current_sum + a.weight.number +
+                                   b.weight.number):
+                    continue
                 used_postings.add(id(b.posting))
                 if (not any(
                         used_postings.isdisjoint(
@@ -1036,8 +1416,11 @@ def compute_single_sign_match_groups(
                 continue
             # Consider match extensions that do not include `m`.
             consider_match_extensions(current_sum, matches, match_i + 1)
-            used_postings.update(posting_ids_in_match)
             new_sum = current_sum + m[0].weight.number
+            if not can_balance(new_sum):
+                # Neither this match set nor any extension of it can balance.
+                return
+            used_postings.update(posting_ids_in_match)
             new_matches = list(matches)
             new_matches.append(m)
             result.no_removals.append((new_sum, PostingMatchSet(
@@ -1120,20 +1503,43 @@ def filter_dominated_match_sets(
 
 # [[neg_a, neg_b], [pos_a, pos_b]]
 def compute_balanced_match_group(
-        matchable_postings: BothSignMatchablePostings, max_residual: Decimal,
-        is_cleared: IsClearedFunction) -> Sequence[PostingMatchSet]:
+        matchable_postings: BothSignMatchablePostings,
+        max_residual: Decimal,
+        is_cleared: IsClearedFunction,
+        prune: Optional[bool] = None) -> Sequence[PostingMatchSet]:
+    """Computes the balanced PostingMatchSet objects for a single currency.
+
+    :param prune: If `True`, partial match sets that cannot be balanced are
+        pruned while enumerating single-sign match sets.  Defaults to
+        `PRUNE_UNBALANCEABLE_MATCH_SETS`.  The result is the same either way.
+    """
     if any(
             all(not txn_matchable_postings
                 for txn_matchable_postings in single_sign_matchable_postings)
             for single_sign_matchable_postings in matchable_postings):
         return []
 
+    if prune is None:
+        prune = PRUNE_UNBALANCEABLE_MATCH_SETS
+
+    if prune:
+        max_opposite_totals = [
+            get_max_single_sign_match_total(single_sign_matchable_postings)
+            for single_sign_matchable_postings in reversed(matchable_postings)
+        ]  # type: Sequence[Optional[Decimal]]
+    else:
+        max_opposite_totals = [None, None]
+
     match_groups = cast(
         BothSignMatchGroups,
         tuple(
-            compute_single_sign_match_groups(single_sign_matchable_postings,
-                                             is_cleared, max_residual)
-            for single_sign_matchable_postings in matchable_postings))
+            compute_single_sign_match_groups(
+                single_sign_matchable_postings,
+                is_cleared,
+                max_residual,
+                max_opposite_total=max_opposite_total)
+            for single_sign_matchable_postings, max_opposite_total in zip(
+                matchable_postings, max_opposite_totals)))
 
     # Include the empty match in the result.
     results = [PostingMatchSet([], ())]
@@ -1150,6 +1556,32 @@ def compute_balanced_match_group(
     return filter_dominated_match_sets(results)
 
 
+def _get_aggregate_total_filter(
+        other_weighted_postings: Sequence[WeightedPosting],
+        max_residuals: SimpleInventory) -> AggregateTotalFilter:
+    """Returns a filter that accepts aggregate posting totals that are within
+    the max residual of the weight of one of `other_weighted_postings` with
+    the same sign."""
+    weights = {}  # type: Dict[MatchGroupKey, List[Decimal]]
+    for _, weight in other_weighted_postings:
+        if weight is None:
+            continue
+        weights.setdefault(get_match_group_key(weight),
+                           []).append(weight.number)
+    for numbers in weights.values():
+        numbers.sort()
+
+    def total_filter(currency: str, total: Decimal) -> bool:
+        numbers = weights.get(MatchGroupKey(currency, total > ZERO))
+        if numbers is None:
+            return False
+        max_residual = max_residuals.get(currency, ZERO)
+        i = bisect.bisect_left(numbers, total - max_residual)
+        return i < len(numbers) and numbers[i] <= total + max_residual
+
+    return total_filter
+
+
 def get_combined_transactions(txns: Tuple[Transaction, Transaction],
                               is_cleared: IsClearedFunction):
 
@@ -1157,9 +1589,28 @@ def get_combined_transactions(txns: Tuple[Transaction, Transaction],
 
     weighted_postings = [get_weighted_postings(txn.postings) for txn in txns]
 
+    max_residuals = get_max_residuals_from_weights(
+        *[[weight for _, weight in txn_weighted_postings]
+          for txn_weighted_postings in weighted_postings])
+
+    if LAZY_AGGREGATE_POSTINGS:
+        # Aggregate postings can only be matched with a single posting of the
+        # other transaction, so only subsets with a total within the max
+        # residual of the weight of such a posting are needed.
+        aggregate_total_filters = [
+            _get_aggregate_total_filter(other_weighted_postings, max_residuals)
+            for other_weighted_postings in reversed(weighted_postings)
+        ]  # type: Sequence[Optional[AggregateTotalFilter]]
+    else:
+        aggregate_total_filters = [None, None]
+
     matchable_posting_groups = [
-        get_matchable_posting_groups(txn_weighted_postings, is_cleared)
-        for txn_weighted_postings in weighted_postings
+        get_matchable_posting_groups(
+            txn_weighted_postings,
+            is_cleared,
+            aggregate_total_filter=aggregate_total_filter)
+        for txn_weighted_postings, aggregate_total_filter in zip(
+            weighted_postings, aggregate_total_filters)
     ]
 
     match_groups = collections.OrderedDict(
@@ -1168,10 +1619,6 @@ def get_combined_transactions(txns: Tuple[Transaction, Transaction],
         for key in txn_matchable_posting_groups
     )  # type: Dict[str, Sequence[PostingMatchSet]]
 
-    max_residuals = get_max_residuals_from_weights(
-        *[[weight for _, weight in txn_weighted_postings]
-          for txn_weighted_postings in weighted_postings])
-
     for currency in match_groups:
         matchable_postings = cast(
             BothSignMatchablePostings,
@@ -1342,7 +1789,7 @@ def get_single_step_extended_transactions(
     """Finds valid merges of `transaction` with a single additional transaction.
 
     This is done by first computing the set of `matchable_postings` by calling
-    `get_matchable_postings_from_transaction`.  Then the merged transactions are
+    `posting_db.get_query_matchable_postings`.  Then the merged transactions are
     computed in two steps:
 
     1. For each transaction in the `posting_db` containing a posting that
@@ -1357,9 +1804,7 @@ def get_single_step_extended_transactions(
 
     matching_transactions = collections.OrderedDict(
     )  # type: Dict[int, Transaction]
-    matchable_postings = list(
-        get_matchable_postings_from_transaction(transaction,
-                                                posting_db.is_cleared))
+    matchable_postings = posting_db.get_query_matchable_postings(transaction)
     transaction_constraint = IsTransactionMergeablePredicate(transaction)
     for mp in matchable_postings:
         for orig_matching_transaction, _ in _get_valid_posting_matches(
@@ -1411,18 +1856,50 @@ def get_single_step_extended_transactions(
             mp=mp)
 
 
-def get_extended_transactions(
+# Limits on the search performed by `search_extended_transactions`.  Each limit
+# may be `None` to indicate no limit.
+#
+# max_depth: Maximum number of additional transactions merged into the initial
+#     transaction.
+# max_states: Maximum number of distinct merged transaction states explored.
+# time_limit: Maximum wall-clock time in seconds.
+SearchLimits = NamedTuple('SearchLimits', [
+    ('max_depth', Optional[int]),
+    ('max_states', Optional[int]),
+    ('time_limit', Optional[float]),
+])
+
+UNLIMITED_SEARCH = SearchLimits(max_depth=None, max_states=None, time_limit=None)
+
+ExtendedTransactionsResult = NamedTuple(
+    'ExtendedTransactionsResult',
+    [('merged_transactions', List[MergedTransaction]), ('truncated', bool)])
+
+
+class _SearchLimitReached(Exception):
+    pass
+
+
+def search_extended_transactions(
         initial_transaction: Transaction,
-        posting_db: PostingDatabase) -> List[MergedTransaction]:
-    """Finds valid merges of `initial_transaction`.
+        posting_db: PostingDatabase,
+        limits: SearchLimits = UNLIMITED_SEARCH,
+        cancel_event: Optional[threading.Event] = None
+) -> ExtendedTransactionsResult:
+    """Finds valid merges of `initial_transaction`, subject to `limits`.
 
     Performs a depth-first search over the space of merged transactions.  The
     child states, corresponding to merging a single additional transaction with
     the existing merged transaction, are obtained by calling
     `get_single_step_extended_transactions`.
 
-    :returns: The list of merged transactions, ordered by
-        `merged_transaction_sort_key`.
+    If any of the `limits` is reached, the search stops early and the merged
+    transactions found so far are returned with `truncated` set to `True`.
+
+    :param cancel_event: If specified, the search likewise stops early once the
+        event is set, which may be done from another thread.
+    :returns: The merged transactions, ordered by `merged_transaction_sort_key`,
+        and whether the search was truncated.
     """
     used_transaction_ids = set()  # type: Set[int]
     used_transactions = []  # type: List[Transaction]
@@ -1431,6 +1908,12 @@ def get_extended_transactions(
 
     previously_seen_states = set()  # type: Set[CandidateIdentifier]
 
+    truncated = False
+
+    deadline = None  # type: Optional[float]
+    if limits.time_limit is not None:
+        deadline = time.monotonic() + limits.time_limit
+
     def maybe_extend_candidate(transaction: Transaction,
                                ref_transaction: Transaction, level: int):
         # Check if we have already seen this state.
@@ -1440,6 +1923,13 @@ def get_extended_transactions(
 
         state_id = get_candidate_identifier(transaction, used_transaction_ids)
         if state_id not in previously_seen_states:
+            if (limits.max_states is not None and
+                    len(previously_seen_states) >= limits.max_states):
+                raise _SearchLimitReached()
+            if deadline is not None and time.monotonic() > deadline:
+                raise _SearchLimitReached()
+            if cancel_event is not None and cancel_event.is_set():
+                raise _SearchLimitReached()
             previously_seen_states.add(state_id)
 
             if ref_transaction is not None:
@@ -1454,19 +1944,48 @@ def get_extended_transactions(
             del used_transactions[-1]
 
     def do_extend_candidate(transaction: Transaction, level: int):
-        for new_transaction, matching_transaction in get_single_step_extended_transactions(
-                transaction=transaction,
-                posting_db=posting_db,
-                excluded_transaction_ids=cast(FrozenSet[int],
-                                              used_transaction_ids),
-                debug_level=level):
+        nonlocal truncated
+        extensions = get_single_step_extended_transactions(
+            transaction=transaction,
+            posting_db=posting_db,
+            excluded_transaction_ids=cast(FrozenSet[int],
+                                          used_transaction_ids),
+            debug_level=level)
+        if limits.max_depth is not None and level >= limits.max_depth:
+            # Only record that the search was truncated if there is in fact a
+            # further extension that was not explored.
+            if next(iter(extensions), None) is not None:
+                truncated = True
+            return
+        for new_transaction, matching_transaction in extensions:
             maybe_extend_candidate(new_transaction, matching_transaction,
                                    level + 1)
 
-    maybe_extend_candidate(initial_transaction, initial_transaction, level=0)
+    try:
+        maybe_extend_candidate(initial_transaction, initial_transaction, level=0)
+    except _SearchLimitReached:
+        truncated = True
 
     results.sort(key=lambda x: merged_transaction_sort_key(x[0]))
-    return [
-        MergedTransaction(normalize_transaction(entry), used_transactions)
-        for entry, used_transactions in results
-    ]
+    return ExtendedTransactionsResult(
+        merged_transactions=[
+            MergedTransaction(normalize_transaction(entry), used_transactions)
+            for entry, used_transactions in results
+        ],
+        truncated=truncated)
+
+
+def get_extended_transactions(
+        initial_transaction: Transaction,
+        posting_db: PostingDatabase,
+        limits: SearchLimits = UNLIMITED_SEARCH) -> List[MergedTransaction]:
+    """Finds valid merges of `initial_transaction`.
+
+    This is equivalent to `search_extended_transactions`, except that the
+    indication of whether the search was truncated is discarded.
+
+    :returns: The list of merged transactions, ordered by
+        `merged_transaction_sort_key`.
+    """
+    return search_extended_transactions(initial_transaction, posting_db,
+                                        limits).merged_transactions
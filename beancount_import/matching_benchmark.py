@@ -0,0 +1,189 @@
+"""Benchmark for the transaction matching mechanism in `matching`.
+
+Generates a synthetic database of transactions, with a mix of transfers
+between accounts and multi-item orders charged to a credit card, and measures
+the time taken to compute the merged transaction candidates for each pending
+transaction with each of the optional matching optimizations enabled and
+disabled.
+
+Usage:
+
+    python -m beancount_import.matching_benchmark --num-transactions 2000
+"""
+
+import argparse
+import datetime
+import random
+import time
+from typing import List, Tuple
+
+from beancount.core.amount import Amount
+from beancount.core.data import Posting, Transaction, EMPTY_SET
+from beancount.core.number import D
+
+from . import matching
+
+
+def _make_posting(account: str, number, currency: str, cleared: bool) -> Posting:
+    meta = {'cleared': True} if cleared else None
+    return Posting(
+        account=account,
+        units=Amount(number, currency),
+        cost=None,
+        price=None,
+        flag=None,
+        meta=meta)
+
+
+def _make_transaction(date: datetime.date, narration: str,
+                      postings: List[Posting]) -> Transaction:
+    return Transaction(
+        meta={},
+        date=date,
+        flag='*',
+        payee=None,
+        narration=narration,
+        tags=EMPTY_SET,
+        links=EMPTY_SET,
+        postings=postings)
+
+
+def generate_transactions(num_transactions: int, max_items: int,
+                          seed: int) -> List[Transaction]:
+    """Generates `num_transactions` pending transactions.
+
+    Each transfer between two accounts results in two transactions, one from
+    each side.  Each order of up to `max_items` items results in an order
+    transaction with one unknown account posting per item, and a credit card
+    charge for the total.
+    """
+    rng = random.Random(seed)
+    start_date = datetime.date(2017, 1, 1)
+    transactions = []  # type: List[Transaction]
+    i = 0
+    while len(transactions) < num_transactions:
+        date = start_date + datetime.timedelta(days=rng.randrange(365))
+        other_date = date + datetime.timedelta(days=rng.randrange(4))
+        if rng.random() < 0.5:
+            number = D(rng.randrange(1, 100000)) / 100
+            transactions.append(
+                _make_transaction(date, 'Transfer %d' % i, [
+                    _make_posting('Assets:Checking', -number, 'USD', True),
+                    _make_posting(matching.FIXME_ACCOUNT, number, 'USD', False),
+                ]))
+            transactions.append(
+                _make_transaction(other_date, 'Transfer %d' % i, [
+                    _make_posting('Assets:Savings', number, 'USD', True),
+                    _make_posting(matching.FIXME_ACCOUNT, -number, 'USD',
+                                  False),
+                ]))
+        else:
+            items = [
+                D(rng.randrange(100, 5000)) / 100
+                for _ in range(rng.randint(1, max_items))
+            ]
+            total = sum(items)
+            transactions.append(
+                _make_transaction(date, 'Order %d' % i, [
+                    _make_posting('Liabilities:Credit-Card', -total, 'USD',
+                                  False),
+                ] + [
+                    _make_posting(matching.FIXME_ACCOUNT, item, 'USD', False)
+                    for item in items
+                ]))
+            transactions.append(
+                _make_transaction(other_date, 'Charge %d' % i, [
+                    _make_posting('Liabilities:Credit-Card', -total, 'USD',
+                                  True),
+                    _make_posting(matching.FIXME_ACCOUNT, total, 'USD', False),
+                ]))
+        i += 1
+    return transactions[:num_transactions]
+
+
+def _is_cleared(posting: Posting) -> bool:
+    return bool(posting.meta) and posting.meta.get('cleared') is True
+
+
+def run_benchmark(transactions: List[Transaction], fuzzy_match_days: int,
+                  fuzzy_match_amount: D,
+                  limits: matching.SearchLimits) -> Tuple[float, int]:
+    """Builds a `PostingDatabase` containing `transactions` and computes the
+    merged transactions for each of them.
+
+    :returns: The elapsed time in seconds and the total number of merged
+        transactions found.
+    """
+    start_time = time.perf_counter()
+    posting_db = matching.PostingDatabase(
+        fuzzy_match_days=fuzzy_match_days,
+        fuzzy_match_amount=fuzzy_match_amount,
+        is_cleared=_is_cleared)
+    for transaction in transactions:
+        posting_db.add_transaction(transaction)
+    num_results = 0
+    for transaction in transactions:
+        result = matching.search_extended_transactions(
+            transaction, posting_db, limits=limits)
+        num_results += len(result.merged_transactions)
+    return time.perf_counter() - start_time, num_results
+
+
+OPTIMIZATION_FLAGS = (
+    'LAZY_AGGREGATE_POSTINGS',
+    'PRUNE_UNBALANCEABLE_MATCH_SETS',
+)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    ap.add_argument('--num-transactions', type=int, default=1000)
+    ap.add_argument('--max-items', type=int, default=8,
+                    help='Maximum number of items in a generated order.')
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--fuzzy-match-days', type=int, default=5)
+    ap.add_argument('--fuzzy-match-amount', type=D, default=D('0.01'))
+    ap.add_argument('--max-depth', type=int, default=3,
+                    help='Maximum number of transactions merged together.')
+    ap.add_argument('--repeat', type=int, default=1,
+                    help='Number of times to run each configuration.')
+    ap.add_argument(
+        '--flag',
+        dest='flags',
+        action='append',
+        choices=OPTIMIZATION_FLAGS,
+        help='Optimization flag to compare.  May be specified more than '
+        'once.  Defaults to all flags.')
+    args = ap.parse_args()
+
+    transactions = generate_transactions(
+        args.num_transactions, max_items=args.max_items, seed=args.seed)
+    limits = matching.SearchLimits(
+        max_depth=args.max_depth, max_states=None, time_limit=None)
+
+    def run():
+        return min(
+            (run_benchmark(transactions, args.fuzzy_match_days,
+                           args.fuzzy_match_amount, limits)
+             for _ in range(args.repeat)),
+            key=lambda x: x[0])
+
+    baseline_time, baseline_results = run()
+    print('%-32s %8.3fs  (%d merged transactions)' %
+          ('all optimizations', baseline_time, baseline_results))
+    for flag in args.flags or OPTIMIZATION_FLAGS:
+        orig_value = getattr(matching, flag)
+        setattr(matching, flag, not orig_value)
+        try:
+            elapsed, num_results = run()
+        finally:
+            setattr(matching, flag, orig_value)
+        if num_results != baseline_results:
+            raise AssertionError('%s changed the number of results: %d != %d'
+                                 % (flag, num_results, baseline_results))
+        print('%-32s %8.3fs  (speedup %.2fx)' %
+              ('without ' + flag, elapsed, elapsed / baseline_time))
+
+
+if __name__ == '__main__':
+    main()
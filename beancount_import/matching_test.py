@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 
+import datetime
 import os
+import threading
 import unittest
 
 import beancount.parser.parser
@@ -58,12 +60,25 @@ def assert_match(pending_candidate: str = '',
     add_entries_to_db(posting_db, journal_entries)
     add_entries_to_db(posting_db, [candidate_entry])
 
-    results = [
-        txn for txn, used_transactions in matching.get_extended_transactions(
-            candidate_entry, posting_db)
-    ]
+    def get_results():
+        return test_util.format_entries([
+            txn for txn, used_transactions in matching.get_extended_transactions(
+                candidate_entry, posting_db)
+        ])
+
+    results = get_results()
+
+    # Pruning of unbalanceable match sets and lazy aggregate postings must not
+    # affect the results.
+    for flag in ('PRUNE_UNBALANCEABLE_MATCH_SETS', 'LAZY_AGGREGATE_POSTINGS'):
+        orig_value = getattr(matching, flag)
+        setattr(matching, flag, not orig_value)
+        try:
+            assert get_results() == results
+        finally:
+            setattr(matching, flag, orig_value)
+
     expected_match_entries = test_util.format_entries(expected_match_entries)
-    results = test_util.format_entries(results)
     if results != expected_match_entries:
         print(results)
     assert results == expected_match_entries
@@ -737,3 +752,282 @@ def test_nonmatch_fuzzy_amount():
           note: "B"
         Expenses:FIXME -99.98 USD
       """)
+
+
+def test_posting_database_amount_index():
+  entries = test_util.parse("""
+      2016-01-01 * "Narration"
+        Assets:A  -100.00 USD
+        Expenses:FIXME  100.00 USD
+
+      2016-01-03 * "Narration"
+        Assets:A  -100.01 USD
+        Expenses:FIXME  100.01 USD
+
+      2016-01-03 * "Narration"
+        Assets:A  -100.02 USD
+        Expenses:FIXME  100.02 USD
+
+      2016-01-10 * "Narration"
+        Assets:A  -100.00 USD
+        Expenses:FIXME  100.00 USD
+
+      2016-01-01 * "Narration"
+        Assets:A  -100.00 EUR
+        Expenses:FIXME  100.00 EUR
+      """)
+  posting_db = matching.PostingDatabase(
+      fuzzy_match_days=3,
+      fuzzy_match_amount=0.01,
+      is_cleared=lambda posting: False,
+  )
+  add_entries_to_db(posting_db, entries)
+  query, = test_util.parse("""
+      2016-01-02 * "Narration"
+        Assets:A  -100.00 USD
+        Expenses:FIXME  100.00 USD
+      """)
+
+  def get_matching_weights():
+    return [(str(entry.date), str(mp.weight))
+            for entry, mp in posting_db.get_posting_matches(
+                query, query.postings[0])]
+
+  assert get_matching_weights() == [
+      ('2016-01-01', '-100.00 USD'),
+      ('2016-01-03', '-100.01 USD'),
+  ]
+  first_entry, = [
+      entry for entry in entries if entry.date == datetime.date(2016, 1, 1)
+      and entry.postings[0].units.currency == 'USD'
+  ]
+  posting_db.remove_transaction(first_entry)
+  assert get_matching_weights() == [('2016-01-03', '-100.01 USD')]
+  posting_db.add_transaction(first_entry)
+  assert get_matching_weights() == [
+      ('2016-01-01', '-100.00 USD'),
+      ('2016-01-03', '-100.01 USD'),
+  ]
+
+
+def test_posting_database_exact_amount_index():
+  entries = test_util.parse("""
+      2016-01-01 * "Narration"
+        Assets:A  -100.00 USD
+        Expenses:FIXME  100.00 USD
+
+      2016-01-01 * "Narration"
+        Assets:A  -100.01 USD
+        Expenses:FIXME  100.01 USD
+      """)
+  posting_db = matching.PostingDatabase(
+      fuzzy_match_days=3,
+      fuzzy_match_amount=0,
+      is_cleared=lambda posting: False,
+  )
+  add_entries_to_db(posting_db, entries)
+  query, = test_util.parse("""
+      2016-01-02 * "Narration"
+        Assets:A  -100 USD
+        Expenses:FIXME  100 USD
+      """)
+  matches = posting_db.get_posting_matches(query, query.postings[0])
+  assert [str(mp.weight) for _, mp in matches] == ['-100.00 USD']
+
+
+def test_search_limits():
+  # Three identical pending transfers, each of which can be merged with the
+  # candidate.
+  candidate_entry, = test_util.parse("""
+      2016-01-01 * "Narration"
+        Assets:A  -100 USD
+          cleared: TRUE
+        Expenses:FIXME  100 USD
+      """)
+  pending_entries = test_util.parse("""
+      2016-01-01 * "Narration"
+        Assets:B  100 USD
+          cleared: TRUE
+        Expenses:FIXME  -100 USD
+
+      2016-01-02 * "Narration"
+        Assets:B  100 USD
+          cleared: TRUE
+        Expenses:FIXME  -100 USD
+
+      2016-01-03 * "Narration"
+        Assets:B  100 USD
+          cleared: TRUE
+        Expenses:FIXME  -100 USD
+      """)
+
+  def is_cleared(posting):
+    return posting.meta and posting.meta.get('cleared') == True
+
+  posting_db = matching.PostingDatabase(
+      fuzzy_match_days=3,
+      fuzzy_match_amount=0.01,
+      is_cleared=is_cleared,
+  )
+  add_entries_to_db(posting_db, pending_entries)
+  add_entries_to_db(posting_db, [candidate_entry])
+
+  unlimited = matching.search_extended_transactions(candidate_entry,
+                                                    posting_db)
+  assert not unlimited.truncated
+  assert len(unlimited.merged_transactions) == 3
+
+  limited = matching.search_extended_transactions(
+      candidate_entry,
+      posting_db,
+      limits=matching.SearchLimits(
+          max_depth=None, max_states=2, time_limit=None))
+  assert limited.truncated
+  assert len(limited.merged_transactions) == 1
+
+  depth_limited = matching.search_extended_transactions(
+      candidate_entry,
+      posting_db,
+      limits=matching.SearchLimits(
+          max_depth=0, max_states=None, time_limit=None))
+  assert depth_limited.truncated
+  assert depth_limited.merged_transactions == []
+
+  assert not matching.search_extended_transactions(
+      candidate_entry,
+      posting_db,
+      limits=matching.SearchLimits(
+          max_depth=1, max_states=None, time_limit=None)).truncated
+
+  cancel_event = threading.Event()
+  cancel_event.set()
+  cancelled = matching.search_extended_transactions(
+      candidate_entry, posting_db, cancel_event=cancel_event)
+  assert cancelled.truncated
+  assert cancelled.merged_transactions == []
+
+
+def test_recording_posting_database():
+  candidate_entry, pending_entry, unrelated_entry = test_util.parse("""
+      2016-01-01 * "Narration"
+        Assets:A  -100 USD
+          cleared: TRUE
+        Expenses:FIXME  100 USD
+
+      2016-01-02 * "Narration"
+        Assets:B  100 USD
+          cleared: TRUE
+        Expenses:FIXME  -100 USD
+
+      2016-03-01 * "Narration"
+        Assets:C  100 USD
+          cleared: TRUE
+        Expenses:FIXME  -100 USD
+      """)
+
+  def is_cleared(posting):
+    return posting.meta and posting.meta.get('cleared') == True
+
+  posting_db = matching.PostingDatabase(
+      fuzzy_match_days=3,
+      fuzzy_match_amount=0.01,
+      is_cleared=is_cleared,
+  )
+  add_entries_to_db(posting_db, [candidate_entry, pending_entry])
+
+  recorder = matching.RecordingPostingDatabase(posting_db)
+  result = matching.search_extended_transactions(candidate_entry, recorder)
+  assert len(result.merged_transactions) == 1
+
+  assert not recorder.is_affected_by([], [])
+  assert not recorder.is_affected_by([unrelated_entry], [unrelated_entry])
+  assert recorder.is_affected_by([pending_entry], [])
+  assert recorder.is_affected_by([], [pending_entry])
+
+
+def test_matchable_postings_cache():
+  entry, other_entry = test_util.parse("""
+      2016-01-01 * "Narration"
+        Assets:A  -100 USD
+          cleared: TRUE
+        Expenses:FIXME  100 USD
+
+      2016-01-02 * "Narration"
+        Assets:B  100 USD
+          cleared: TRUE
+        Expenses:FIXME  -100 USD
+      """)
+
+  def is_cleared(posting):
+    return posting.meta and posting.meta.get('cleared') == True
+
+  posting_db = matching.PostingDatabase(
+      fuzzy_match_days=3,
+      fuzzy_match_amount=0.01,
+      is_cleared=is_cleared,
+  )
+  posting_db.add_transaction(entry)
+  assert posting_db.matchable_postings_cache_misses == 1
+  assert posting_db.matchable_postings_cache_hits == 0
+
+  matchable_postings = posting_db.get_matchable_postings(entry)
+  assert posting_db.matchable_postings_cache_hits == 1
+  assert posting_db.get_matchable_postings(entry) is matchable_postings
+
+  # Transactions not in the database are not cached.
+  posting_db.get_matchable_postings(other_entry)
+  posting_db.get_matchable_postings(other_entry)
+  assert posting_db.matchable_postings_cache_misses == 3
+
+  posting_db.invalidate_matchable_postings(entry)
+  assert posting_db.get_matchable_postings(entry) is not matchable_postings
+  assert posting_db.matchable_postings_cache_misses == 4
+
+  posting_db.remove_transaction(entry)
+  posting_db.get_matchable_postings(entry)
+  assert posting_db.matchable_postings_cache_misses == 6
+  assert posting_db.get_posting_matches(entry, entry.postings[0]) == []
+
+
+def test_lazy_aggregate_postings():
+  order, charge = test_util.parse("""
+      2016-01-01 * "Order"
+        Expenses:FIXME  1 USD
+        Expenses:FIXME  2 USD
+        Expenses:FIXME  4 USD
+        Expenses:FIXME  8 USD
+        Expenses:FIXME  16 USD
+        Expenses:FIXME  32 USD
+        Assets:A  -63 USD
+          cleared: TRUE
+
+      2016-01-02 * "Charge"
+        Liabilities:Card  -6 USD
+          cleared: TRUE
+        Expenses:FIXME  6 USD
+      """)
+
+  def is_cleared(posting):
+    return posting.meta and posting.meta.get('cleared') == True
+
+  posting_db = matching.PostingDatabase(
+      fuzzy_match_days=3,
+      fuzzy_match_amount=0,
+      is_cleared=is_cleared,
+  )
+  posting_db.add_transaction(charge)
+  assert posting_db.has_weight('USD', matching.Decimal(6))
+  assert not posting_db.has_weight('USD', matching.Decimal(7))
+
+  orig_lazy = matching.LAZY_AGGREGATE_POSTINGS
+  try:
+    matching.LAZY_AGGREGATE_POSTINGS = False
+    assert len(posting_db.get_query_matchable_postings(order)) == 7 + 51
+    matching.LAZY_AGGREGATE_POSTINGS = True
+    aggregates = [
+        mp for mp in posting_db.get_query_matchable_postings(order)
+        if len(mp.source_postings) > 1
+    ]
+  finally:
+    matching.LAZY_AGGREGATE_POSTINGS = orig_lazy
+  assert [str(mp.weight) for mp in aggregates] == ['6 USD']
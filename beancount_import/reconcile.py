@@ -1,7 +1,7 @@
 import collections
 import datetime
 import re
-from typing import List, Optional, Union, Callable, Dict, Tuple, Any, Iterable, Set, NamedTuple
+from typing import List, Optional, Union, Callable, Dict, Tuple, Any, Iterable, Set, NamedTuple, Sequence, FrozenSet, cast
 import argparse
 import os
 import tempfile
@@ -9,6 +9,10 @@ import hashlib
 import string
 import random
 import pickle
+import threading
+import time
+import concurrent.futures
+import weakref
 
 from beancount.core.data import Transaction, Posting, Balance, Open, Close, Price, Directive, Entries, Amount
 from beancount.core.flags import FLAG_PADDING
@@ -21,13 +25,23 @@ from . import journal_editor
 from .source import ImportResult, load_source, SourceResults, Source, LogFunction, AssociatedData, InvalidSourceReference, invalid_source_reference_sort_key
 from .posting_date import get_posting_date
 
-from .thread_helpers import call_in_new_thread
+from .thread_helpers import call_in_new_thread, DaemonThreadExecutor
 
 from .matching import FIXME_ACCOUNT, is_unknown_account, CLEARED_KEY
 
 display_prediction_explanation = False
 
-classifier_cache_version_number = 1
+classifier_cache_version_number = 2
+
+reconciler_snapshot_version_number = 3
+
+# Reconciler options that affect the loaded state saved in a snapshot.
+snapshot_option_keys = ('data_sources', 'fuzzy_match_days',
+                        'fuzzy_match_amount', 'account_pattern',
+                        'ignore_account_for_classification_pattern',
+                        'classifier_model', 'classifier_vectorizer',
+                        'classifier_hash_features',
+                        'classifier_max_ngram_length')
 
 PendingEntry = NamedTuple('PendingEntry', [
     ('date', datetime.date),
@@ -129,14 +143,47 @@ def _get_unique_id_for_account(account: str) -> str:
     return ''.join(random.choice(unique_id_characters) for _ in range(length))
 
 
+# Maps each trained classifier to the array of names of its features, which is
+# expensive to compute.
+_feature_names_cache = weakref.WeakKeyDictionary()  # type: weakref.WeakKeyDictionary
+
+
+def _get_feature_names(classifier) -> Optional[Sequence[str]]:
+    """Returns the names of the features of a trained classifier, indexed by
+    column, or `None` if the names are not known."""
+    if isinstance(classifier, training.HashingClassifier):
+        # Names of hashed features are not retained.
+        return None
+    feature_names = _feature_names_cache.get(classifier)
+    if feature_names is None:
+        vectorizer = classifier._vectorizer
+        if hasattr(vectorizer, 'get_feature_names_out'):
+            feature_names = vectorizer.get_feature_names_out()
+        else:
+            feature_names = vectorizer.get_feature_names()
+        _feature_names_cache[classifier] = feature_names
+    return feature_names
+
+
 def get_prediction_explanation(classifier, features: Dict[str, bool]):
+    if isinstance(classifier, training.NaiveBayesClassifier):
+        prob_dist = classifier.prob_classify(features)
+        return [
+            '%s (probability %g)' % (label, prob_dist.prob(label))
+            for label in sorted(
+                classifier.labels(), key=prob_dist.prob, reverse=True)[:3]
+        ]
+
     tree = classifier._clf.tree_
 
     lines = []
 
-    converted_features = classifier._vectorizer.transform([features])
+    if isinstance(classifier, training.HashingClassifier):
+        converted_features = classifier.transform([features])
+    else:
+        converted_features = classifier._vectorizer.transform([features])
+    feature_names = _get_feature_names(classifier)
     class_names = classifier._encoder.classes_
-    feature_names = classifier._vectorizer.get_feature_names()
 
     node_id = 0
     while True:
@@ -157,9 +204,12 @@ def get_prediction_explanation(classifier, features: Dict[str, bool]):
             else:
                 relation = '> '
                 node_id = tree.children_right[node_id]
-            lines.append(
-                '%s = %r %s %r' % (feature_names[feature_index], feature_value,
-                                   relation, feature_threshold))
+            if feature_names is None:
+                feature_name = 'hashed feature %d' % feature_index
+            else:
+                feature_name = feature_names[feature_index]
+            lines.append('%s = %r %s %r' % (feature_name, feature_value,
+                                            relation, feature_threshold))
     return lines
 
 
@@ -180,6 +230,8 @@ class Candidate(object):
             substituted_accounts: Optional[List[AccountSubstitution]] = None,
             original_transaction_properties: Optional[dict] = None,
             substitute: Optional[Callable[[Dict[str, Any]], 'Candidate']] = None,
+            explain_predictions: Optional[Callable[[], List[List[str]]]] = None,
+            refresh_predictions: Optional[Callable[[], 'Candidate']] = None,
     ) -> None:
         self.staged_changes = staged_changes
         self.staged_changes_with_unique_account_names = staged_changes_with_unique_account_names
@@ -194,6 +246,15 @@ class Candidate(object):
         # If not None, Function that when called with list of account names (of same length as substituted_accounts) returns a new candidate.
         self.substitute = substitute
 
+        # If not None, function that returns the explanation of the predicted
+        # account of each group of unknown accounts.  Since this is expensive,
+        # it is only computed on request.
+        self.explain_predictions = explain_predictions
+
+        # If not None, function that returns a new candidate with the unknown
+        # accounts predicted again, e.g. after retraining the classifier.
+        self.refresh_predictions = refresh_predictions
+
         self.used_transaction_ids = None  # type: Optional[List[int]]
         self.associated_data = []  # type: List[AssociatedData]
 
@@ -215,10 +276,14 @@ class Candidates(object):
             sources: List[Source],
             date: Optional[datetime.date] = None,
             number: Optional[Decimal] = None,
+            truncated: bool = False,
     ) -> None:
         self.candidates = candidates
         self.date = date
         self.number = number
+        # Indicates that the search for merged candidates stopped early due to
+        # the configured search limits.
+        self.truncated = truncated
         self.pending_data = pending_data
         self.sources = sources
 
@@ -249,6 +314,17 @@ class Candidates(object):
         new_candidate.update_associated_data(self.sources)
         self.candidates[candidate_index] = new_candidate
 
+    def refresh_predictions(self) -> None:
+        """Replaces the candidates with ones using the current predictions of
+        the unknown accounts.  Changes made by `change_transaction` are
+        retained."""
+        for candidate_index, candidate in enumerate(self.candidates):
+            if candidate.refresh_predictions is None: continue
+            new_candidate = candidate.refresh_predictions()
+            new_candidate.used_transaction_ids = candidate.used_transaction_ids
+            new_candidate.update_associated_data(self.sources)
+            self.candidates[candidate_index] = new_candidate
+
 
 def with_metadata(x, new_meta):
     meta = collections.OrderedDict()
@@ -363,14 +439,155 @@ def make_pending_entry(import_result: ImportResult, source: Optional[Source]):
     )
 
 
+def get_snapshot_options_key(reconciler) -> tuple:
+    return (reconciler.journal_path, reconciler.ignore_path) + tuple(
+        reconciler.options.get(key) for key in snapshot_option_keys)
+
+
+def get_journal_fingerprint(journal_load_time: Dict[str, float]
+                            ) -> Optional[Dict[str, Tuple[float, int, str]]]:
+    """Computes the modification time, size and content hash of each journal
+    file.
+
+    :param journal_load_time: Maps each journal filename to its modification
+        time when it was loaded.
+    :returns: The fingerprint, or `None` if any file was modified or removed.
+    """
+    fingerprint = dict()  # type: Dict[str, Tuple[float, int, str]]
+    for filename, mtime in journal_load_time.items():
+        try:
+            with open(filename, 'rb') as f:
+                stat_result = os.fstat(f.fileno())
+                if stat_result.st_mtime != mtime:
+                    return None
+                fingerprint[filename] = (mtime, stat_result.st_size,
+                                         hashlib.sha256(f.read()).hexdigest())
+        except OSError:
+            return None
+    return fingerprint
+
+
+def get_source_input_fingerprint(data_sources: List[dict]) -> List[tuple]:
+    """Computes the modification time and size of the source data files.
+
+    Every string value in the source specifications that names an existing file
+    or directory is considered a source input; all files within a directory are
+    included.
+    """
+    paths = []  # type: List[str]
+
+    def add_paths(value):
+        if isinstance(value, str):
+            if os.path.exists(value):
+                paths.append(value)
+        elif isinstance(value, dict):
+            for x in value.values():
+                add_paths(x)
+        elif isinstance(value, (list, tuple)):
+            for x in value:
+                add_paths(x)
+
+    add_paths(data_sources)
+    fingerprint = []  # type: List[tuple]
+    for path in paths:
+        filenames = [path]
+        if os.path.isdir(path):
+            filenames = sorted(
+                os.path.join(dirpath, name)
+                for dirpath, _, names in os.walk(path) for name in names)
+        for filename in filenames:
+            try:
+                stat_result = os.stat(filename)
+            except OSError:
+                continue
+            fingerprint.append((filename, stat_result.st_mtime,
+                                stat_result.st_size))
+    return fingerprint
+
+
+def _get_prediction_cache_key(features: Dict[str, bool]) -> FrozenSet[str]:
+    return frozenset(name for name, value in features.items() if value)
+
+
+def get_classifier_max_ngram_length(options: Dict[str, Any]) -> Optional[int]:
+    """Returns the maximum length of the word sequences used as features by the
+    classifier specified by the reconciler `options`."""
+    max_ngram_length = options.get('classifier_max_ngram_length')
+    if (max_ngram_length is None and
+            options.get('classifier_vectorizer') == 'hashing'):
+        return training.DEFAULT_HASHING_MAX_NGRAM_LENGTH
+    return max_ngram_length
+
+
+def make_classifier(options: Dict[str, Any]):
+    """Returns an untrained classifier as specified by the reconciler
+    `options`."""
+    if options.get('classifier_model') == 'naive_bayes':
+        return training.NaiveBayesClassifier()
+    import sklearn.tree
+    estimator = sklearn.tree.DecisionTreeClassifier()
+    if options.get('classifier_vectorizer') == 'hashing':
+        return training.HashingClassifier(
+            estimator,
+            num_features=options.get('classifier_hash_features') or
+            training.DEFAULT_NUM_HASHED_FEATURES)
+    import nltk
+    return nltk.classify.scikitlearn.SklearnClassifier(estimator=estimator)
+
+
+def get_classifier_model_path(path: str, options: Dict[str, Any]) -> str:
+    """Returns the path of the file, such as the classifier cache or reconciler
+    snapshot, that holds a classifier as specified by the reconciler `options`.
+
+    Each classifier model uses its own file, such that loading the journal with
+    different models, e.g. from the web server and from `--auto_reconcile`,
+    does not repeatedly invalidate the same file.  The default decision tree
+    model uses `path` itself.
+    """
+    model = options.get('classifier_model') or 'decision_tree'
+    vectorizer = options.get('classifier_vectorizer') or 'dict'
+    if model == 'naive_bayes':
+        return '%s.%s' % (path, model)
+    if vectorizer != 'dict':
+        return '%s.%s_%s' % (path, model, vectorizer)
+    return path
+
+
+def get_training_examples_fingerprint(
+        training_examples: List[Tuple[Dict[str, bool], str]]) -> str:
+    """Returns a hash of the set of training examples.
+
+    The fingerprint does not depend on the order of the examples, such that it
+    is not affected by reordering entries in the journal.
+    """
+    h = hashlib.sha256()
+    for example in sorted(
+            '\0'.join(sorted(name for name, value in features.items() if value))
+            + '\1' + target for features, target in training_examples):
+        h.update(example.encode('utf-8'))
+        h.update(b'\2')
+    return h.hexdigest()
+
+
+def _get_classifier_training_examples(
+        training_examples: List[Tuple[Dict[str, bool], str]]
+) -> List[Tuple[Dict[str, bool], str]]:
+    return [x for x in training_examples if x[1] != FIXME_ACCOUNT]
+
+
 class LoadedReconciler(object):
     """Represents the loaded reconciler state."""
 
     def __init__(self, reconciler, sources=None, classifier=None) -> None:
         self.reconciler = reconciler
         reconciler.log_status('Loading journal')
-        self.editor = journal_editor.JournalEditor(reconciler.journal_path,
-                                                   reconciler.ignore_path)
+        self.editor = journal_editor.JournalEditor(
+            reconciler.journal_path,
+            reconciler.ignore_path,
+            parse_cache_dir=reconciler.options.get('journal_parse_cache'),
+            parse_processes=reconciler.options.get('journal_parse_processes')
+            or 0,
+            mmap_lines=bool(reconciler.options.get('journal_mmap_lines')))
         self.errors = [('error', e[1], e[0]) for e in self.editor.errors]
 
         if sources is not None:
@@ -385,29 +602,33 @@ class LoadedReconciler(object):
             is_cleared=self.is_posting_cleared,
             metadata_keys=frozenset([matching.CHECK_KEY]),
         )
+        self._init_session_state()
 
         # Set of ids of transactions pending import.  Used to determine whether a transaction found
         # in the posting_db is an existing or pending transaction.
         self.pending_transaction_ids = set()  # type: Set[int]
 
+        # The classifier along with the cache of accounts predicted by it,
+        # which maps the set of features of a prediction input to the
+        # predicted account.  They are replaced together, such that a
+        # classifier trained in the background can be swapped in atomically.
+        self._prediction_state = (
+            None, {})  # type: Tuple[Any, Dict[FrozenSet[str], str]]
+
         self.balance_entries = dict(
         )  # type: Dict[Tuple[datetime.date, str, str], Decimal]
         self.price_values = set()  # type: Set[Tuple[datetime.date, str, Amount]]
         all_source_results = self._prepare_sources()
         self._preprocess_entries()
         self._match_sources(all_source_results)
-        self._feature_extractor = training.FeatureExtractor(
-            account_source_map=self.account_source_map,
-            ignore_account_pattern=reconciler.options[
-                'ignore_account_for_classification_pattern'],
-            sources=self.sources,
-        )
-        self.training_examples = training.TrainingExamples()
+        self._feature_extractor = self._make_feature_extractor()
+        self.training_examples = training.TrainingExamples(
+            max_ngram_length=self._get_max_ngram_length())
         self._extract_training_examples(self.editor.entries)
 
         self.classifier = classifier
         if self.classifier is None:
-            classifier_cache_path = self.reconciler.options['classifier_cache']
+            classifier_cache_path = self._get_classifier_cache_path()
             if classifier_cache_path is not None and os.path.exists(
                     classifier_cache_path):
                 try:
@@ -416,6 +637,16 @@ class LoadedReconciler(object):
                         version = cache_data['version']
                         if version != classifier_cache_version_number:
                             raise RuntimeError('invalid version')
+                        if cache_data.get(
+                                'classifier_options'
+                        ) != self._get_classifier_options():
+                            raise RuntimeError('classifier options changed')
+                        fingerprint = get_training_examples_fingerprint(
+                            _get_classifier_training_examples(
+                                self.training_examples.training_examples))
+                        if cache_data[
+                                'training_examples_fingerprint'] != fingerprint:
+                            raise RuntimeError('training examples changed')
                         self.classifier = cache_data['classifier']
                 except:
                     import traceback
@@ -424,10 +655,190 @@ class LoadedReconciler(object):
 
         if self.classifier is None:
             self._maybe_train_classifier()
+        self.predict_pending_accounts()
+
+    def _init_session_state(self) -> None:
+        """Initializes the state that is not saved in a snapshot."""
+        options = self.reconciler.options
+        self.search_limits = matching.SearchLimits(
+            max_depth=options.get('match_max_depth'),
+            max_states=options.get('match_max_states'),
+            time_limit=options.get('match_time_limit'),
+        )
 
-    def _extract_training_examples(self, entries: Entries) -> None:
-        self._feature_extractor.extract_examples(entries,
-                                                 self.training_examples)
+        # Number of pending entries following the current one for which merged
+        # transactions are computed in the background.
+        self.num_prefetch = options.get('prefetch_candidates') or 0
+        # Guards `posting_db`, which is accessed by the prefetch thread.
+        self._posting_db_lock = threading.RLock()
+        # Guards `_prefetched_matches`.  It is only held briefly, such that a
+        # prefetched result can be retrieved while the prefetch thread holds
+        # `_posting_db_lock` to search for a later entry.  When both are held,
+        # `_posting_db_lock` is acquired first.
+        self._prefetched_matches_lock = threading.Lock()
+        # Maps the id of a pending transaction to the precomputed result of
+        # `matching.search_extended_transactions`, along with the recorded
+        # `posting_db` queries on which it depends.
+        self._prefetched_matches = {
+        }  # type: Dict[int, Tuple[matching.ExtendedTransactionsResult, matching.RecordingPostingDatabase]]
+        # Incremented to cancel any in-progress prefetch.
+        self._prefetch_generation = 0
+        # Set to stop the search currently performed by the prefetch thread.
+        self._prefetch_cancel_event = threading.Event()
+        self._prefetch_executor = DaemonThreadExecutor()
+        self.prefetch_future = None  # type: Optional[concurrent.futures.Future]
+
+        # Guards `training_examples` and updates to the classifier, which may
+        # be retrained in the background.
+        self._classifier_lock = threading.RLock()
+        self._retrain_executor = DaemonThreadExecutor()
+        self.retrain_future = None  # type: Optional[concurrent.futures.Future]
+        # For each background retrain in progress, the list of training
+        # examples added since its training examples were copied.
+        self._training_example_logs = [
+        ]  # type: List[List[Tuple[Dict[str, bool], str]]]
+
+    _session_state_keys = ('reconciler', 'search_limits', 'num_prefetch',
+                           '_posting_db_lock', '_prefetched_matches_lock',
+                           '_prefetched_matches',
+                           '_prefetch_generation', '_prefetch_cancel_event',
+                           '_prefetch_executor',
+                           'prefetch_future', '_classifier_lock',
+                           '_retrain_executor', 'retrain_future',
+                           '_training_example_logs')
+
+    @property
+    def classifier(self):
+        return self._prediction_state[0]
+
+    @classifier.setter
+    def classifier(self, classifier) -> None:
+        self._prediction_state = (classifier, {})
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for key in self._session_state_keys:
+            del state[key]
+        # Object ids are not preserved by pickling.
+        pending_transaction_ids = self.pending_transaction_ids
+        state['pending_transaction_ids'] = [
+            entry for pending in self.pending_data for entry in pending.entries
+            if id(entry) in pending_transaction_ids
+        ]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.pending_transaction_ids = set(
+            map(id, state['pending_transaction_ids']))
+
+    def save_snapshot(self, path: str,
+                      source_fingerprint: List[tuple]) -> bool:
+        """Saves the loaded state to a snapshot file.
+
+        :param source_fingerprint: Result of `get_source_input_fingerprint`,
+            computed before the sources were loaded.
+        :returns: `True` if the snapshot was saved.
+        """
+        journal_fingerprint = get_journal_fingerprint(
+            self.editor.journal_load_time)
+        if journal_fingerprint is None:
+            # The journal was modified after it was loaded.
+            return False
+        header = {
+            'version': reconciler_snapshot_version_number,
+            'key': get_snapshot_options_key(self.reconciler),
+            'sources': source_fingerprint,
+            'journal': journal_fingerprint,
+        }
+        renamed = False
+        with tempfile.NamedTemporaryFile(
+                mode='wb',
+                dir=os.path.dirname(os.path.abspath(path)),
+                prefix='.' + os.path.basename(path),
+                suffix='.tmp',
+                delete=False) as snapshot_f:
+            try:
+                pickle.dump(header, snapshot_f)
+                pickle.dump(self, snapshot_f, protocol=pickle.HIGHEST_PROTOCOL)
+                snapshot_f.close()
+                os.replace(snapshot_f.name, path)
+                renamed = True
+            finally:
+                if not renamed:
+                    os.remove(snapshot_f.name)
+        return True
+
+    @staticmethod
+    def load_snapshot(reconciler, path: str,
+                      source_fingerprint: List[tuple]
+                      ) -> Optional['LoadedReconciler']:
+        """Loads a snapshot saved by `save_snapshot`.
+
+        :returns: The loaded reconciler, or `None` if the snapshot does not
+            exist or is out of date.
+        """
+        try:
+            snapshot_f = open(path, 'rb')
+        except FileNotFoundError:
+            return None
+        with snapshot_f:
+            header = pickle.load(snapshot_f)
+            if header['version'] != reconciler_snapshot_version_number:
+                return None
+            if header['key'] != get_snapshot_options_key(reconciler):
+                return None
+            if header['sources'] != source_fingerprint:
+                return None
+            journal_fingerprint = header['journal']
+            journal_load_time = {
+                filename: mtime
+                for filename, (mtime, _, _) in journal_fingerprint.items()
+            }
+            if get_journal_fingerprint(
+                    journal_load_time) != journal_fingerprint:
+                return None
+            reconciler.log_status('Loading snapshot')
+            loaded_reconciler = pickle.load(snapshot_f)
+        loaded_reconciler.reconciler = reconciler
+        for source in loaded_reconciler.sources:
+            source.log_status = reconciler.log_status
+        loaded_reconciler.editor.mmap_lines = bool(
+            reconciler.options.get('journal_mmap_lines'))
+        loaded_reconciler._init_session_state()
+        reconciler.log_status('Done loading')
+        return loaded_reconciler
+
+    def _make_feature_extractor(self) -> training.FeatureExtractor:
+        return training.FeatureExtractor(
+            account_source_map=self.account_source_map,
+            ignore_account_pattern=self.reconciler.options[
+                'ignore_account_for_classification_pattern'],
+            sources=self.sources,
+        )
+
+    def _extract_training_examples(
+            self, entries: Entries) -> List[Tuple[Dict[str, bool], str]]:
+        """Adds the training examples extracted from `entries`.
+
+        :returns: The added training examples.
+        """
+        with self._classifier_lock:
+            training_examples = self.training_examples.training_examples
+            num_training_examples = len(training_examples)
+            examples = training.MockTrainingExamples()
+            self._feature_extractor.extract_examples(entries, examples)
+            self.training_examples.add_many(examples.examples)
+            added_examples = training_examples[num_training_examples:]
+            for log in self._training_example_logs:
+                log.extend(added_examples)
+        return added_examples
+
+    def _remove_training_examples(self, entries: Entries) -> None:
+        removed_examples = training.MockTrainingExamples()
+        self._feature_extractor.extract_examples(entries, removed_examples)
+        with self._classifier_lock:
+            self.training_examples.remove_many(removed_examples.examples)
 
     def _load_sources(self):
         sources = self.sources = [
@@ -440,13 +851,104 @@ class LoadedReconciler(object):
         for entry in self.editor.entries:
             if isinstance(entry, Transaction):
                 posting_db.add_transaction(entry)
-            elif isinstance(entry, Price):
+        self._add_balance_and_price_entries(self.editor.entries)
+
+    def _add_balance_and_price_entries(self, entries: Entries) -> None:
+        for entry in entries:
+            if isinstance(entry, Price):
                 self.price_values.add((entry.date, entry.currency,
                                        entry.amount))
             elif isinstance(entry, Balance):
                 key = (entry.date, entry.account, entry.amount.currency)
                 self.balance_entries[key] = entry.amount.number
 
+    def reload_modified_files(self) -> bool:
+        """Incrementally updates the loaded state to reflect modifications to
+        the journal files.
+
+        Only the modified files are parsed again, and only the added and removed
+        journal entries are applied to `posting_db` and the training examples.
+        The classifier is not retrained.
+
+        The sources are still prepared against the whole updated journal, since
+        their pending entries and invalid references may depend on any entry.
+        This is typically the dominant cost of the reload, as for a full load.
+        If this changes the source that is authoritative for any account,
+        whether postings are cleared and the features of the training examples
+        may change for unmodified entries as well, and so `posting_db` and the
+        training examples are computed again for all entries.
+
+        :returns: `False` if the modifications cannot be handled incrementally
+            (see `JournalEditor.reload_modified_files`), or if the training
+            examples of the removed entries are not all present.  In that case
+            the journal must be loaded from scratch.  The other loaded state is
+            not modified, but `editor` may be.
+        """
+        self.reconciler.log_status('Reloading modified journal files')
+        self.cancel_prefetch()
+        with self._posting_db_lock:
+            result = self.editor.reload_modified_files()
+            if result is None:
+                return False
+
+            # The stale state is removed using the `account_source_map` and
+            # feature extractor with which it was computed.  The training
+            # examples are removed first, since that fails if they do not match
+            # the loaded state.
+            try:
+                self._remove_training_examples(result.old_entries)
+            except ValueError:
+                import traceback
+                traceback.print_exc()
+                print('Reloading journal from scratch due to above error')
+                return False
+            with self._prefetched_matches_lock:
+                self._prefetched_matches.clear()
+
+            # The pending transactions are added again by `_match_sources`.
+            posting_db = self.posting_db
+            for pending in self.pending_data:
+                for entry in pending.entries:
+                    if id(entry) in self.pending_transaction_ids:
+                        posting_db.remove_transaction(entry)
+            self.pending_transaction_ids.clear()
+            for entry in result.old_entries:
+                if isinstance(entry, Transaction):
+                    posting_db.remove_transaction(entry)
+
+            self.errors = [('error', e[1], e[0]) for e in self.editor.errors]
+            self.balance_entries = {}
+            self.price_values = set()
+            self._add_balance_and_price_entries(self.editor.entries)
+            old_account_source_map = self.account_source_map
+            all_source_results = self._prepare_sources()
+            self._feature_extractor = self._make_feature_extractor()
+
+            if self.account_source_map == old_account_source_map:
+                for entry in result.new_entries:
+                    if isinstance(entry, Transaction):
+                        posting_db.add_transaction(entry)
+                self._extract_training_examples(result.new_entries)
+            else:
+                new_entry_ids = set(id(entry) for entry in result.new_entries)
+                transactions = [
+                    entry for entry in self.editor.entries
+                    if isinstance(entry, Transaction)
+                ]
+                for entry in transactions:
+                    if id(entry) not in new_entry_ids:
+                        posting_db.remove_transaction(entry)
+                posting_db.invalidate_matchable_postings()
+                for entry in transactions:
+                    posting_db.add_transaction(entry)
+                with self._classifier_lock:
+                    self.training_examples = training.TrainingExamples(
+                        max_ngram_length=self._get_max_ngram_length())
+                    self._extract_training_examples(self.editor.entries)
+            self._match_sources(all_source_results)
+        self.predict_pending_accounts()
+        return True
+
     def is_posting_cleared(self, posting: Posting) -> bool:
         source = self.account_source_map.get(posting.account)
         if source is None: return False
@@ -454,31 +956,143 @@ class LoadedReconciler(object):
 
     def retrain(self):
         self._maybe_train_classifier()
+        self.predict_pending_accounts()
         return self
 
+    def start_background_retrain(self) -> concurrent.futures.Future:
+        """Retrains the classifier on a background thread.
+
+        The classifier is trained using the current training examples, and the
+        accounts of all pending entries are predicted with it.  Until then, the
+        existing classifier continues to be used.  The new classifier and its
+        predictions then replace the existing ones atomically.
+
+        :returns: A future for the new classifier, or `None` if there are no
+            training examples.
+        """
+        # The pending entries and training examples may be modified while
+        # retraining, and so are copied.
+        with self._classifier_lock:
+            training_examples = list(self.training_examples.training_examples)
+            added_examples = [
+            ]  # type: List[Tuple[Dict[str, bool], str]]
+            self._training_example_logs.append(added_examples)
+            pending_transactions = self._get_pending_transactions()
+            feature_extractor = self._feature_extractor
+
+        def retrain():
+            try:
+                classifier = self._train_classifier(
+                    _get_classifier_training_examples(training_examples))
+                if classifier is None:
+                    return None
+                prediction_cache = {}  # type: Dict[FrozenSet[str], str]
+                self._predict_pending_accounts(classifier, prediction_cache,
+                                               pending_transactions,
+                                               feature_extractor)
+                with self._classifier_lock:
+                    # Incrementally-updated classifiers must also reflect the
+                    # examples added while training.
+                    new_examples = _get_classifier_training_examples(
+                        added_examples)
+                    if new_examples and isinstance(
+                            classifier, training.NaiveBayesClassifier):
+                        classifier.partial_fit(new_examples)
+                        prediction_cache = {}
+                    self._prediction_state = (classifier, prediction_cache)
+                return classifier
+            finally:
+                with self._classifier_lock:
+                    self._training_example_logs = [
+                        log for log in self._training_example_logs
+                        if log is not added_examples
+                    ]
+
+        self.retrain_future = self._retrain_executor.submit(retrain)
+        return self.retrain_future
+
+    def _get_classifier_options(self) -> tuple:
+        options = self.reconciler.options
+        return (options.get('classifier_model') or 'decision_tree',
+                options.get('classifier_vectorizer') or 'dict',
+                options.get('classifier_hash_features'),
+                self._get_max_ngram_length())
+
+    def _get_classifier_cache_path(self) -> Optional[str]:
+        options = self.reconciler.options
+        path = options['classifier_cache']
+        if path is None:
+            return None
+        return get_classifier_model_path(path, options)
+
+    def _get_max_ngram_length(self) -> Optional[int]:
+        return get_classifier_max_ngram_length(self.reconciler.options)
+
+    def _make_classifier(self):
+        return make_classifier(self.reconciler.options)
+
+    def get_prediction_examples(
+            self) -> List[Tuple[training.PredictionInput, str]]:
+        """Returns the prediction input and target account of each training
+        example in the journal, in journal order."""
+        examples = training.MockTrainingExamples()
+        self._feature_extractor.extract_examples(self.editor.entries, examples)
+        return examples.examples
+
+    def _update_classifier(self, training_examples: List[Tuple[Dict[
+            str, bool], str]]) -> None:
+        """Incrementally updates the classifier with new training examples, if
+        the configured classifier model supports it.
+
+        Otherwise, the new examples are only used once `retrain` is called.
+        """
+        if self.reconciler.options.get('classifier_model') != 'naive_bayes':
+            return
+        training_examples = _get_classifier_training_examples(
+            training_examples)
+        if not training_examples:
+            return
+        with self._classifier_lock:
+            classifier, prediction_cache = self._prediction_state
+            if not isinstance(classifier, training.NaiveBayesClassifier):
+                self._maybe_train_classifier()
+                return
+            classifier.partial_fit(training_examples)
+            prediction_cache.clear()
+
     def _maybe_train_classifier(self):
-        training_examples = [
-            x for x in self.training_examples.training_examples
-            if x[1] != FIXME_ACCOUNT
-        ]
+        classifier = self._train_classifier(
+            _get_classifier_training_examples(
+                self.training_examples.training_examples))
+        if classifier is not None:
+            self.classifier = classifier
+
+    def _train_classifier(self, training_examples: List[Tuple[Dict[
+            str, bool], str]]):
+        """Trains a new classifier, and saves it to the classifier cache if one
+        is specified.
+
+        :returns: The new classifier, or `None` if `training_examples` is empty.
+        """
         if len(training_examples) > 0:
             self.reconciler.log_status(
                 'Training classifier with %d examples' % len(training_examples))
-            import nltk
-            import sklearn.tree
-
-            self.classifier = nltk.classify.scikitlearn.SklearnClassifier(
-                estimator=sklearn.tree.DecisionTreeClassifier())
-            self.classifier.train(training_examples)
+            start_time = time.time()
+            classifier = self._make_classifier()
+            classifier.train(training_examples)
             self.reconciler.log_status(
-                'Trained classifier with %d examples.' % len(training_examples))
-            classifier_cache_path = self.reconciler.options['classifier_cache']
+                'Trained classifier with %d examples in %.2f seconds.' %
+                (len(training_examples), time.time() - start_time))
+            classifier_cache_path = self._get_classifier_cache_path()
             if classifier_cache_path is None:
-                return
+                return classifier
             renamed = False
             cache_data = {
                 'version': classifier_cache_version_number,
-                'classifier': self.classifier
+                'classifier_options': self._get_classifier_options(),
+                'training_examples_fingerprint':
+                get_training_examples_fingerprint(training_examples),
+                'classifier': classifier
             }
             with tempfile.NamedTemporaryFile(
                     mode='wb',
@@ -503,6 +1117,36 @@ class LoadedReconciler(object):
             #     if self.classifier.classify(features) != label:
             #         errors += 1
             # print('Classifier accuracy: %.4f', 1 - float(errors) / len(training_examples))
+            return classifier
+        return None
+
+    def _run_source_prepare(self) -> List[SourceResults]:
+        """Calls `prepare` for each source.
+
+        If the `source_prepare_threads` option is greater than 1, the sources
+        are prepared concurrently using a thread pool of that size.  The
+        results are returned in source order regardless.
+        """
+        num_threads = self.reconciler.options.get('source_prepare_threads') or 0
+        all_source_results = [SourceResults() for _ in self.sources]
+        if num_threads <= 1 or len(self.sources) <= 1:
+            for source, source_results in zip(self.sources, all_source_results):
+                source.prepare(self.editor, source_results)
+            return all_source_results
+
+        # Compute the lazily-computed `all_entries` list up front, since sources
+        # must only read the journal.
+        self.editor.all_entries
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=num_threads) as executor:
+            futures = [
+                executor.submit(source.prepare, self.editor, source_results)
+                for source, source_results in zip(self.sources,
+                                                  all_source_results)
+            ]
+            for future in futures:
+                future.result()
+        return all_source_results
 
     def _prepare_sources(self) -> List[SourceResults]:
         self.reconciler.log_status('Matching source data')
@@ -510,9 +1154,8 @@ class LoadedReconciler(object):
         invalid_references = [
         ]  # type: List[Tuple[Source, InvalidSourceReference]]
         all_source_results = []  # type: List[SourceResults]
-        for source in self.sources:
-            source_results = SourceResults()
-            source.prepare(self.editor, source_results)
+        for source, source_results in zip(self.sources,
+                                          self._run_source_prepare()):
             for account in source_results.accounts:
                 self.account_source_map[account] = source
             for message in source_results.messages:
@@ -687,18 +1330,105 @@ class LoadedReconciler(object):
     def num_pending(self) -> int:
         return len(self.pending_data)
 
+    def predict_pending_accounts(self) -> None:
+        """Predicts the unknown accounts of all pending transactions.
+
+        The features of all prediction inputs are vectorized and classified in
+        a single batch, and the results are stored in the prediction cache used
+        by `predict_account`.
+        """
+        classifier, prediction_cache = self._prediction_state
+        self._predict_pending_accounts(classifier, prediction_cache,
+                                       self._get_pending_transactions(),
+                                       self._feature_extractor)
+
+    def _get_pending_transactions(self) -> List[Transaction]:
+        """Returns the pending transactions for which accounts are predicted."""
+        return [
+            pending.entries[0] for pending in self.pending_data
+            if len(pending.entries) == 1 and
+            isinstance(pending.entries[0], Transaction)
+        ]
+
+    def _predict_pending_accounts(
+            self, classifier, prediction_cache: Dict[FrozenSet[str], str],
+            transactions: List[Transaction],
+            feature_extractor: training.FeatureExtractor) -> None:
+        if classifier is None:
+            return
+        keys = []  # type: List[FrozenSet[str]]
+        featuresets = []  # type: List[Dict[str, bool]]
+        new_keys = set()  # type: Set[FrozenSet[str]]
+        for transaction in transactions:
+            for prediction_input in feature_extractor.extract_unknown_account_group_features(
+                    transaction):
+                if prediction_input is None: continue
+                features = self.training_examples.get_features(
+                    prediction_input)
+                key = _get_prediction_cache_key(features)
+                if key in prediction_cache or key in new_keys: continue
+                new_keys.add(key)
+                keys.append(key)
+                featuresets.append(features)
+        if not featuresets:
+            return
+        prediction_cache.update(zip(keys, classifier.classify_many(featuresets)))
+
     def predict_account(
             self, prediction_input: Optional[training.PredictionInput]) -> str:
-        if self.classifier is None or prediction_input is None:
+        classifier, prediction_cache = self._prediction_state
+        if classifier is None or prediction_input is None:
             return FIXME_ACCOUNT
-        features = training.get_features(prediction_input)
-        explanation = get_prediction_explanation(self.classifier, features)
-        predicted_account = self.classifier.classify(features)
+        features = self.training_examples.get_features(prediction_input)
+        key = _get_prediction_cache_key(features)
+        predicted_account = prediction_cache.get(key)
+        if predicted_account is None:
+            predicted_account = classifier.classify(features)
+            prediction_cache[key] = predicted_account
         if display_prediction_explanation:
-            print('\n'.join(explanation))
+            print('\n'.join(get_prediction_explanation(classifier, features)))
             print('predicted account = %r' % (predicted_account, ))
         return predicted_account
 
+    def explain_prediction(
+            self,
+            prediction_input: Optional[training.PredictionInput]) -> List[str]:
+        """Returns a description of how the account for `prediction_input` is
+        predicted by `predict_account`."""
+        if prediction_input is None:
+            return ['No features available for prediction']
+        if self.classifier is None:
+            return ['No classifier has been trained']
+        features = self.training_examples.get_features(prediction_input)
+        return get_prediction_explanation(self.classifier, features)
+
+    def explain_unknown_account_predictions(
+            self, transaction: Transaction) -> List[List[str]]:
+        """Returns the result of `explain_prediction` for each group of unknown
+        account postings of `transaction`, in the order of the group numbers."""
+        return [
+            self.explain_prediction(prediction_input)
+            for prediction_input in self._feature_extractor.
+            extract_unknown_account_group_features(transaction)
+        ]
+
+    def predict_account_with_confidence(
+            self, prediction_input: Optional[training.PredictionInput]
+    ) -> Tuple[str, float]:
+        """Returns the predicted account along with the probability assigned to
+        it by the classifier.
+
+        Only the naive Bayes classifier provides meaningful probabilities.  The
+        decision tree classifier nearly always assigns a probability of 1.
+        """
+        if self.classifier is None or prediction_input is None:
+            return FIXME_ACCOUNT, 0.0
+        features = self.training_examples.get_features(prediction_input)
+        predicted_account = self.classifier.classify(features)
+        confidence = self.classifier.prob_classify(features).prob(
+            predicted_account)
+        return predicted_account, confidence
+
     def _get_generic_stage(self, entries: Entries):
         stage = self.editor.stage_changes()
         for entry in entries:
@@ -734,6 +1464,53 @@ class LoadedReconciler(object):
             group_predictions[group_number] for group_number in group_numbers
         ]
 
+    def _get_confident_unknown_account_predictions(
+            self, transaction: Transaction,
+            min_confidence: float) -> Optional[List[str]]:
+        """Returns the predicted accounts for the unknown account postings of
+        `transaction`, or `None` if any of the predictions has a confidence less
+        than `min_confidence`."""
+        group_prediction_inputs = self._feature_extractor.extract_unknown_account_group_features(
+            transaction)
+        group_predictions = []
+        for prediction_input in group_prediction_inputs:
+            predicted_account, confidence = self.predict_account_with_confidence(
+                prediction_input)
+            if (is_unknown_account(predicted_account) or
+                    confidence < min_confidence):
+                return None
+            group_predictions.append(predicted_account)
+        group_numbers = training.get_unknown_account_group_numbers(transaction)
+        return [
+            group_predictions[group_number] for group_number in group_numbers
+        ]
+
+    def get_auto_accept_candidate(self, pending: PendingEntry,
+                                  min_confidence: float) -> Optional[Candidate]:
+        """Returns the candidate for `pending` that may be accepted without user
+        review, or `None` if there is no such candidate.
+
+        A candidate may be accepted automatically only if the search for merged
+        transactions completed and found exactly one merged transaction, and
+        the accounts of all of its unknown account postings were predicted with
+        a confidence of at least `min_confidence`.
+        """
+        if len(pending.entries) != 1 or not isinstance(pending.entries[0],
+                                                       Transaction):
+            return None
+        match_results, truncated = self._search_extended_transactions(
+            pending.entries[0])
+        if truncated or len(match_results) != 1:
+            return None
+        transaction, used_transactions = match_results[0]
+        predicted_accounts = self._get_confident_unknown_account_predictions(
+            transaction, min_confidence)
+        if predicted_accounts is None:
+            return None
+        return self._make_candidate_with_substitutions(
+            transaction, used_transactions,
+            predicted_accounts=predicted_accounts)
+
     def _make_candidate_with_substitutions(self,
                                            transaction: Transaction,
                                            used_transactions: List[Transaction],
@@ -774,6 +1551,14 @@ class LoadedReconciler(object):
                 changes=changes,
                 predicted_accounts=predicted_accounts)
 
+        def refresh_predictions():
+            return self._make_candidate_with_substitutions(
+                transaction,
+                used_transactions,
+                changes=changes,
+                predicted_accounts=self._get_unknown_account_predictions(
+                    transaction))
+
         new_transaction = _replace_transaction_properties(transaction, changes)
         real_transaction = _get_transaction_with_substitutions(
             new_transaction, new_accounts)
@@ -815,15 +1600,100 @@ class LoadedReconciler(object):
                 payee=transaction.payee,
                 narration=transaction.narration,
             ),
-            substitute=substitute)
+            substitute=substitute,
+            explain_predictions=
+            lambda: self.explain_unknown_account_predictions(transaction),
+            refresh_predictions=refresh_predictions)
+
+    def _search_extended_transactions(self, transaction: Transaction
+                                      ) -> matching.ExtendedTransactionsResult:
+        with self._prefetched_matches_lock:
+            prefetched = self._prefetched_matches.pop(id(transaction), None)
+        if prefetched is not None:
+            return prefetched[0]
+        # Stop any prefetch, rather than waiting for its search to finish.
+        self.cancel_prefetch()
+        with self._posting_db_lock:
+            return matching.search_extended_transactions(
+                transaction,
+                posting_db=self.posting_db,
+                limits=self.search_limits)
+
+    def _prefetch_matches(self, transactions: List[Transaction],
+                          generation: int,
+                          cancel_event: threading.Event) -> None:
+        for transaction in transactions:
+            with self._posting_db_lock:
+                if generation != self._prefetch_generation:
+                    return
+                if id(transaction) not in self.pending_transaction_ids:
+                    continue
+                with self._prefetched_matches_lock:
+                    if id(transaction) in self._prefetched_matches:
+                        continue
+                recorder = matching.RecordingPostingDatabase(self.posting_db)
+                result = matching.search_extended_transactions(
+                    transaction,
+                    posting_db=cast(matching.PostingDatabase, recorder),
+                    limits=self.search_limits,
+                    cancel_event=cancel_event)
+                if cancel_event.is_set():
+                    # The result may be incomplete.
+                    return
+                with self._prefetched_matches_lock:
+                    self._prefetched_matches[id(transaction)] = (result,
+                                                                 recorder)
+
+    def _start_prefetch(self, next_index: int) -> None:
+        """Starts computing merged transactions in the background for the
+        `num_prefetch` pending entries starting at `next_index`."""
+        self.cancel_prefetch()
+        if self.num_prefetch <= 0:
+            return
+        transactions = [
+            pending.entries[0]
+            for pending in self.pending_data[next_index:next_index +
+                                             self.num_prefetch]
+            if len(pending.entries) == 1 and
+            isinstance(pending.entries[0], Transaction)
+        ]
+        if not transactions:
+            return
+        self._prefetch_cancel_event = threading.Event()
+        self.prefetch_future = self._prefetch_executor.submit(
+            self._prefetch_matches, transactions, self._prefetch_generation,
+            self._prefetch_cancel_event)
+
+    def cancel_prefetch(self) -> None:
+        """Stops any in-progress background computation of merged
+        transactions.
+
+        This does not require `_posting_db_lock`, and should be called before
+        acquiring it so that the prefetch thread releases it promptly.
+        """
+        self._prefetch_generation += 1
+        self._prefetch_cancel_event.set()
+
+    def _invalidate_prefetched_matches(
+            self, removed_transactions: List[Transaction],
+            added_transactions: List[Transaction]) -> None:
+        """Discards prefetched results that may be affected by removing
+        `removed_transactions` from and adding `added_transactions` to
+        `posting_db`."""
+        with self._prefetched_matches_lock:
+            for key, (_, recorder) in list(self._prefetched_matches.items()):
+                if (key not in self.pending_transaction_ids or
+                        recorder.is_affected_by(removed_transactions,
+                                                added_transactions)):
+                    del self._prefetched_matches[key]
 
     def _make_candidates_from_import_result(self, next_pending):
         if len(next_pending.entries) == 1 and isinstance(
                 next_pending.entries[0], Transaction):
             next_entry = next_pending.entries[0]
             candidates = []
-            match_results = matching.get_extended_transactions(
-                next_entry, posting_db=self.posting_db)
+            match_results, truncated = self._search_extended_transactions(
+                next_entry)
             # Always include the original transaction.
             match_results.append((next_entry, [next_entry]))
             for transaction, used_transactions in match_results:
@@ -840,6 +1710,7 @@ class LoadedReconciler(object):
                 number=self._get_primary_transaction_amount_number(next_entry),
                 pending_data=self.pending_data,
                 sources=self.sources,
+                truncated=truncated,
             )
         else:
             assert next_pending.source is not None
@@ -870,8 +1741,9 @@ class LoadedReconciler(object):
                     skip_ids[pending.id] -= 1
                 else:
                     break
-            return self._make_candidates_from_import_result(
-                pending), i, new_skip_ids
+            candidates = self._make_candidates_from_import_result(pending)
+            self._start_prefetch(i + 1)
+            return candidates, i, new_skip_ids
         return None, None, collections.Counter()
 
     def get_skip_ids_by_index(self, index: int):
@@ -892,31 +1764,46 @@ class LoadedReconciler(object):
         if ignore:
             staged_changes = staged_changes.make_with_new_output_filename(
                 ignored_path)
-        result = staged_changes.apply()
-        old_entries = result.old_entries
-        new_entries = result.new_entries
-
-        for entry in old_entries:
-            if isinstance(entry, Transaction):
+        self.cancel_prefetch()
+        with self._posting_db_lock:
+            result = staged_changes.apply()
+            old_entries = result.old_entries
+            new_entries = result.new_entries
+
+            removed_transactions = [
+                entry for entry in old_entries
+                if isinstance(entry, Transaction)
+            ]
+            for entry in removed_transactions:
                 self.posting_db.remove_transaction(entry)
 
-        old_entry_ids = set(id(x) for x in old_entries)
-        self.uncleared_postings = [
-            x for x in self.uncleared_postings if id(x[0]) not in old_entry_ids
-        ]
-        for import_result in candidate.used_import_results:
-            if isinstance(import_result, Transaction):
-                if id(import_result) in self.pending_transaction_ids:
-                    self.pending_transaction_ids.remove(id(import_result))
-                    self.posting_db.remove_transaction(import_result)
-
-        self._add_uncleared_postings_from(new_entries)
-        self.uncleared_postings.sort(key=lambda x: x[0].date)
-        for entry in new_entries:
-            if isinstance(entry, Transaction):
+            old_entry_ids = set(id(x) for x in old_entries)
+            self.uncleared_postings = [
+                x for x in self.uncleared_postings
+                if id(x[0]) not in old_entry_ids
+            ]
+            for import_result in candidate.used_import_results:
+                if isinstance(import_result, Transaction):
+                    if id(import_result) in self.pending_transaction_ids:
+                        self.pending_transaction_ids.remove(id(import_result))
+                        self.posting_db.remove_transaction(import_result)
+                        removed_transactions.append(import_result)
+
+            self._add_uncleared_postings_from(new_entries)
+            self.uncleared_postings.sort(key=lambda x: x[0].date)
+            added_transactions = [
+                entry for entry in new_entries
+                if isinstance(entry, Transaction)
+            ]
+            for entry in added_transactions:
                 self.posting_db.add_transaction(entry)
 
-        self._extract_training_examples(new_entries)
+            self._invalidate_prefetched_matches(removed_transactions,
+                                                added_transactions)
+
+        with self._classifier_lock:
+            self._update_classifier(
+                self._extract_training_examples(new_entries))
 
         used_import_result_ids = frozenset(
             map(id, candidate.used_import_results))
@@ -941,21 +1828,55 @@ class Reconciler(object):
         self.ignore_path = ignore_path
         self.log_status = log_status
         self.entry_file_selector = EntryFileSelector.from_args(options)
-        self.loaded_future = call_in_new_thread(
-            LoadedReconciler, reconciler=self, classifier=None)
+        self.loaded_future = call_in_new_thread(self._load)
+
+    def _load(self) -> LoadedReconciler:
+        """Loads the reconciler, using the snapshot specified by the
+        `reconciler_snapshot` option if it is up to date."""
+        snapshot_path = self.options.get('reconciler_snapshot')
+        if snapshot_path is None:
+            return LoadedReconciler(reconciler=self, classifier=None)
+        snapshot_path = get_classifier_model_path(snapshot_path, self.options)
+        source_fingerprint = get_source_input_fingerprint(
+            self.options['data_sources'])
+        try:
+            loaded_reconciler = LoadedReconciler.load_snapshot(
+                self, snapshot_path, source_fingerprint)
+            if loaded_reconciler is not None:
+                return loaded_reconciler
+        except:
+            import traceback
+            traceback.print_exc()
+            print('Not using reconciler snapshot due to above error')
+        loaded_reconciler = LoadedReconciler(reconciler=self, classifier=None)
+        try:
+            loaded_reconciler.save_snapshot(snapshot_path, source_fingerprint)
+        except:
+            import traceback
+            traceback.print_exc()
+            print('Failed to save reconciler snapshot due to above error')
+        return loaded_reconciler
 
     def reload_journal(self):
         assert self.loaded_future.done()
         loaded_reconciler = self.loaded_future.result()
-        classifier = loaded_reconciler.classifier
-        existing_sources = loaded_reconciler.sources
-        self.loaded_future = call_in_new_thread(
-            LoadedReconciler,
-            reconciler=self,
-            classifier=classifier,
-            sources=existing_sources)
+        loaded_reconciler.cancel_prefetch()
 
-    def retrain(self):
+        def reload():
+            if loaded_reconciler.reload_modified_files():
+                return loaded_reconciler
+            return LoadedReconciler(
+                reconciler=self,
+                classifier=loaded_reconciler.classifier,
+                sources=loaded_reconciler.sources)
+
+        self.loaded_future = call_in_new_thread(reload)
+
+    def retrain(self) -> concurrent.futures.Future:
+        """Retrains the classifier in the background.
+
+        See `LoadedReconciler.start_background_retrain`.
+        """
         assert self.loaded_future.done()
         loaded_reconciler = self.loaded_future.result()
-        self.loaded_future = call_in_new_thread(loaded_reconciler.retrain)
+        return loaded_reconciler.start_background_retrain()
@@ -3,7 +3,9 @@ import collections
 import io
 import os
 import json
+import pickle
 import shutil
+import threading
 
 import py
 from beancount.core.data import Directive, Posting, Transaction
@@ -161,6 +163,9 @@ class ReconcileGoldenTester:
     def _update_candidates(self):
         self.next_candidates, index, self.skip_ids = self.loaded_reconciler.get_next_candidates(
             self.skip_ids)
+        prefetch_future = self.loaded_reconciler.prefetch_future
+        if prefetch_future is not None:
+            prefetch_future.result()
 
     def skip(self, index: int):
         self.skip_ids = self.loaded_reconciler.get_skip_ids_by_index(index)
@@ -248,6 +253,28 @@ def test_basic(tmpdir: py.path.local):
     tester.snapshot()
 
 
+def test_basic_prefetch(tmpdir: py.path.local):
+    tester = ReconcileGoldenTester(
+        golden_directory=os.path.join(testdata_root, 'reconcile', 'test_basic'),
+        temp_dir=str(tmpdir),
+        options=dict(
+            data_sources=[
+                {
+                    'module': 'beancount_import.source.mint',
+                    'filename': mint_data_path,
+                },
+            ],
+            prefetch_candidates=2,
+        ),
+    )
+
+    tester.accept_candidate(0)
+    tester.snapshot()
+    tester.change_candidate(0, dict(accounts=['Expenses:Coffee'], ))
+    tester.accept_candidate(0)
+    tester.snapshot()
+
+
 def test_ignore(tmpdir: py.path.local):
     tester = ReconcileGoldenTester(
         golden_directory=os.path.join(testdata_root, 'reconcile',
@@ -327,3 +354,544 @@ def test_ofx_cleared(tmpdir: py.path.local):
             ],
         ),
     )
+
+
+_MINT_ACCOUNTS_JOURNAL = '''
+1900-01-01 open Liabilities:Credit-Card  USD
+  mint_id: "My Credit Card"
+
+1900-01-01 open Assets:Checking  USD
+  mint_id: "My Checking"
+
+1900-01-01 open Expenses:Coffee
+'''
+
+
+def _write_journal(tmpdir: py.path.local,
+                   contents: str = _MINT_ACCOUNTS_JOURNAL) -> str:
+    """Writes the journal and an empty ignored journal to `tmpdir`.
+
+    :returns: The path to the journal.
+    """
+    journal_path = str(tmpdir.join('journal.beancount'))
+    with open(journal_path, 'w', encoding='utf-8', newline='\n') as f:
+        f.write(contents)
+    tmpdir.join('ignore.beancount').write('')
+    return journal_path
+
+
+def _make_reconciler(tmpdir: py.path.local,
+                     data_sources: Optional[List[Dict[str, Any]]] = None,
+                     log_status=print,
+                     **options) -> reconcile.Reconciler:
+    """Returns a reconciler for the journal written by `_write_journal`.
+
+    By default, the mint test data is imported.
+    """
+    if data_sources is None:
+        data_sources = [
+            {
+                'module': 'beancount_import.source.mint',
+                'filename': mint_data_path,
+            },
+        ]
+    options.setdefault('classifier_cache', None)
+    journal_path = str(tmpdir.join('journal.beancount'))
+    return reconcile.Reconciler(
+        journal_path=journal_path,
+        ignore_path=str(tmpdir.join('ignore.beancount')),
+        log_status=log_status,
+        options=dict(
+            data_sources=data_sources,
+            transaction_output_map=[],
+            price_output=None,
+            open_account_output_map=[],
+            default_output=journal_path,
+            balance_account_output_map=[],
+            fuzzy_match_days=5,
+            fuzzy_match_amount=0,
+            account_pattern=None,
+            ignore_account_for_classification_pattern=training.
+            DEFAULT_IGNORE_ACCOUNT_FOR_CLASSIFICATION_PATTERN,
+            **options))
+
+
+def test_incremental_reload(tmpdir: py.path.local, monkeypatch):
+    journal_path = _write_journal(
+        tmpdir, 'include "transactions.beancount"\n' + _MINT_ACCOUNTS_JOURNAL)
+    transactions_path = str(tmpdir.join('transactions.beancount'))
+    with open(transactions_path, 'w', encoding='utf-8', newline='\n') as f:
+        f.write('''
+2013-11-01 * "Coffee"
+  Liabilities:Credit-Card  -1.00 USD
+    date: 2013-11-01
+    source_desc: "COFFEE"
+  Expenses:Coffee  1.00 USD
+''')
+    reconciler = _make_reconciler(tmpdir)
+    loaded_reconciler = reconciler.loaded_future.result()
+    assert loaded_reconciler.num_pending == 3
+    assert len(loaded_reconciler.training_examples.training_examples) == 1
+
+    # Replace the existing transaction with one that matches a pending entry,
+    # after a new blank line that shifts subsequent line numbers.
+    with open(transactions_path, 'w', encoding='utf-8', newline='\n') as f:
+        f.write('''
+
+2016-08-10 * "STARBUCKS STORE 12345"
+  Liabilities:Credit-Card  -2.45 USD
+    date: 2016-08-10
+    source_desc: "STARBUCKS STORE 12345"
+  Expenses:Coffee  2.45 USD
+''')
+    mtime = os.stat(transactions_path).st_mtime + 10
+    os.utime(transactions_path, (mtime, mtime))
+
+    reconciler.reload_journal()
+    assert reconciler.loaded_future.result() is loaded_reconciler
+    assert loaded_reconciler.num_pending == 2
+
+    # The incremental result must match loading the journal from scratch.
+    full_reconciler = reconcile.LoadedReconciler(
+        reconciler, sources=loaded_reconciler.sources)
+    assert _encode_pending_entries(
+        loaded_reconciler.pending_data) == _encode_pending_entries(
+            full_reconciler.pending_data)
+    assert test_util.format_entries(
+        loaded_reconciler.editor.entries) == test_util.format_entries(
+            full_reconciler.editor.entries)
+    assert loaded_reconciler.training_examples.training_examples == full_reconciler.training_examples.training_examples
+    assert len(loaded_reconciler.posting_db._amount_postings) == len(
+        full_reconciler.posting_db._amount_postings)
+    assert loaded_reconciler.uncleared_postings == []
+
+    # If the authoritative sources of accounts change, the state derived from
+    # unmodified entries is recomputed as well.
+    orig_prepare_sources = reconcile.LoadedReconciler._prepare_sources
+
+    def prepare_sources(self):
+        all_source_results = orig_prepare_sources(self)
+        del self.account_source_map['Liabilities:Credit-Card']
+        return all_source_results
+
+    monkeypatch.setattr(reconcile.LoadedReconciler, '_prepare_sources',
+                        prepare_sources)
+    with open(transactions_path, 'a', encoding='utf-8', newline='\n') as f:
+        f.write('\n')
+    mtime = os.stat(transactions_path).st_mtime + 20
+    os.utime(transactions_path, (mtime, mtime))
+    reconciler.reload_journal()
+    assert reconciler.loaded_future.result() is loaded_reconciler
+    assert loaded_reconciler._feature_extractor.account_source_map is loaded_reconciler.account_source_map
+    full_reconciler = reconcile.LoadedReconciler(
+        reconciler, sources=loaded_reconciler.sources)
+    assert _encode_pending_entries(
+        loaded_reconciler.pending_data) == _encode_pending_entries(
+            full_reconciler.pending_data)
+    assert loaded_reconciler.training_examples.training_examples == full_reconciler.training_examples.training_examples
+    assert sorted(loaded_reconciler.posting_db._amount_postings) == sorted(
+        full_reconciler.posting_db._amount_postings)
+    monkeypatch.undo()
+
+    # Modifying the top-level journal requires a full reload.
+    with open(journal_path, 'a', encoding='utf-8', newline='\n') as f:
+        f.write('\n1900-01-01 open Expenses:Tea\n')
+    mtime = os.stat(journal_path).st_mtime + 10
+    os.utime(journal_path, (mtime, mtime))
+    reconciler.reload_journal()
+    assert reconciler.loaded_future.result() is not loaded_reconciler
+
+    # If the training examples of the removed entries cannot be removed, the
+    # loaded state is not modified and the journal is loaded from scratch.
+    loaded_reconciler = reconciler.loaded_future.result()
+    num_pending = loaded_reconciler.num_pending
+    num_transactions = len(loaded_reconciler.posting_db._amount_postings)
+
+    def remove_many(self, examples):
+        raise ValueError('Training example not present')
+
+    monkeypatch.setattr(reconcile.training.TrainingExamples, 'remove_many',
+                        remove_many)
+    with open(transactions_path, 'a', encoding='utf-8', newline='\n') as f:
+        f.write('\n')
+    mtime = os.stat(transactions_path).st_mtime + 30
+    os.utime(transactions_path, (mtime, mtime))
+    assert not loaded_reconciler.reload_modified_files()
+    assert loaded_reconciler.num_pending == num_pending
+    assert len(loaded_reconciler.posting_db._amount_postings) == num_transactions
+    assert len(loaded_reconciler.pending_transaction_ids) > 0
+
+
+def test_parallel_source_prepare(tmpdir: py.path.local):
+    _write_journal(tmpdir)
+
+    def load(source_prepare_threads: int) -> reconcile.LoadedReconciler:
+        return _make_reconciler(
+            tmpdir,
+            data_sources=[
+                {
+                    'module': 'beancount_import.source.mint',
+                    'filename': mint_data_path,
+                },
+                {
+                    'module':
+                    'beancount_import.source.ofx',
+                    'ofx_filenames': [
+                        os.path.join(testdata_root, 'source', 'ofx',
+                                     'vanguard_roth_ira.ofx')
+                    ],
+                },
+            ],
+            source_prepare_threads=source_prepare_threads,
+        ).loaded_future.result()
+
+    sequential = load(0)
+    parallel = load(2)
+    assert parallel.num_pending == sequential.num_pending > 0
+    assert _encode_pending_entries(
+        parallel.pending_data) == _encode_pending_entries(
+            sequential.pending_data)
+    assert parallel.errors == sequential.errors
+    assert {
+        account: source.name
+        for account, source in parallel.account_source_map.items()
+    } == {
+        account: source.name
+        for account, source in sequential.account_source_map.items()
+    }
+
+
+def test_snapshot(tmpdir: py.path.local):
+    journal_path = _write_journal(tmpdir)
+    snapshot_path = str(tmpdir.join('snapshot.pickle'))
+
+    def load() -> Tuple[reconcile.LoadedReconciler, List[str]]:
+        messages = []  # type: List[str]
+        reconciler = _make_reconciler(
+            tmpdir,
+            log_status=messages.append,
+            reconciler_snapshot=snapshot_path)
+        return reconciler.loaded_future.result(), messages
+
+    loaded_reconciler, messages = load()
+    assert 'Loading snapshot' not in messages
+    assert os.path.exists(snapshot_path)
+
+    snapshot_reconciler, messages = load()
+    assert 'Loading snapshot' in messages
+    assert 'Loading journal' not in messages
+    assert _encode_pending_entries(
+        snapshot_reconciler.pending_data) == _encode_pending_entries(
+            loaded_reconciler.pending_data)
+    assert snapshot_reconciler.training_examples.training_examples == loaded_reconciler.training_examples.training_examples
+    assert snapshot_reconciler.pending_transaction_ids == set(
+        id(entry) for pending in snapshot_reconciler.pending_data
+        for entry in pending.entries
+        if isinstance(entry, Transaction))
+    assert _encode_candidates(
+        snapshot_reconciler.get_next_candidates()[0]) == _encode_candidates(
+            loaded_reconciler.get_next_candidates()[0])
+
+    # Accepting a candidate modifies the journal, which invalidates the
+    # snapshot.
+    num_pending = snapshot_reconciler.num_pending
+    snapshot_reconciler.accept_candidate(
+        snapshot_reconciler.get_next_candidates()[0].candidates[0])
+    assert snapshot_reconciler.num_pending < num_pending
+    mtime = os.stat(journal_path).st_mtime + 10
+    os.utime(journal_path, (mtime, mtime))
+    reloaded_reconciler, messages = load()
+    assert 'Loading snapshot' not in messages
+    assert _encode_pending_entries(
+        reloaded_reconciler.pending_data) == _encode_pending_entries(
+            snapshot_reconciler.pending_data)
+
+
+def _load_coffee_reconciler(tmpdir: py.path.local,
+                            extra_journal: str = '',
+                            **options) -> reconcile.LoadedReconciler:
+    """Loads a journal containing a single training example for the mint test
+    data, followed by `extra_journal`."""
+    _write_journal(
+        tmpdir, _MINT_ACCOUNTS_JOURNAL + '''
+2013-11-01 * "Coffee"
+  Liabilities:Credit-Card  -1.00 USD
+    date: 2013-11-01
+    source_desc: "STARBUCKS STORE 999"
+  Expenses:Coffee  1.00 USD
+''' + extra_journal)
+    return _make_reconciler(tmpdir, **options).loaded_future.result()
+
+
+def _get_starbucks_pending(loaded_reconciler: reconcile.LoadedReconciler
+                           ) -> reconcile.PendingEntry:
+    return [
+        pending for pending in loaded_reconciler.pending_data
+        if 'STARBUCKS' in pending.formatted
+    ][0]
+
+
+def test_prefetch_cancel(tmpdir: py.path.local, monkeypatch):
+    loaded_reconciler = _load_coffee_reconciler(tmpdir, prefetch_candidates=1)
+    orig_search = reconcile.matching.search_extended_transactions
+    prefetch_started = threading.Event()
+    prefetch_cancelled = []  # type: List[bool]
+
+    def search_extended_transactions(*args, cancel_event=None, **kwargs):
+        if cancel_event is not None:
+            # Simulate a slow search for the prefetched entry.
+            prefetch_started.set()
+            prefetch_cancelled.append(cancel_event.wait(10))
+        return orig_search(*args, cancel_event=cancel_event, **kwargs)
+
+    monkeypatch.setattr(reconcile.matching, 'search_extended_transactions',
+                        search_extended_transactions)
+    candidates = loaded_reconciler.get_next_candidates()[0]
+    assert prefetch_started.wait(10)
+
+    # Accepting a candidate stops the in-progress search rather than waiting
+    # for it to finish.
+    loaded_reconciler.accept_candidate(candidates.candidates[0])
+    assert prefetch_cancelled == [True]
+    prefetch_future = loaded_reconciler.prefetch_future
+    assert prefetch_future is not None
+    prefetch_future.result()
+    assert loaded_reconciler._prefetched_matches == {}
+
+
+def test_prefetched_result_while_prefetching(tmpdir: py.path.local,
+                                             monkeypatch):
+    loaded_reconciler = _load_coffee_reconciler(tmpdir, prefetch_candidates=2)
+    orig_search = reconcile.matching.search_extended_transactions
+    prefetch_searches = []  # type: List[Transaction]
+    second_prefetch_started = threading.Event()
+    release_prefetch = threading.Event()
+
+    def search_extended_transactions(transaction, *args, cancel_event=None,
+                                     **kwargs):
+        if cancel_event is not None:
+            prefetch_searches.append(transaction)
+            if len(prefetch_searches) == 2:
+                # Simulate a slow search for the second prefetched entry.
+                second_prefetch_started.set()
+                release_prefetch.wait(10)
+        return orig_search(
+            transaction, *args, cancel_event=cancel_event, **kwargs)
+
+    monkeypatch.setattr(reconcile.matching, 'search_extended_transactions',
+                        search_extended_transactions)
+    loaded_reconciler.get_next_candidates()
+    assert second_prefetch_started.wait(10)
+
+    # The result prefetched for the first entry is available without waiting
+    # for the search for the second entry to finish.
+    result = loaded_reconciler._search_extended_transactions(
+        prefetch_searches[0])
+    assert result is not None
+    prefetch_future = loaded_reconciler.prefetch_future
+    assert prefetch_future is not None
+    assert not prefetch_future.done()
+    release_prefetch.set()
+    prefetch_future.result()
+
+
+def test_online_classifier_update(tmpdir: py.path.local):
+    loaded_reconciler = _load_coffee_reconciler(
+        tmpdir, classifier_model='naive_bayes')
+    classifier = loaded_reconciler.classifier
+    assert isinstance(classifier, training.NaiveBayesClassifier)
+    assert classifier._label_counts == {'Expenses:Coffee': 1}
+
+    # Accept the candidate for the pending Starbucks transaction, for which
+    # `Expenses:Coffee` is predicted.
+    pending = _get_starbucks_pending(loaded_reconciler)
+    candidates = loaded_reconciler._make_candidates_from_import_result(pending)
+    loaded_reconciler.accept_candidate(candidates.candidates[0])
+    assert loaded_reconciler.classifier is classifier
+    assert classifier._label_counts == {'Expenses:Coffee': 2}
+    full_classifier = training.NaiveBayesClassifier().train(
+        loaded_reconciler.training_examples.training_examples)
+    assert classifier._feature_counts == full_classifier._feature_counts
+
+
+def test_min_confidence(tmpdir: py.path.local):
+    extra_journal = '''
+1900-01-01 open Expenses:Food
+
+2013-11-02 * "Lunch"
+  Liabilities:Credit-Card  -9.00 USD
+    date: 2013-11-02
+    source_desc: "SANDWICH SHOP 12345"
+  Expenses:Food  9.00 USD
+'''
+    loaded_reconciler = _load_coffee_reconciler(
+        tmpdir, extra_journal=extra_journal, classifier_model='naive_bayes')
+    transaction = _get_starbucks_pending(loaded_reconciler).entries[0]
+    [prediction_input] = loaded_reconciler._feature_extractor.extract_unknown_account_group_features(
+        transaction)
+    predicted_account, confidence = loaded_reconciler.predict_account_with_confidence(
+        prediction_input)
+    assert predicted_account == 'Expenses:Coffee'
+    assert 0.5 < confidence < 0.99
+
+    # A low-confidence prediction is rejected by a higher threshold.
+    assert loaded_reconciler._get_confident_unknown_account_predictions(
+        transaction, min_confidence=0.5) == ['Expenses:Coffee']
+    assert loaded_reconciler._get_confident_unknown_account_predictions(
+        transaction, min_confidence=0.99) is None
+
+
+def test_explain_predictions(tmpdir: py.path.local):
+    loaded_reconciler = _load_coffee_reconciler(tmpdir)
+    pending = _get_starbucks_pending(loaded_reconciler)
+    candidates = loaded_reconciler._make_candidates_from_import_result(pending)
+    candidate = candidates.candidates[0]
+    assert [x.predicted_account_name for x in candidate.substituted_accounts
+            ] == ['Expenses:Coffee']
+
+    # The explanation is only computed on request.
+    assert loaded_reconciler.classifier not in reconcile._feature_names_cache
+    explanations = candidate.explain_predictions()
+    assert loaded_reconciler.classifier in reconcile._feature_names_cache
+    assert explanations == [['return Expenses:Coffee (1 counts)']]
+
+
+def test_batch_prediction(tmpdir: py.path.local):
+    loaded_reconciler = _load_coffee_reconciler(tmpdir)
+    classifier = loaded_reconciler.classifier
+    assert set(loaded_reconciler._prediction_state[1].values()) == {
+        'Expenses:Coffee'
+    }
+    num_cached = len(loaded_reconciler._prediction_state[1])
+    assert num_cached > 0
+
+    def classify(featureset):
+        raise AssertionError('Prediction not cached')
+
+    # Candidates for pending entries use the cached predictions.
+    orig_classify = classifier.classify
+    classifier.classify = classify
+    pending = _get_starbucks_pending(loaded_reconciler)
+    candidates = loaded_reconciler._make_candidates_from_import_result(pending)
+    assert [
+        x.predicted_account_name
+        for x in candidates.candidates[0].substituted_accounts
+    ] == ['Expenses:Coffee']
+    classifier.classify = orig_classify
+
+    loaded_reconciler.retrain()
+    assert loaded_reconciler.classifier is not classifier
+    assert len(loaded_reconciler._prediction_state[1]) == num_cached
+
+
+def test_background_retrain(tmpdir: py.path.local):
+    loaded_reconciler = _load_coffee_reconciler(tmpdir)
+    classifier = loaded_reconciler.classifier
+    pending = _get_starbucks_pending(loaded_reconciler)
+    candidates = loaded_reconciler._make_candidates_from_import_result(pending)
+    candidates.change_transaction(0, {'narration': 'Coffee'})
+    old_candidate = candidates.candidates[0]
+
+    future = loaded_reconciler.start_background_retrain()
+    new_classifier = future.result()
+    assert new_classifier is not None
+    assert new_classifier is not classifier
+    assert loaded_reconciler.classifier is new_classifier
+    assert set(loaded_reconciler._prediction_state[1].values()) == {
+        'Expenses:Coffee'
+    }
+
+    # Only the predictions of the existing candidates are refreshed.
+    candidates.refresh_predictions()
+    new_candidate = candidates.candidates[0]
+    assert new_candidate is not old_candidate
+    assert new_candidate.used_transaction_ids == old_candidate.used_transaction_ids
+    assert new_candidate.staged_changes.get_diff().new_entries[
+        0].narration == 'Coffee'
+    assert [x.predicted_account_name for x in new_candidate.substituted_accounts
+            ] == ['Expenses:Coffee']
+
+
+def test_background_retrain_concurrent_changes(tmpdir: py.path.local):
+    loaded_reconciler = _load_coffee_reconciler(
+        tmpdir, classifier_model='naive_bayes')
+    orig_train_classifier = loaded_reconciler._train_classifier
+    training_started = threading.Event()
+    resume_training = threading.Event()
+
+    def train_classifier(training_examples):
+        training_started.set()
+        assert resume_training.wait(10)
+        return orig_train_classifier(training_examples)
+
+    loaded_reconciler._train_classifier = train_classifier  # type: ignore
+    future = loaded_reconciler.start_background_retrain()
+    assert training_started.wait(10)
+
+    # Remove the existing training example and accept a candidate, which adds
+    # one, while the classifier is being trained on the original example.
+    loaded_reconciler._remove_training_examples(loaded_reconciler.editor.entries)
+    assert loaded_reconciler.training_examples.training_examples == []
+    pending = _get_starbucks_pending(loaded_reconciler)
+    candidates = loaded_reconciler._make_candidates_from_import_result(pending)
+    loaded_reconciler.accept_candidate(candidates.candidates[0])
+    resume_training.set()
+
+    # The new classifier also reflects exactly the accepted example.
+    new_classifier = future.result()
+    assert loaded_reconciler.classifier is new_classifier
+    assert new_classifier._label_counts == {'Expenses:Coffee': 2}
+    assert loaded_reconciler._training_example_logs == []
+
+
+def test_classifier_cache_fingerprint(tmpdir: py.path.local):
+    cache_path = str(tmpdir.join('classifier_cache'))
+    loaded_reconciler = _load_coffee_reconciler(
+        tmpdir, classifier_cache=cache_path)
+    assert loaded_reconciler.retrain_future is None
+
+    # The cache is used if the training examples are unchanged.
+    loaded_reconciler = _load_coffee_reconciler(
+        tmpdir, classifier_cache=cache_path)
+    assert loaded_reconciler.retrain_future is None
+    cached_classifier = loaded_reconciler.classifier
+    assert cached_classifier is not None
+
+    # Otherwise, the cached classifier is not used, and a new classifier is
+    # trained on the current examples.
+    loaded_reconciler = _load_coffee_reconciler(
+        tmpdir,
+        extra_journal='''
+1900-01-01 open Expenses:Food
+
+2013-11-02 * "Lunch"
+  Liabilities:Credit-Card  -9.00 USD
+    date: 2013-11-02
+    source_desc: "SANDWICH SHOP"
+  Expenses:Food  9.00 USD
+''',
+        classifier_cache=cache_path)
+    new_classifier = loaded_reconciler.classifier
+    assert new_classifier is not None
+    assert new_classifier is not cached_classifier
+    assert set(new_classifier.labels()) == {'Expenses:Coffee', 'Expenses:Food'}
+
+    # The cache now matches the new training examples.
+    with open(cache_path, 'rb') as f:
+        cache_data = pickle.load(f)
+    assert cache_data['training_examples_fingerprint'] == (
+        reconcile.get_training_examples_fingerprint(
+            loaded_reconciler.training_examples.training_examples))
+
+
+def test_get_classifier_model_path():
+    assert reconcile.get_classifier_model_path('cache', {}) == 'cache'
+    assert reconcile.get_classifier_model_path(
+        'cache', dict(classifier_model='decision_tree',
+                      classifier_vectorizer='dict')) == 'cache'
+    assert reconcile.get_classifier_model_path(
+        'cache', dict(classifier_model='naive_bayes')) == 'cache.naive_bayes'
+    assert reconcile.get_classifier_model_path(
+        'cache', dict(classifier_model='decision_tree',
+                      classifier_vectorizer='hashing')
+    ) == 'cache.decision_tree_hashing'
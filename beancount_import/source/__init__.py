@@ -247,6 +247,13 @@ class Source:
         self.example_transaction_key_extractors = dict(
         )  # type: Dict[str, ExampleKeyExtractor]
 
+    def __getstate__(self):
+        # The logging function is generally not picklable, and is restored by
+        # the reconciler when loading a snapshot.
+        state = self.__dict__.copy()
+        state['log_status'] = None
+        return state
+
     @property
     def name(self) -> str:
         """Returns the name of the source, e.g. "mint" or "ofx".
@@ -270,6 +277,10 @@ class Source:
         calling `results.add_account` or `result.add_accounts`.
 
         Errors can be indicated by calling `result.add_error`.
+
+        If the `source_prepare_threads` reconciler option is specified, this may
+        be called concurrently with the `prepare` method of other sources.
+        Therefore, `journal` must not be modified.
         """
         raise NotImplementedError
 
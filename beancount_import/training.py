@@ -1,7 +1,8 @@
 import collections
 import datetime
+import math
 import re
-from typing import Callable, Any, Dict, Iterable, List, NamedTuple, Sequence, Union, Optional, Tuple
+from typing import Callable, Any, Dict, Iterable, List, NamedTuple, Sequence, Set, Union, Optional, Tuple
 
 from beancount.core.data import Directive, Entries, Transaction, Posting
 from beancount.core.amount import Amount
@@ -25,34 +26,292 @@ PredictionInput = NamedTuple('PredictionInput',
                               ('key_value_pairs', ExampleKeyValuePairs)])
 
 
-def get_features(example: PredictionInput) -> Dict[str, bool]:
-    features = collections.defaultdict(lambda: False)  # type: Dict[str, bool]
-    features['account:%s' % example.source_account] = True
-
-    # For now, skip amount and date.
-
-    for key, values in example.key_value_pairs.items():
-        if isinstance(values, str):
-            values = (values, )
-        for value in values:
-            words = []
-            for w in value.split():
-                w = w.strip('-.').lower()
-                if len(w) > 0:
-                    words.append(w)
-            for start_i in range(len(words)):
-                for end_i in range(start_i + 1, len(words) + 1):
-                    features['%s:%s' % (key, ' '.join(
-                        words[start_i:end_i]))] = True
+# Default number of columns of the feature matrix used by `HashingClassifier`.
+DEFAULT_NUM_HASHED_FEATURES = 2**20
+
+# Default maximum number of words in a feature used with `HashingClassifier`.
+DEFAULT_HASHING_MAX_NGRAM_LENGTH = 3
+
+
+def _get_value_features(key: str, value: str,
+                        max_ngram_length: Optional[int]) -> Dict[str, bool]:
+    """Returns the features of the metadata `value` for `key`."""
+    words = []
+    for w in value.split():
+        w = w.strip('-.').lower()
+        if len(w) > 0:
+            words.append(w)
+    features = {}  # type: Dict[str, bool]
+    for start_i in range(len(words)):
+        end_limit = len(words)
+        if max_ngram_length is not None:
+            end_limit = min(end_limit, start_i + max_ngram_length)
+        for end_i in range(start_i + 1, end_limit + 1):
+            features['%s:%s' % (key, ' '.join(words[start_i:end_i]))] = True
     return features
 
 
+def get_features(example: PredictionInput,
+                 max_ngram_length: Optional[int] = None) -> Dict[str, bool]:
+    """Computes the features of `example`.
+
+    Each contiguous sequence of words of each metadata value is a feature.
+
+    :param max_ngram_length: If not `None`, only sequences of at most this many
+        words are included.
+    """
+    return get_features_many([example], max_ngram_length=max_ngram_length)[0]
+
+
+def get_features_many(examples: Sequence[PredictionInput],
+                      max_ngram_length: Optional[int] = None
+                      ) -> List[Dict[str, bool]]:
+    """Computes the features of each of `examples`, in order.
+
+    This is equivalent to calling `get_features` for each example, but the
+    features of each distinct metadata value are computed only once, since the
+    same descriptions typically occur in many entries of a journal.
+    """
+    value_features = {}  # type: Dict[Tuple[str, str], Dict[str, bool]]
+    all_features = []  # type: List[Dict[str, bool]]
+    for example in examples:
+        features = collections.defaultdict(bool)  # type: Dict[str, bool]
+        features['account:%s' % example.source_account] = True
+
+        # For now, skip amount and date.
+
+        for key, values in example.key_value_pairs.items():
+            if isinstance(values, str):
+                values = (values, )
+            for value in values:
+                cache_key = (key, value)
+                cached = value_features.get(cache_key)
+                if cached is None:
+                    cached = value_features[cache_key] = _get_value_features(
+                        key, value, max_ngram_length)
+                features.update(cached)
+        all_features.append(features)
+    return all_features
+
+
 class TrainingExamples(object):
-    def __init__(self):
-        self.training_examples = []
+    def __init__(self, max_ngram_length: Optional[int] = None):
+        self.training_examples = []  # type: List[Tuple[Dict[str, bool], str]]
+        self.max_ngram_length = max_ngram_length
+
+    def get_features(self, example: PredictionInput) -> Dict[str, bool]:
+        return get_features(example, max_ngram_length=self.max_ngram_length)
 
     def add(self, example: PredictionInput, target_account: str):
-        self.training_examples.append((get_features(example), target_account))
+        self.training_examples.append((self.get_features(example),
+                                       target_account))
+
+    def add_many(self,
+                 examples: Sequence[Tuple[PredictionInput, str]]) -> None:
+        """Adds each of the (example, target_account) pairs in `examples`.
+
+        This is equivalent to calling `add` for each pair, but faster.  See
+        `get_features_many`.
+        """
+        features = get_features_many(
+            [example for example, _ in examples],
+            max_ngram_length=self.max_ngram_length)
+        self.training_examples.extend(
+            zip(features, [target_account for _, target_account in examples]))
+
+    def remove(self, example: PredictionInput, target_account: str):
+        self.remove_many([(example, target_account)])
+
+    def remove_many(self,
+                    examples: Sequence[Tuple[PredictionInput, str]]) -> None:
+        """Removes one occurrence of each of the (example, target_account)
+        pairs in `examples`.
+
+        The training examples are filtered in a single pass, rather than
+        searched once for each removed example.
+
+        :raises ValueError: if an example is not present.
+        """
+        remaining = collections.Counter(
+            (frozenset(self.get_features(example).items()), target_account)
+            for example, target_account in examples)
+        if not remaining:
+            return
+        training_examples = []  # type: List[Tuple[Dict[str, bool], str]]
+        for features, target_account in self.training_examples:
+            key = (frozenset(features.items()), target_account)
+            if remaining[key] > 0:
+                remaining[key] -= 1
+            else:
+                training_examples.append((features, target_account))
+        if any(remaining.values()):
+            raise ValueError('Training example not present')
+        self.training_examples = training_examples
+
+
+class HashingClassifier(object):
+    """Classifier that maps features to columns of a sparse matrix by hashing.
+
+    This provides the same interface as
+    `nltk.classify.scikitlearn.SklearnClassifier`, but rather than building a
+    vocabulary of all features seen in the training examples, each feature is
+    hashed into one of a fixed number of columns.  The feature matrices for
+    training and prediction are built in bulk, and their size does not depend
+    on the number of distinct features.
+    """
+
+    def __init__(self,
+                 estimator,
+                 num_features: int = DEFAULT_NUM_HASHED_FEATURES) -> None:
+        import sklearn.feature_extraction
+        import sklearn.preprocessing
+        self._clf = estimator
+        self._encoder = sklearn.preprocessing.LabelEncoder()
+        self._vectorizer = sklearn.feature_extraction.FeatureHasher(
+            n_features=num_features, input_type='string', alternate_sign=False)
+
+    def __repr__(self):
+        return '<HashingClassifier(%r)>' % self._clf
+
+    def transform(self, featuresets: Iterable[Dict[str, bool]]):
+        """Returns the sparse feature matrix for `featuresets`."""
+        return self._vectorizer.transform(
+            [name for name, value in featureset.items() if value]
+            for featureset in featuresets)
+
+    def train(self, labeled_featuresets: Sequence[Tuple[Dict[str, bool], str]]
+              ) -> 'HashingClassifier':
+        featuresets, labels = zip(*labeled_featuresets)
+        x = self.transform(featuresets)
+        y = self._encoder.fit_transform(labels)
+        self._clf.fit(x, y)
+        return self
+
+    def labels(self) -> List[str]:
+        return [str(label) for label in self._encoder.classes_]
+
+    def classify_many(self,
+                      featuresets: Sequence[Dict[str, bool]]) -> List[str]:
+        if not featuresets:
+            return []
+        classes = self._encoder.classes_
+        return [
+            str(classes[i])
+            for i in self._clf.predict(self.transform(featuresets))
+        ]
+
+    def prob_classify_many(self, featuresets: Sequence[Dict[str, bool]]):
+        from nltk.probability import DictionaryProbDist
+        if not featuresets:
+            return []
+        classes = self._encoder.classes_
+        return [
+            DictionaryProbDist({
+                str(classes[i]): prob
+                for i, prob in zip(self._clf.classes_, probs)
+            })
+            for probs in self._clf.predict_proba(self.transform(featuresets))
+        ]
+
+    def classify(self, featureset: Dict[str, bool]) -> str:
+        return self.classify_many([featureset])[0]
+
+    def prob_classify(self, featureset: Dict[str, bool]):
+        return self.prob_classify_many([featureset])[0]
+
+
+class NaiveBayesClassifier(object):
+    """Multinomial naive Bayes classifier that supports incremental updates.
+
+    This provides the same interface as
+    `nltk.classify.scikitlearn.SklearnClassifier`, and additionally a
+    `partial_fit` method.  The model consists only of per-label feature counts,
+    so training incrementally with `partial_fit` results in exactly the same
+    model as training on all of the examples at once, and new labels and
+    features may be introduced at any time.
+    """
+
+    def __init__(self, alpha: float = 1.0) -> None:
+        """
+        :param alpha: Additive smoothing parameter.
+        """
+        self.alpha = alpha
+        self._reset()
+
+    def _reset(self) -> None:
+        # Number of training examples with each label.
+        self._label_counts = collections.Counter()  # type: Dict[str, int]
+        # Number of training examples with each label and feature.
+        self._feature_counts = {}  # type: Dict[str, Dict[str, int]]
+        # Sum of the feature counts for each label.
+        self._feature_totals = collections.Counter()  # type: Dict[str, int]
+        self._vocabulary = set()  # type: Set[str]
+
+    def __repr__(self):
+        return '<NaiveBayesClassifier(alpha=%r)>' % self.alpha
+
+    def train(self, labeled_featuresets: Iterable[Tuple[Dict[str, bool], str]]
+              ) -> 'NaiveBayesClassifier':
+        self._reset()
+        self.partial_fit(labeled_featuresets)
+        return self
+
+    def partial_fit(self,
+                    labeled_featuresets: Iterable[Tuple[Dict[str, bool], str]]
+                    ) -> 'NaiveBayesClassifier':
+        """Updates the model with additional training examples."""
+        for featureset, label in labeled_featuresets:
+            self._label_counts[label] += 1
+            counts = self._feature_counts.setdefault(label, {})
+            for name, value in featureset.items():
+                if not value: continue
+                counts[name] = counts.get(name, 0) + 1
+                self._feature_totals[label] += 1
+                self._vocabulary.add(name)
+        return self
+
+    def labels(self) -> List[str]:
+        return sorted(self._label_counts)
+
+    def _get_log_probs(self, featureset: Dict[str, bool]) -> Dict[str, float]:
+        """Returns the unnormalized base-2 log probability of each label, as
+        expected by `nltk.probability.DictionaryProbDist`."""
+        alpha = self.alpha
+        vocabulary = self._vocabulary
+        features = [
+            name for name, value in featureset.items()
+            if value and name in vocabulary
+        ]
+        log_num_examples = math.log2(sum(self._label_counts.values()))
+        smoothed_vocabulary_size = alpha * len(vocabulary)
+        log_probs = {}  # type: Dict[str, float]
+        for label, label_count in self._label_counts.items():
+            counts = self._feature_counts[label]
+            log_denominator = math.log2(self._feature_totals[label] +
+                                       smoothed_vocabulary_size)
+            log_prob = math.log2(label_count) - log_num_examples
+            for name in features:
+                log_prob += math.log2(counts.get(name, 0) +
+                                     alpha) - log_denominator
+            log_probs[label] = log_prob
+        return log_probs
+
+    def classify(self, featureset: Dict[str, bool]) -> str:
+        log_probs = self._get_log_probs(featureset)
+        # Break ties by label for determinism.
+        return max(sorted(log_probs), key=log_probs.__getitem__)
+
+    def prob_classify(self, featureset: Dict[str, bool]):
+        from nltk.probability import DictionaryProbDist
+        return DictionaryProbDist(
+            self._get_log_probs(featureset), log=True, normalize=True)
+
+    def classify_many(self,
+                      featuresets: Iterable[Dict[str, bool]]) -> List[str]:
+        return [self.classify(featureset) for featureset in featuresets]
+
+    def prob_classify_many(self, featuresets: Iterable[Dict[str, bool]]):
+        return [self.prob_classify(featureset) for featureset in featuresets]
 
 
 class MockTrainingExamples(object):
@@ -1,6 +1,8 @@
 import datetime
 
 from beancount.core.data import Amount
+import pytest
+
 from . import test_util
 from . import training
 
@@ -25,6 +27,140 @@ def test_get_features():
             }
 
 
+def test_get_features_max_ngram_length():
+    assert training.get_features(
+        training.PredictionInput(
+            date=datetime.date.min,
+            amount=Amount.from_string('3 USD'),
+            source_account='Assets:Checking',
+            key_value_pairs={'desc': 'a b c'}),
+        max_ngram_length=2) == {
+            'account:Assets:Checking': True,
+            'desc:a': True,
+            'desc:b': True,
+            'desc:c': True,
+            'desc:a b': True,
+            'desc:b c': True,
+        }
+
+
+def test_add_many():
+    examples = [(training.PredictionInput(
+        date=datetime.date.min,
+        amount=Amount.from_string('3 USD'),
+        source_account='Assets:Checking',
+        key_value_pairs={'desc': 'store number %d' % (i % 5)}), 'Expenses:%d' % (i % 3))
+                for i in range(25)]
+    expected = training.TrainingExamples(max_ngram_length=2)
+    for example, target_account in examples:
+        expected.add(example, target_account)
+    training_examples = training.TrainingExamples(max_ngram_length=2)
+    training_examples.add_many(examples)
+    assert training_examples.training_examples == expected.training_examples
+
+
+def test_remove_many():
+    examples = [(training.PredictionInput(
+        date=datetime.date.min,
+        amount=Amount.from_string('3 USD'),
+        source_account='Assets:Checking',
+        key_value_pairs={'desc': 'store number %d' % (i % 4)}), 'Expenses:%d' % (i % 2))
+                for i in range(12)]
+    training_examples = training.TrainingExamples()
+    training_examples.add_many(examples)
+    expected = list(training_examples.training_examples)
+    for example, target_account in [examples[5], examples[1], examples[8]]:
+        expected.remove((training_examples.get_features(example),
+                         target_account))
+    training_examples.remove_many([examples[5], examples[1], examples[8]])
+    assert training_examples.training_examples == expected
+
+    with pytest.raises(ValueError):
+        training_examples.remove_many([examples[1]] * 3)
+    assert training_examples.training_examples == expected
+
+
+def test_hashing_classifier():
+    import sklearn.tree
+
+    def make_features(source_account, desc):
+        return training.get_features(
+            training.PredictionInput(
+                date=datetime.date.min,
+                amount=Amount.from_string('3 USD'),
+                source_account=source_account,
+                key_value_pairs={'desc': desc}))
+
+    classifier = training.HashingClassifier(
+        sklearn.tree.DecisionTreeClassifier(), num_features=2**10)
+    classifier.train([
+        (make_features('Assets:Checking', 'STARBUCKS 123'), 'Expenses:Coffee'),
+        (make_features('Assets:Checking', 'STARBUCKS 456'), 'Expenses:Coffee'),
+        (make_features('Assets:Checking', 'SAFEWAY 1'), 'Expenses:Groceries'),
+        (make_features('Assets:Checking', 'SAFEWAY 2'), 'Expenses:Groceries'),
+    ])
+    assert classifier.transform([make_features('Assets:Checking', 'x')
+                                 ]).shape == (1, 2**10)
+    assert classifier.labels() == ['Expenses:Coffee', 'Expenses:Groceries']
+    featuresets = [
+        make_features('Assets:Checking', 'STARBUCKS 789'),
+        make_features('Assets:Checking', 'SAFEWAY 3'),
+    ]
+    assert classifier.classify_many(featuresets) == [
+        'Expenses:Coffee', 'Expenses:Groceries'
+    ]
+    assert classifier.classify(featuresets[0]) == 'Expenses:Coffee'
+    prob_dist = classifier.prob_classify(featuresets[1])
+    assert prob_dist.prob('Expenses:Groceries') == 1.0
+    assert prob_dist.prob('Expenses:Coffee') == 0.0
+
+
+def test_naive_bayes_classifier():
+
+    def make_features(desc):
+        return training.get_features(
+            training.PredictionInput(
+                date=datetime.date.min,
+                amount=Amount.from_string('3 USD'),
+                source_account='Assets:Checking',
+                key_value_pairs={'desc': desc}))
+
+    examples = [
+        (make_features('STARBUCKS 123'), 'Expenses:Coffee'),
+        (make_features('STARBUCKS 456'), 'Expenses:Coffee'),
+        (make_features('SAFEWAY 1'), 'Expenses:Groceries'),
+        (make_features('SHELL 1'), 'Expenses:Fuel'),
+    ]
+    classifier = training.NaiveBayesClassifier().train(examples[:2])
+    assert classifier.labels() == ['Expenses:Coffee']
+    assert classifier.classify(make_features('SAFEWAY 3')) == 'Expenses:Coffee'
+
+    # Incremental updates may add new labels and features, and result in the
+    # same model as training on all of the examples at once.
+    classifier.partial_fit(examples[2:3])
+    classifier.partial_fit(examples[3:])
+    full_classifier = training.NaiveBayesClassifier().train(examples)
+    assert classifier.labels() == full_classifier.labels() == [
+        'Expenses:Coffee', 'Expenses:Fuel', 'Expenses:Groceries'
+    ]
+    featuresets = [
+        make_features('STARBUCKS 789'),
+        make_features('SAFEWAY 3'),
+        make_features('SHELL 2'),
+    ]
+    assert classifier.classify_many(featuresets) == [
+        'Expenses:Coffee', 'Expenses:Groceries', 'Expenses:Fuel'
+    ]
+    for featureset in featuresets:
+        prob_dist = classifier.prob_classify(featureset)
+        full_prob_dist = full_classifier.prob_classify(featureset)
+        assert sum(prob_dist.prob(label)
+                   for label in classifier.labels()) == pytest.approx(1)
+        for label in classifier.labels():
+            assert prob_dist.prob(label) == pytest.approx(
+                full_prob_dist.prob(label))
+
+
 def test_get_unknown_account_group_numbers():
     entry, = test_util.parse("""
         1900-01-01 * "Narration"
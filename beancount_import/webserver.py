@@ -30,6 +30,8 @@ import beancount.parser.printer
 import watchdog.events
 import watchdog.observers
 
+from . import auto_reconcile
+from . import classifier_benchmark
 from . import reconcile
 
 from . import training
@@ -136,6 +138,7 @@ def json_encode_candidates(candidates: reconcile.Candidates):
     result['candidates'] = candidates.candidates
     result['date'] = candidates.date
     result['number'] = candidates.number
+    result['truncated'] = candidates.truncated
     return result
 
 
@@ -258,6 +261,14 @@ class SkipHandler(tornado.web.RequestHandler):
         self.write(json.dumps(None).encode())
 
 
+class ExplainPredictionHandler(tornado.web.RequestHandler):
+    def post(self):
+        msg = json.loads(self.request.body)
+        result = self.application.handle_explain_prediction(msg)
+        self.set_header('Content-Type', 'application/json')
+        self.write(json.dumps(result).encode())
+
+
 class RetrainHandler(tornado.web.RequestHandler):
     def post(self):
         self.application.retrain()
@@ -378,17 +389,27 @@ class WebSocketHandler(tornado.websocket.WebSocketHandler):
 
 
 class GetFileHandler(tornado.web.RequestHandler):
-    def get(self):
+    # Files are sent in chunks of this size, such that large files are not held
+    # in memory.
+    chunk_size = 1024 * 1024
+
+    async def get(self):
         path = self.get_argument('path')
         content_type = self.get_argument('content_type')
         try:
-            with open(path, 'rb') as f:
-                contents = f.read()
-            self.set_header('Content-Type', content_type)
-            self.write(contents)
+            f = open(path, 'rb')
         except:
             self.set_status(404)
             self.finish('File not found')
+            return
+        with f:
+            self.set_header('Content-Type', content_type)
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                self.write(chunk)
+                await self.flush()
 
 
 class JournalModificationHandler(watchdog.events.FileSystemEventHandler):
@@ -420,6 +441,8 @@ class Application(tornado.web.Application):
             (r'/%s/select_candidate' % secret_key, SelectCandidateHandler),
             (r'/%s/skip' % secret_key, SkipHandler),
             (r'/%s/retrain' % secret_key, RetrainHandler),
+            (r'/%s/explain_prediction' % secret_key,
+             ExplainPredictionHandler),
         ], **kwargs)
         self.frontend_dist = args.frontend_dist
         self.socket_clients = set()
@@ -485,8 +508,24 @@ class Application(tornado.web.Application):
 
     def retrain(self):
         if self.reconciler.loaded_future.done():
-            self.reconciler.retrain()
-            self.reset()
+            # The existing classifier continues to be used until retraining
+            # completes in the background.
+            loaded_future = self.reconciler.loaded_future
+            self.ioloop.add_future(
+                self.reconciler.retrain(),
+                lambda f: self._handle_retrained(loaded_future, f))
+
+    def _handle_retrained(self, loaded_future, retrain_future):
+        try:
+            if retrain_future.result() is None:
+                return
+            if (self.reconciler.loaded_future is not loaded_future or
+                    self.next_candidates is None):
+                return
+            self.next_candidates.refresh_predictions()
+            self.set_state_force(candidates=self.next_candidates)
+        except:
+            traceback.print_exc()
 
     def _handle_reconciler_loaded(self, loaded_future):
         try:
@@ -502,6 +541,10 @@ class Application(tornado.web.Application):
             self.current_invalid = loaded_reconciler.invalid_references
             self.start_check_modification_observer(loaded_reconciler)
             self.get_next_candidates(new_pending=True)
+            if loaded_reconciler.retrain_future is not None:
+                self.ioloop.add_future(
+                    loaded_reconciler.retrain_future,
+                    lambda f: self._handle_retrained(loaded_future, f))
         except:
             traceback.print_exc()
             pdb.post_mortem()
@@ -527,6 +570,8 @@ class Application(tornado.web.Application):
             self.skip_ids)
         end_time = time.time()
         print('Got next candidates in %.4f seconds' % (end_time - start_time))
+        if self.next_candidates is not None and self.next_candidates.truncated:
+            print('Search for merged candidates was truncated')
         generation = self.next_generation()
         kwargs = dict()
         if new_pending:
@@ -609,6 +654,40 @@ class Application(tornado.web.Application):
             print('got error')
             pdb.post_mortem()
 
+    def handle_explain_prediction(self, msg):
+        """Returns the explanation of the predicted accounts of a candidate.
+
+        The result is a list with an element for each group of unknown accounts,
+        containing the predicted account and the lines of the explanation.
+        """
+        try:
+            if (self.next_candidates is None or int(msg['generation']) !=
+                    self.current_state['candidates_generation']):
+                return None
+            index = int(msg['candidate_index'])
+            if index < 0 or index >= len(self.next_candidates.candidates):
+                return None
+            candidate = self.next_candidates.candidates[index]
+            if (candidate.explain_predictions is None or
+                    candidate.substituted_accounts is None):
+                return []
+            predicted_accounts = dict()  # type: Dict[int, str]
+            for substitution in candidate.substituted_accounts:
+                predicted_accounts.setdefault(
+                    substitution.group_number,
+                    substitution.predicted_account_name)
+            return [
+                dict(
+                    group_number=group_number,
+                    predicted_account=predicted_accounts.get(group_number),
+                    explanation=explanation)
+                for group_number, explanation in enumerate(
+                    candidate.explain_predictions())
+            ]
+        except:
+            traceback.print_exc()
+            return None
+
     def handle_skip(self, msg):
         pending_generation = int(msg['generation'])
         pending_index = int(msg['index'])
@@ -711,14 +790,144 @@ def parse_arguments(argv, **kwargs):
         help=
         'Maximum amount by which the weights of two matching entries may differ.'
     )
+    argparser.add_argument(
+        '--match_max_depth',
+        type=int,
+        help=
+        'Maximum number of existing or pending entries that may be merged into a single candidate.'
+    )
+    argparser.add_argument(
+        '--match_max_states',
+        type=int,
+        help=
+        'Maximum number of merged transaction states explored when searching for candidates.'
+    )
+    argparser.add_argument(
+        '--match_time_limit',
+        type=float,
+        default=None,
+        help=
+        'Maximum time in seconds spent searching for merged candidates.  The candidates found so far are shown if the limit is reached.  Unlimited by default.'
+    )
+    argparser.add_argument(
+        '--prefetch_candidates',
+        type=int,
+        default=0,
+        help=
+        'Number of upcoming pending entries for which merged candidates are computed in the background.  Disabled by default.'
+    )
+    argparser.add_argument(
+        '--auto_reconcile',
+        action='store_true',
+        help=
+        'Instead of starting the web server, accept all unambiguous candidates, write the changes to the journal, and print a summary of the remaining pending entries.'
+    )
+    argparser.add_argument(
+        '--auto_reconcile_min_confidence',
+        type=float,
+        default=auto_reconcile.DEFAULT_MIN_CONFIDENCE,
+        help=
+        'Minimum classifier confidence required for each predicted account of a candidate accepted by --auto_reconcile.  Requires --classifier_model=naive_bayes, since the decision tree classifier does not provide meaningful confidences.'
+    )
+    argparser.add_argument(
+        '--classifier_benchmark',
+        action='store_true',
+        help=
+        'Instead of starting the web server, evaluate the accuracy, training time, prediction latency, and memory usage of each supported classifier configuration on the training examples in the journal, and print the results.'
+    )
+    argparser.add_argument(
+        '--classifier_benchmark_split',
+        choices=['kfold', 'time'],
+        default='kfold',
+        help=
+        'How --classifier_benchmark splits the training examples.  With "kfold", they are split into folds at random.  With "time", each split trains on the examples up to some point in the journal and tests on the following ones.'
+    )
+    argparser.add_argument(
+        '--classifier_benchmark_folds',
+        type=int,
+        default=classifier_benchmark.DEFAULT_NUM_FOLDS,
+        help='Number of train/test splits evaluated by --classifier_benchmark.'
+    )
+    argparser.add_argument(
+        '--classifier_benchmark_top_k',
+        type=int,
+        default=classifier_benchmark.DEFAULT_TOP_K,
+        help=
+        'A prediction is counted as correct for the top-k accuracy reported by --classifier_benchmark if the account is among the k most probable ones.'
+    )
     argparser.add_argument(
         '--classifier_cache',
         type=str,
         help=
-        'Cache file for automatic account prediction classifier.  This speeds up loading.'
+        'Cache file for automatic account prediction classifier.  This speeds up loading.  If the training examples have changed since the cached classifier was trained, it is used until a new classifier is trained in the background.'
+    )
+    argparser.add_argument(
+        '--source_prepare_threads',
+        type=int,
+        default=0,
+        help=
+        'Number of threads used to prepare the data sources concurrently.  If 0 or 1, the sources are prepared sequentially.'
+    )
+    argparser.add_argument(
+        '--classifier_model',
+        choices=['decision_tree', 'naive_bayes'],
+        default='decision_tree',
+        help=
+        'Model used for account prediction.  A "decision_tree" model is only updated by retraining, while a "naive_bayes" model is also updated immediately with the training examples from each accepted candidate.'
+    )
+    argparser.add_argument(
+        '--classifier_vectorizer',
+        choices=['dict', 'hashing'],
+        default='dict',
+        help=
+        'Method for converting features to the input of the decision tree account prediction classifier.  "hashing" hashes the features into a fixed number of columns, which bounds the memory and time used for training with a large number of examples.'
+    )
+    argparser.add_argument(
+        '--classifier_hash_features',
+        type=int,
+        default=training.DEFAULT_NUM_HASHED_FEATURES,
+        help='Number of hashed feature columns used by --classifier_vectorizer=hashing.'
+    )
+    argparser.add_argument(
+        '--classifier_max_ngram_length',
+        type=int,
+        help=
+        'Maximum number of words in a feature used for account prediction.  Defaults to %d with --classifier_vectorizer=hashing, and is otherwise unlimited.'
+        % training.DEFAULT_HASHING_MAX_NGRAM_LENGTH)
+    argparser.add_argument(
+        '--reconciler_snapshot',
+        type=str,
+        help=
+        'Snapshot file of the fully loaded reconciler state.  If the journal files, data source files and relevant options are unchanged, the state is loaded from this file, which greatly speeds up loading.'
+    )
+    argparser.add_argument(
+        '--journal_mmap_lines',
+        action='store_true',
+        help=
+        'Access the lines of the journal files through a memory map rather than holding them in memory.  This reduces memory usage for very large journals, but the journal files must not be truncated by other programs, such as editors that overwrite files in place, while the web server is running.'
+    )
+    argparser.add_argument(
+        '--journal_parse_cache',
+        type=str,
+        help=
+        'Cache directory for the parsed contents of each journal file.  Only files that have changed are parsed again, which speeds up loading of journals split into many included files.'
+    )
+    argparser.add_argument(
+        '--journal_parse_processes',
+        type=int,
+        default=0,
+        help=
+        'Number of worker processes used to parse the journal files.  If greater than 1, the files included by the journal are parsed concurrently, which speeds up loading of journals split into many included files.  The entries are still merged in include order before booking.'
     )
     argparser.set_defaults(**kwargs)
-    return argparser.parse_args(argv)
+    args = argparser.parse_args(argv)
+    if (args.auto_reconcile and args.auto_reconcile_min_confidence > 0 and
+            args.classifier_model != 'naive_bayes'):
+        argparser.error(
+            '--auto_reconcile_min_confidence requires '
+            '--classifier_model=naive_bayes, since the decision tree '
+            'classifier does not provide meaningful confidences.')
+    return args
 
 
 def main(argv, **kwargs):
@@ -728,6 +937,14 @@ def main(argv, **kwargs):
         logging_args['filename'] = args.log_output
     logging.basicConfig(**logging_args)
 
+    if args.auto_reconcile:
+        auto_reconcile.main(args)
+        return
+
+    if args.classifier_benchmark:
+        classifier_benchmark.main(args)
+        return
+
     ioloop = tornado.ioloop.IOLoop.instance()
     app = Application(args=args, ioloop=ioloop, debug=(args.loglevel == logging.DEBUG))
 
@@ -9,7 +9,8 @@ import {
   BeancountTransaction,
   TransactionProperties,
   executeServerCommand,
-  BeancountEntry
+  BeancountEntry,
+  PredictionExplanation
 } from "./server_connection";
 import { AccountInputComponent } from "./account_input";
 import { UsedTransactionsComponent } from "./used_transactions";
@@ -23,6 +24,17 @@ const CandidateListElement = styled.div`
   flex-basis: 0;
 `;
 
+const TruncatedSearchElement = styled.div`
+  color: #a00;
+`;
+
+const PredictionExplanationElement = styled.pre`
+  max-height: 30vh;
+  overflow-y: auto;
+  margin: 4px 0;
+  font-size: small;
+`;
+
 export class CandidateSelectionState {
   selectedCandidateIndex: number = 0;
   candidates?: Candidates;
@@ -99,6 +111,10 @@ interface CandidatesComponentState {
   candidatesGeneration?: number;
   inputState?: ActiveInputState;
   selectedCandidateIndex: number;
+  explanation?: {
+    candidateIndex: number;
+    groups: PredictionExplanation[];
+  };
 }
 
 export class CandidatesComponent extends React.PureComponent<
@@ -132,7 +148,8 @@ export class CandidatesComponent extends React.PureComponent<
     if (props.candidates !== state.candidates) {
       Object.assign(updates, {
         candidates: props.candidates,
-        inputState: undefined
+        inputState: undefined,
+        explanation: undefined
       });
       hasUpdate = true;
     }
@@ -260,6 +277,20 @@ export class CandidatesComponent extends React.PureComponent<
     executeServerCommand("retrain", null);
   };
 
+  private explainPredictions = () => {
+    const { candidates } = this.props;
+    const candidateIndex = this.state.selectedCandidateIndex;
+    executeServerCommand("explain_prediction", {
+      generation: this.props.candidatesGeneration,
+      candidate_index: candidateIndex
+    }).then((groups: PredictionExplanation[] | null) => {
+      if (groups == null || this.props.candidates !== candidates) {
+        return;
+      }
+      this.setState({ explanation: { candidateIndex, groups } });
+    });
+  };
+
   private changeSelectedCandidateAllAccounts = () => {
     this.requestChangeAccount(this.state.selectedCandidateIndex, {});
   };
@@ -292,7 +323,7 @@ export class CandidatesComponent extends React.PureComponent<
   render() {
     const selectedCandidate = this.selectedCandidate;
     const hoverCandidate = this.hoverCandidate;
-    const { disabledUsedTransactions, inputState } = this.state;
+    const { disabledUsedTransactions, inputState, explanation } = this.state;
     const selectedUsedTransactions =
       selectedCandidate === undefined
         ? []
@@ -373,6 +404,13 @@ export class CandidatesComponent extends React.PureComponent<
             ⏭
           </button>
           <button onClick={this.retrain}>Retrain</button>
+          <button
+            disabled={!hasAccountSubstitutions}
+            onClick={this.explainPredictions}
+            title="Explain the predicted accounts of the selected candidate"
+          >
+            Explain
+          </button>
           <button
             disabled={!hasAccountSubstitutions}
             onClick={this.changeSelectedCandidateAllAccounts}
@@ -422,6 +460,23 @@ export class CandidatesComponent extends React.PureComponent<
             Ignore
           </button>
         </div>
+        {this.props.candidates.truncated && (
+          <TruncatedSearchElement title="The search for merged candidates reached the configured time, depth or state limit.">
+            Search limit reached; some merged candidates may be missing.
+          </TruncatedSearchElement>
+        )}
+        {explanation !== undefined &&
+          explanation.candidateIndex === this.state.selectedCandidateIndex && (
+            <PredictionExplanationElement>
+              {explanation.groups
+                .map(
+                  group =>
+                    `Group ${group.group_number}: ${group.predicted_account}\n` +
+                    group.explanation.join("\n")
+                )
+                .join("\n\n")}
+            </PredictionExplanationElement>
+          )}
         <UsedTransactionsComponent
           usedTransactions={this.props.candidates.used_transactions}
           disabledUsedTransactions={this.state.disabledUsedTransactions}
@@ -124,6 +124,13 @@ export interface Candidates {
   date: string;
   amount: string;
   used_transactions: UsedTransaction[];
+  truncated: boolean;
+}
+
+export interface PredictionExplanation {
+  group_number: number;
+  predicted_account: string | null;
+  explanation: string[];
 }
 
 export interface PendingEntrySourceInfo {